@@ -10,17 +10,27 @@ Usage:
     python battle_translate.py [--output OUTPUT_FILE] [--limit NUM_BATTLES]
                               [--gamemode GAMEMODE] [--elo_range ELO_RANGE]
                               [--month_year MONTH_YEAR]
+
+    # process pool mode: sharded, resumable JSONL output
+    python battle_translate.py --workers 16 --output_dir data/gen9ou_shards [--compress]
 """
 
 import asyncio
+import glob
 import json
 import os
 import argparse
+import queue
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_EXCEPTION
 from datetime import datetime
+import multiprocessing
 import re
+import orjson
 from tqdm import tqdm
 from datasets import load_dataset
 
+from poke_env.player.replay_context import ReplayContext
 from poke_env.player.translate import add_battle
 
 
@@ -158,6 +168,182 @@ async def process_battle_from_text(battle_text, format_name, battle_id, json_tex
         return False
 
 
+def shard_path(output_dir, shard_index, compress):
+    return os.path.join(output_dir, f"shard-{shard_index:05d}.jsonl" + (".zst" if compress else ""))
+
+
+def checkpoint_path(output_dir, shard_index):
+    return os.path.join(output_dir, f"shard-{shard_index:05d}.ckpt")
+
+
+def read_checkpoint(path):
+    """
+    Read a shard checkpoint.
+
+    Each line is `battle_id<TAB>status<TAB>offset`, appended once the battle's
+    examples are flushed to the shard file, `offset` being the shard size at that point.
+
+    Returns:
+        (set of finished battle ids, offset of the last finished battle)
+    """
+    done, offset = set(), 0
+    if not os.path.exists(path):
+        return done, offset
+    with open(path, 'r') as f:
+        for line in f:
+            parts = line.rstrip('\n').split('\t')
+            if len(parts) != 3:
+                # torn write while the process was killed
+                continue
+            done.add(parts[0])
+            offset = int(parts[2])
+    return done, offset
+
+
+def read_all_checkpoints(output_dir):
+    """Battle ids finished by any shard, so that resuming with a different number of workers works."""
+    done = set()
+    for path in glob.glob(os.path.join(output_dir, "shard-*.ckpt")):
+        done |= read_checkpoint(path)[0]
+    return done
+
+
+class ShardWriter:
+    """
+    Append-only JSONL shard, optionally zstd-compressed.
+
+    Every battle ends its own zstd frame, so the file can be truncated back to the
+    last checkpointed offset after a crash and still decompress as a whole.
+    """
+
+    def __init__(self, path, offset, compress=False, level=3):
+        # drop whatever was written after the last checkpoint
+        if os.path.exists(path):
+            os.truncate(path, offset)
+        self.file = open(path, 'ab')
+        self.writer = None
+        if compress:
+            try:
+                import zstandard
+            except ImportError:
+                raise ImportError("--compress requires the zstandard package: pip install zstandard")
+            self.zstandard = zstandard
+            self.writer = zstandard.ZstdCompressor(level=level).stream_writer(self.file, closefd=False)
+
+    def write_battle(self, examples):
+        """Write the examples of one battle and return the shard offset once they are flushed to the OS."""
+        data = b''.join(orjson.dumps(example) + b'\n' for example in examples)
+        if self.writer is not None:
+            self.writer.write(data)
+            self.writer.flush(self.zstandard.FLUSH_FRAME)
+        else:
+            self.file.write(data)
+        self.file.flush()
+        return self.file.tell()
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.file.close()
+
+
+async def translate_shard_async(dataset, shard_index, num_shards, output_dir, gamemode, gen, compress, progress):
+    shard = dataset.shard(num_shards=num_shards, index=shard_index, contiguous=True)
+    ckpt_path = checkpoint_path(output_dir, shard_index)
+    _, offset = read_checkpoint(ckpt_path)
+    done = read_all_checkpoints(output_dir)
+
+    writer = ShardWriter(shard_path(output_dir, shard_index, compress), offset, compress=compress)
+    processed = examples_written = 0
+    try:
+        with open(ckpt_path, 'a') as ckpt:
+            for battle in shard:
+                battle_id = str(battle["battle_id"])
+                if battle_id in done:
+                    continue
+                examples = []
+                success = await process_battle_from_text(battle["text"], gamemode, battle_id, examples, gen)
+                status = 'ok' if success else 'skip'
+                if not success:
+                    examples = []
+                for example in examples:
+                    example["battle_id"] = battle_id
+                offset = writer.write_battle(examples)
+                ckpt.write(f"{battle_id}\t{status}\t{offset}\n")
+                ckpt.flush()
+                processed += 1
+                examples_written += len(examples)
+                progress.put((1, len(examples)))
+    finally:
+        writer.close()
+    lookups = ReplayContext.for_format(gamemode).pokemon_lookup_stats()
+    print(f"Shard {shard_index}: pokemon lookup miss rate {lookups['miss_rate']:.2%} "
+          f"({lookups.get('fuzzy', 0)} fuzzy, {lookups.get('new', 0)} new Pokemon)")
+    return processed, examples_written
+
+
+def translate_shard(dataset, shard_index, num_shards, output_dir, gamemode, gen, compress, progress):
+    """Worker entry point: translate one contiguous shard of the dataset."""
+    return asyncio.run(translate_shard_async(
+        dataset, shard_index, num_shards, output_dir, gamemode, gen, compress, progress
+    ))
+
+
+def run_workers(dataset, args, gen):
+    """
+    Translate the dataset with a pool of processes, one contiguous shard per worker.
+
+    Battles already listed in a checkpoint of args.output_dir are skipped, so an
+    interrupted run can be resumed with the same command.
+    """
+    os.makedirs(args.output_dir, exist_ok=True)
+    already_done = len(read_all_checkpoints(args.output_dir))
+    total = len(dataset)
+    print(f"Using {args.workers} workers, {already_done} battles already done in {args.output_dir}")
+
+    # spawn: workers do not inherit the parent's threads (dataset loading, tokenizers)
+    context = multiprocessing.get_context("spawn")
+    with context.Manager() as manager, ProcessPoolExecutor(args.workers, mp_context=context) as executor:
+        progress = manager.Queue()
+        futures = [
+            executor.submit(translate_shard, dataset, shard_index, args.workers, args.output_dir,
+                            args.gamemode, gen, args.compress, progress)
+            for shard_index in range(args.workers)
+        ]
+
+        battles = examples = 0
+        start = last_report = time.time()
+        with tqdm(total=total, initial=min(already_done, total), desc="Processing battles") as bar:
+            def drain(timeout):
+                nonlocal battles, examples
+                try:
+                    n_battles, n_examples = progress.get(timeout=timeout)
+                    while True:
+                        battles += n_battles
+                        examples += n_examples
+                        bar.update(n_battles)
+                        n_battles, n_examples = progress.get_nowait()
+                except queue.Empty:
+                    pass
+
+            while not all(future.done() for future in futures):
+                drain(timeout=1.)
+                now = time.time()
+                if now - last_report >= args.report_every:
+                    last_report = now
+                    rate = battles / max(now - start, 1e-9)
+                    tqdm.write(f"{already_done + battles}/{total} battles, {examples} examples, {rate:.2f} battles/s")
+            drain(timeout=0.)
+            wait(futures, return_when=FIRST_EXCEPTION)
+            for future in futures:
+                future.result()
+
+    elapsed = time.time() - start
+    print(f"TOTAL EXAMPLES: {examples}")
+    print(f"Processed {battles} battles in {elapsed:.1f}s ({battles / max(elapsed, 1e-9):.2f} battles/s)")
+    print(f"Results saved to {args.output_dir}")
+
+
 async def main():
     """
     Main function to process battles from the pokechamp dataset.
@@ -184,10 +370,23 @@ async def main():
     parser.add_argument("--gamemode", default="gen9ou", type=str, choices=gamemodes,
                         help="Specific gamemode to filter by")
     parser.add_argument("--split", default="train", choices=["train", "test"], help="Dataset split to use")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="Number of worker processes. 0 processes battles in this process and writes --output")
+    parser.add_argument("--output_dir", default="data/processed_battles",
+                        help="Directory of the sharded JSONL output and checkpoints (--workers > 0)")
+    parser.add_argument("--compress", action="store_true", help="zstd-compress the JSONL shards (--workers > 0)")
+    parser.add_argument("--report_every", type=float, default=30., help="Seconds between throughput reports (--workers > 0)")
     args = parser.parse_args()
+    if args.compress:
+        # fail before loading the dataset rather than in every worker
+        try:
+            import zstandard  # noqa: F401
+        except ImportError:
+            parser.error("--compress requires the zstandard package: pip install zstandard")
     
     # Ensure output directory exists
-    os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    if args.workers == 0:
+        os.makedirs(os.path.dirname(args.output), exist_ok=True)
     
     # Load filtered dataset
     print(f"Loading {args.gamemode} battles from {args.min_month} to {args.max_month} with Elo {args.elo_ranges}")
@@ -207,6 +406,10 @@ async def main():
     
     # Extract generation number from gamemode
     gen = int(args.gamemode[3])
+
+    if args.workers > 0:
+        run_workers(dataset, args, gen)
+        return
     
     # Process battles
     json_text = []
@@ -0,0 +1,60 @@
+"""Benchmark of the batched damage calculator.
+
+Evaluates the full team x moves x opposing team grid of the fixture battle, both
+with the scalar LocalSim.calculate_remaining_hp path (one call per triple) and
+with one LocalSim.calculate_damage_batch call per grid, checks that both agree
+and reports matchups evaluated per second. Run from the repository root:
+
+    python -m benchmarks.bench_damage_calc --repeat 5
+"""
+import time
+from argparse import ArgumentParser
+
+import numpy as np
+
+from benchmarks.fixtures import make_battle, make_sim
+
+
+def _scalar(sim, attackers, moves, defenders, team):
+    turns = np.zeros((len(attackers), max(len(m) for m in moves), len(defenders)))
+    for i, mon in enumerate(attackers):
+        for k, move in enumerate(moves[i]):
+            for j, mon_opp in enumerate(defenders):
+                *_, turns[i, k, j] = sim.calculate_remaining_hp(
+                    mon, mon_opp, move, None, return_turns=True, team=team
+                )
+    return turns
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    battle = make_battle()
+    sim = make_sim(battle)
+    attackers = list(battle.team.values())
+    defenders = list(battle.opponent_team.values())
+    moves = [list(mon.moves.values()) for mon in attackers]
+    n_matchups = sum(len(m) for m in moves) * len(defenders)
+
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        scalar_turns = _scalar(sim, attackers, moves, defenders, battle.team)
+    scalar_t = (time.perf_counter() - start) / args.repeat
+
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        batch = sim.calculate_damage_batch(attackers, moves, defenders, team=battle.team)
+    batch_t = (time.perf_counter() - start) / args.repeat
+
+    assert np.array_equal(scalar_turns, batch.turns_to_faint), "batched results differ"
+
+    print(f"matchups per grid: {n_matchups}")
+    print(f"scalar : {n_matchups / scalar_t:10.1f} matchups/s")
+    print(f"batched: {n_matchups / batch_t:10.1f} matchups/s")
+    print(f"speedup: {scalar_t / batch_t:10.1f}x")
+
+
+if __name__ == "__main__":
+    main()
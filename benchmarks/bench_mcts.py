@@ -0,0 +1,57 @@
+"""Simulations per second of the MCTS player's search.
+
+Searches the fixture battle with MonteCarloTreeSearch and reports simulations per
+second, along with the rate of its two parts: LocalSim transitions (fork + step,
+one per simulation) and heuristic rollouts. Run from the repository root:
+
+    python -m benchmarks.bench_mcts --simulations 2000 --repeat 3
+"""
+import time
+from argparse import ArgumentParser
+
+from benchmarks.fixtures import make_battle, make_sim
+from poke_env.player.battle_order import BattleOrder
+from poke_env.player.mcts_player import MonteCarloTreeSearch, RolloutModel
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument("--simulations", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--rollout_depth", type=int, default=10)
+    args = parser.parse_args()
+
+    battle = make_battle()
+    sim = make_sim(battle)
+    actions = [BattleOrder(move) for move in battle.available_moves]
+    actions += [BattleOrder(mon) for mon in battle.available_switches]
+    mcts = MonteCarloTreeSearch(rollout_depth=args.rollout_depth, seed=0)
+
+    rates = []
+    for _ in range(args.repeat):
+        result = mcts.search(sim, actions, args.simulations)
+        rates.append(result.simulations_per_second)
+
+    _, opponent_actions, _ = mcts._actions(sim)
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        for action in actions:
+            for action_opp in opponent_actions:
+                sim.fork().step(action, action_opp)
+    n_transitions = args.repeat * len(actions) * len(opponent_actions)
+    transition_t = (time.perf_counter() - start) / n_transitions
+
+    model = RolloutModel(sim, lambda mon: mcts.opponent_moves(sim, mon), depth=args.rollout_depth, rng=mcts.rng)
+    start = time.perf_counter()
+    for _ in range(args.simulations):
+        model.rollout(sim.battle)
+    rollout_t = (time.perf_counter() - start) / args.simulations
+
+    print(f"decision   : {result.action.message} (value {result.value:.3f})")
+    print(f"search     : {max(rates):10.1f} simulations/s")
+    print(f"transitions: {1 / transition_t:10.1f} fork+step/s")
+    print(f"rollouts   : {1 / rollout_t:10.1f} rollouts/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Benchmark of the fuzzy name resolution of LLM outputs.
+
+Resolves species, move, item and ability names with one typo each (an inserted,
+deleted or replaced letter) with difflib.get_close_matches over every name, as the
+players used to, and with the shared NameIndex, cold and memoized. Reports
+microseconds per name and how often both pick the same name, the differences being
+ties between equally similar names. Run from the repository root:
+
+    python -m benchmarks.bench_name_index --gen 9 --queries 500
+"""
+import random
+import string
+import time
+from argparse import ArgumentParser
+from difflib import get_close_matches
+
+from poke_env.data import NameIndex, name_index
+from poke_env.data.name_index import NAME_KINDS
+
+
+def _typo(name: str, rng: random.Random) -> str:
+    chars = list(name)
+    i = rng.randrange(len(chars))
+    op = rng.randrange(3)
+    if op == 0:
+        chars.insert(i, rng.choice(string.ascii_lowercase))
+    elif op == 1 and len(chars) > 1:
+        del chars[i]
+    else:
+        chars[i] = rng.choice(string.ascii_lowercase)
+    return "".join(chars)
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument("--gen", type=int, default=9)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    for kind in NAME_KINDS:
+        ids = name_index(args.gen, kind).ids
+        queries = [_typo(rng.choice(ids), rng) for _ in range(args.queries)]
+
+        start = time.perf_counter()
+        expected = [get_close_matches(query, ids, n=1, cutoff=0.8) for query in queries]
+        difflib_t = (time.perf_counter() - start) / len(queries)
+
+        start = time.perf_counter()
+        index = NameIndex(ids)
+        build_t = time.perf_counter() - start
+
+        start = time.perf_counter()
+        resolved = [index.get(query) for query in queries]
+        cold_t = (time.perf_counter() - start) / len(queries)
+
+        start = time.perf_counter()
+        for query in queries:
+            index.get(query)
+        cached_t = (time.perf_counter() - start) / len(queries)
+
+        agree = sum((match[0] if match else None) == id_ for match, id_ in zip(expected, resolved))
+        print(
+            f"{kind:9}: {len(ids):5} names, built in {build_t * 1e3:6.1f}ms | "
+            f"difflib {difflib_t * 1e6:8.1f}us  index {cold_t * 1e6:7.1f}us  "
+            f"memoized {cached_t * 1e6:5.2f}us | same match {agree / len(queries):.1%}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""Micro-benchmark of Pokemon construction.
+
+Compares the old behaviour (every Pokemon parses its own copy of the usage-sets
+JSON) with the shared GenData usage-sets store. Run from the repository root:
+
+    python -m benchmarks.bench_pokemon_init --n 200
+"""
+import json
+import time
+import tracemalloc
+from argparse import ArgumentParser
+
+from poke_env.data import GenData
+from poke_env.environment.pokemon import Pokemon
+
+SPECIES = [
+    "greattusk", "kingambit", "gholdengo", "dragapult", "garganacl", "ironvaliant",
+    "landorustherian", "corviknight", "samurotthisui", "ragingbolt", "ogerpon", "zamazenta",
+]
+
+
+def _legacy_pokemon(gen: int, species: str) -> Pokemon:
+    mon = Pokemon(gen=gen, species=species)
+    with open(f"poke_env/data/static/gen{gen}/ou/sets_1825.json", "r") as f:
+        mon._sets = json.load(f)
+    return mon
+
+
+def _bench(factory, n: int, gen: int):
+    tracemalloc.start()
+    start = time.perf_counter()
+    mons = [factory(gen, SPECIES[i % len(SPECIES)]) for i in range(n)]
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del mons
+    return elapsed, peak
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument("--n", type=int, default=120)
+    parser.add_argument("--gen", type=int, default=9)
+    args = parser.parse_args()
+
+    # warm up GenData and the shared store so both sides only pay per-object costs
+    GenData.from_gen(args.gen).usage_sets()
+
+    legacy_t, legacy_mem = _bench(_legacy_pokemon, args.n, args.gen)
+    shared_t, shared_mem = _bench(lambda gen, s: Pokemon(gen=gen, species=s), args.n, args.gen)
+
+    print(f"Pokemon constructed: {args.n}")
+    print(f"per-object sets : {legacy_t / args.n * 1e3:9.3f} ms/mon  peak {legacy_mem / 2**20:8.1f} MiB")
+    print(f"shared sets     : {shared_t / args.n * 1e3:9.3f} ms/mon  peak {shared_mem / 2**20:8.1f} MiB")
+    print(f"speedup         : {legacy_t / max(shared_t, 1e-9):9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""Nodes expanded per second by a LocalSim tree search.
+
+Expands a full player-move x opponent-move tree, branching each child either with
+a deepcopy of the battle (what LocalSim.__init__ does) or with LocalSim.fork
+(copy-on-write battle snapshot). Run from the repository root:
+
+    python -m benchmarks.bench_sim_expansion --depth 2
+"""
+import time
+from argparse import ArgumentParser
+from copy import copy, deepcopy
+
+from benchmarks.fixtures import make_sim, opponent_moves
+from poke_env.player.battle_order import BattleOrder
+
+
+def deepcopy_branch(sim):
+    child = copy(sim)
+    child.battle = deepcopy(sim.battle)
+    child.switch_set = set(sim.switch_set)
+    return child
+
+
+def fork_branch(sim):
+    return sim.fork()
+
+
+def expand(root, branch, depth: int) -> int:
+    nodes = 0
+    layer = [root]
+    for _ in range(depth):
+        next_layer = []
+        for sim in layer:
+            if sim.is_terminal():
+                continue
+            for move in list(sim.battle.active_pokemon.moves.values()):
+                for move_opp in opponent_moves(sim.battle):
+                    child = branch(sim)
+                    child.step(BattleOrder(move), BattleOrder(move_opp))
+                    next_layer.append(child)
+                    nodes += 1
+        layer = next_layer
+    return nodes
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument("--depth", type=int, default=2)
+    args = parser.parse_args()
+
+    for name, branch in (("deepcopy", deepcopy_branch), ("fork (cow)", fork_branch)):
+        root = make_sim()
+        hp_before = [mon.current_hp for mon in root.battle.opponent_team.values()]
+        start = time.perf_counter()
+        nodes = expand(root, branch, args.depth)
+        elapsed = time.perf_counter() - start
+        hp_after = [mon.current_hp for mon in root.battle.opponent_team.values()]
+        assert hp_before == hp_after, "expansion leaked state into the root battle"
+        print(f"{name:<11}: {nodes} nodes in {elapsed:.3f}s -> {nodes / elapsed:9.1f} nodes/s")
+
+
+if __name__ == "__main__":
+    main()
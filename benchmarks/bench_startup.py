@@ -0,0 +1,76 @@
+"""Startup benchmark: time from a fresh interpreter to a player's first decision.
+
+Starts fresh processes that import the players, create a OneStepPlayer and let it
+choose a move in the fixture battle, reading the static data from its JSON files
+or from the compiled cache (see compile_static_data.py, compiled first if
+missing). Reports each phase of the first run, when the files are the least likely
+to be in the OS page cache, and the median of the following runs. Run from the
+repository root:
+
+    python -m benchmarks.bench_startup --runs 5
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from argparse import ArgumentParser
+
+PHASES = ("import", "player", "decision", "total")
+
+
+def child():
+    start = time.perf_counter()
+    from benchmarks.fixtures import make_battle
+    from poke_env.data import static_data
+    from poke_env.player.baselines import OneStepPlayer
+    imported = time.perf_counter()
+    player = OneStepPlayer("gen9ou")
+    created = time.perf_counter()
+    player.choose_move(make_battle())
+    decided = time.perf_counter()
+    print(json.dumps({
+        "import": imported - start,
+        "player": created - imported,
+        "decision": decided - created,
+        "total": decided - start,
+        "cached": static_data().cached,
+    }), flush=True)
+    # the player's websocket keeps retrying in the background
+    os._exit(0)
+
+
+def run(cache_path: str) -> dict:
+    env = dict(os.environ, POKE_ENV_STATIC_CACHE=cache_path)
+    output = subprocess.run(
+        [sys.executable, "-m", "benchmarks.bench_startup", "--child"],
+        env=env, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, check=True, text=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--child", action="store_true")
+    args = parser.parse_args()
+    if args.child:
+        child()
+
+    from poke_env.data.static_cache import DEFAULT_CACHE_PATH, compile_static_data
+    if not os.path.exists(DEFAULT_CACHE_PATH):
+        compile_static_data(DEFAULT_CACHE_PATH)
+
+    print(f"{'':14}" + "".join(f"{phase:>10}" for phase in PHASES) + "  (ms)")
+    for label, cache_path in (("json", ""), ("compiled", DEFAULT_CACHE_PATH)):
+        results = [run(cache_path) for _ in range(args.runs)]
+        assert all(result["cached"] == bool(cache_path) for result in results)
+        rows = [("first", results[:1]), ("median", results[1:] or results)]
+        for name, runs in rows:
+            times = [statistics.median(run[phase] for run in runs) * 1e3 for phase in PHASES]
+            print(f"{label:8} {name:6}" + "".join(f"{t:10.1f}" for t in times))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""Memory cost of the static data per worker process.
+
+Starts worker processes together, as the battle farm does, each reading the
+static data the way a player does: the gen 9 GenData, the usage sets of every
+fixture pokemon, the LocalSim tables and an MCTS search of the fixture battle.
+Reports, per worker, the memory the static data added on top of the imports:
+private memory, which every extra worker pays again, and proportional set size,
+which splits pages shared with the other workers between them. The static data is
+read from the JSON files, then from the compiled cache (compiled first if missing
+or stale). Linux only (/proc/self/smaps_rollup). Run from the repository root:
+
+    python -m benchmarks.bench_worker_memory --workers 4
+"""
+import multiprocessing
+import os
+import statistics
+from argparse import ArgumentParser
+from typing import Dict
+
+
+def _memory() -> Dict[str, int]:
+    fields = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1])
+    return {
+        "private": fields["Private_Clean"] + fields["Private_Dirty"],
+        "pss": fields["Pss"],
+    }
+
+
+def worker(cache_path: str, barrier, results):
+    os.environ["POKE_ENV_STATIC_CACHE"] = cache_path
+    from benchmarks.fixtures import make_battle, make_sim
+    from poke_env.data import GenData, static_data
+    from poke_env.player.battle_order import BattleOrder
+    from poke_env.player.mcts_player import MonteCarloTreeSearch
+    barrier.wait()
+    before = _memory()
+
+    gen_data = GenData.from_gen(9)
+    battle = make_battle()
+    for mon in list(battle.team.values()) + list(battle.opponent_team.values()):
+        gen_data.usage_sets(1825).get(mon.species)
+        gen_data.usage_sets(1000).get(mon.species)
+    sim = make_sim(battle)
+    actions = [BattleOrder(move) for move in battle.available_moves]
+    actions += [BattleOrder(mon) for mon in battle.available_switches]
+    MonteCarloTreeSearch(seed=0).search(sim, actions, 200)
+
+    # measured once every worker is done, so that shared pages are split between
+    # all of them
+    barrier.wait()
+    after = _memory()
+    results.put({
+        "cached": static_data().cached,
+        **{key: after[key] - before[key] for key in after},
+    })
+    barrier.wait()
+
+
+def run(cache_path: str, n_workers: int) -> list:
+    ctx = multiprocessing.get_context("spawn")
+    barrier = ctx.Barrier(n_workers)
+    results = ctx.Queue()
+    workers = [ctx.Process(target=worker, args=(cache_path, barrier, results)) for _ in range(n_workers)]
+    for process in workers:
+        process.start()
+    out = [results.get() for _ in workers]
+    for process in workers:
+        process.join()
+    return out
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    from poke_env.data.static_cache import DEFAULT_CACHE_PATH, ensure_static_cache
+    ensure_static_cache()
+
+    print(f"{args.workers} workers, static data memory per worker (MiB):")
+    for label, cache_path in (("json", ""), ("compiled", DEFAULT_CACHE_PATH)):
+        results = run(cache_path, args.workers)
+        assert all(result["cached"] == bool(cache_path) for result in results)
+        private = statistics.mean(result["private"] for result in results) / 1024
+        pss = statistics.mean(result["pss"] for result in results) / 1024
+        print(f"{label:8}: private {private:7.1f}  pss {pss:7.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Offline battle fixtures shared by the benchmark scripts.
+
+Builds gen9ou battles from protocol messages only, without a showdown server.
+"""
+import logging
+from typing import List, Optional
+
+from poke_env.data import GenData
+from poke_env.environment.battle import Battle
+from poke_env.environment.move import Move
+from poke_env.player.local_simulation import LocalSim
+from poke_env.player.prompts import prompt_translate
+from poke_env.player.replay_context import load_static_tables
+
+TEAM_1 = {
+    "Great Tusk": ["headlongrush", "icespinner", "knockoff", "rapidspin"],
+    "Kingambit": ["kowtowcleave", "suckerpunch", "ironhead", "swordsdance"],
+    "Gholdengo": ["makeitrain", "shadowball", "nastyplot", "recover"],
+    "Dragapult": ["dracometeor", "shadowball", "uturn", "flamethrower"],
+    "Garganacl": ["saltcure", "recover", "protect", "stealthrock"],
+    "Iron Valiant": ["moonblast", "closecombat", "knockoff", "encore"],
+}
+TEAM_2 = {
+    "Corviknight": ["bravebird", "roost", "uturn", "defog"],
+    "Samurott-Hisui": ["ceaselessedge", "razorshell", "suckerpunch", "aquajet"],
+    "Raging Bolt": ["thunderclap", "dracometeor", "thunderbolt", "calmmind"],
+    "Zamazenta": ["bodypress", "heavyslam", "crunch", "irondefense"],
+    "Primarina": ["moonblast", "surf", "psychicnoise", "calmmind"],
+    "Heatran": ["magmastorm", "earthpower", "flashcannon", "stealthrock"],
+}
+
+
+def make_battle(team_1: Optional[dict] = None, team_2: Optional[dict] = None) -> Battle:
+    team_1 = TEAM_1 if team_1 is None else team_1
+    team_2 = TEAM_2 if team_2 is None else team_2
+    battle = Battle("battle-gen9ou-0", "bench1", logging.getLogger("bench"), gen=9)
+    battle.parse_message(["", "player", "p1", "bench1", "1", ""])
+    battle.parse_message(["", "player", "p2", "bench2", "1", ""])
+    battle._format = "gen9ou"
+    for role, team in (("p1", team_1), ("p2", team_2)):
+        for species, moves in team.items():
+            mon = battle.get_pokemon(f"{role}: {species}", details=f"{species}, L100")
+            for move in moves:
+                mon._add_move(move)
+            mon.set_hp_status("100/100")
+        lead = next(iter(team))
+        battle.parse_message(["", "switch", f"{role}a: {lead}", f"{lead}, L100", "100/100"])
+    battle._available_moves = list(battle.active_pokemon.moves.values())
+    battle._available_switches = [mon for mon in battle.team.values() if not mon.active]
+    battle.end_turn(1)
+    return battle
+
+
+def make_sim(battle: Optional[Battle] = None, tables: Optional[dict] = None) -> LocalSim:
+    battle = make_battle() if battle is None else battle
+    tables = load_static_tables() if tables is None else tables
+    return LocalSim(
+        battle,
+        tables["move_effect"],
+        tables["pokemon_move_dict"],
+        tables["ability_effect"],
+        tables["pokemon_ability_dict"],
+        tables["item_effect"],
+        None,
+        GenData.from_gen(9),
+        False,
+        format="gen9ou",
+        prompt_translate=prompt_translate,
+    )
+
+
+def opponent_moves(battle: Battle) -> List[Move]:
+    return list(battle.opponent_active_pokemon.moves.values())
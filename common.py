@@ -10,7 +10,8 @@ prompt_algos = [
     "heuristic", 
     'max_power',
     'dmg_calc',
-    'random'
+    'random',
+    'mcts'
     ]
 
 PNUMBER1 = str(np.random.randint(0,10000))
@@ -0,0 +1,37 @@
+"""Compacts the minimax score logs (score_evaluation_*.jsonl) written during
+battles into their score_evaluation JSON, next to them.
+
+    python compact_score_logs.py ./battle_log/one_vs_one
+"""
+import argparse
+import glob
+import os
+
+from poke_env.player.log_writer import compact_score_log
+
+parser = argparse.ArgumentParser()
+parser.add_argument("paths", nargs="+")
+parser.add_argument("--include_inprogress", action="store_true")
+parser.add_argument("--remove", action="store_true")
+args = parser.parse_args()
+
+
+def main():
+    files = []
+    for path in args.paths:
+        if os.path.isdir(path):
+            files += sorted(glob.glob(os.path.join(path, "score_evaluation_*.jsonl")))
+        else:
+            files.append(path)
+    for path in files:
+        # logs of battles still being played are renamed when they end
+        if path.endswith("_inprogress.jsonl") and not args.include_inprogress:
+            continue
+        out_path = compact_score_log(path)
+        if args.remove:
+            os.remove(path)
+        print(f"{path} -> {out_path}")
+
+
+if __name__ == "__main__":
+    main()
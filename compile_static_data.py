@@ -0,0 +1,34 @@
+"""Compiles the static game data (poke_env/data/static/**/*.json) into the cache
+read by poke_env.data.static_data. Rerun it after editing or updating the JSON
+files: until then, the changed tables are read from their JSON files.
+
+    python compile_static_data.py
+    python compile_static_data.py --out /tmp/static_data.bin
+    python compile_static_data.py --check
+"""
+import argparse
+import os
+import sys
+
+from poke_env.data.static_cache import DEFAULT_CACHE_PATH, StaticData, compile_static_data
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--out", default=DEFAULT_CACHE_PATH)
+parser.add_argument("--check", action="store_true", help="only list the tables to recompile")
+args = parser.parse_args()
+
+
+def main():
+    if args.check:
+        data = StaticData(args.out)
+        stale = data.stale() if data.cached else ["(no cache)"]
+        for name in stale:
+            print(name)
+        sys.exit(1 if stale else 0)
+    header = compile_static_data(args.out)
+    size = os.path.getsize(args.out)
+    print(f"{len(header['tables'])} tables, {size / 2**20:.1f} MB -> {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,31 +1,51 @@
 import asyncio
 import pandas as pd
 from argparse import ArgumentParser
+from poke_env.player.battle_farm import merge_farm_results, run_battle_farm
 from poke_env.player.utils import cross_evaluate
 from common import PNUMBER1
 from poke_env.player.llama_player import LLAMAPlayer
-from whr import whr as whole_history_rating
+from whr import RatingEngine, whr as whole_history_rating
 from poke_env.player.team_util import get_llm_player, load_random_team
 
 parser = ArgumentParser()
 parser.add_argument("--temperature", type=float, default=0.3)
 parser.add_argument("--log_dir", type=str, default="./battle_log/gen9ou")
 parser.add_argument("--device", type=int, default=0)
+parser.add_argument("--n_battles", type=int, default=1)
+# > 0: play the tournament in a battle farm of this many processes
+parser.add_argument("--workers", type=int, default=0)
+parser.add_argument("--results_dir", type=str, default=None)
 args = parser.parse_args()
 
+combos = [
+    ('gpt-4o', 'pokechamp', 'minimax'),
+    ('gpt-4o', 'pokellmon', 'io'),
+    ('abyssal', 'abyssal', 'abyssal'),
+    ('one_step', 'one_step', 'one_step'),
+    ('random', 'random', 'random'),
+]
+
+def farm_gen9ou():
+    results_dir = args.results_dir or f'battle_log/gen9ou_farm_{PNUMBER1}'
+    file = f'{results_dir}.csv'
+    specs = [(backend, algo, name) for backend, name, algo in combos]
+    # ratings of the earlier runs of this results_dir, updated as games finish
+    engine = RatingEngine()
+    engine.add_games(merge_farm_results(results_dir))
+    run_battle_farm(specs, args, n_workers=args.workers, n_challenges=args.n_battles,
+                    results_dir=results_dir, battle_format='gen9ou', run_id=PNUMBER1,
+                    rating_engine=engine)
+    merge_farm_results(results_dir, file=file)
+    report(file, [name for _, name, _ in combos])
+    print("\nElo ratings with 95% bootstrap intervals:")
+    print(engine.bootstrap(n_samples=200))
+
 async def evaluate_gen9ou():
     file = f'battle_log/gen9ou_{PNUMBER1}.csv'
-    n_battles = 1
+    n_battles = args.n_battles
     players = []
     
-    combos = [
-        ('gpt-4o', 'pokechamp', 'minimax'),
-        ('gpt-4o', 'pokellmon', 'io'),
-        ('abyssal', 'abyssal', 'abyssal'),
-        ('one_step', 'one_step', 'one_step'),
-        ('random', 'random', 'random'),
-    ]
-    
     llm = None
     device = args.device
     for i, (backend, name, algo) in enumerate(combos):
@@ -39,20 +59,22 @@ async def evaluate_gen9ou():
         players.append(player)
     
     await cross_evaluate(players, n_challenges=n_battles, file=file)
-    
+    report(file, [player.username for player in players])
+
+def report(file, models):
     # Calculate Elo ratings
     df = pd.read_csv(file)
     elo_ratings = whole_history_rating(df)
     
     print("Win rates:")
-    for player in players:
-        print(f"{player.username}:")
-        for opponent in players:
-            if player != opponent:
-                wins = df[(df['model_a'] == player.username) & (df['model_b'] == opponent.username) & (df['winner'] == 'model_a')].shape[0]
-                total = df[(df['model_a'] == player.username) & (df['model_b'] == opponent.username)].shape[0]
+    for model in models:
+        print(f"{model}:")
+        for opponent in models:
+            if model != opponent:
+                wins = df[(df['model_a'] == model) & (df['model_b'] == opponent) & (df['winner'] == 'model_a')].shape[0]
+                total = df[(df['model_a'] == model) & (df['model_b'] == opponent)].shape[0]
                 win_rate = wins / total if total > 0 else 0
-                print(f"  vs {opponent.username}: {win_rate:.2%}")
+                print(f"  vs {opponent}: {win_rate:.2%}")
 
     print("\nElo ratings:")
     for player, rating in elo_ratings.items():
@@ -62,4 +84,7 @@ async def evaluate_gen9ou():
     elo_ratings.to_csv('gen9ou_elo_ratings.csv')
 
 if __name__ == "__main__":
-    asyncio.run(evaluate_gen9ou())
+    if args.workers > 0:
+        farm_gen9ou()
+    else:
+        asyncio.run(evaluate_gen9ou())
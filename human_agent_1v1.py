@@ -11,6 +11,8 @@ parser.add_argument("--prompt_algo", default="minimax", choices=prompt_algos)
 parser.add_argument("--battle_format", default="gen9ou", choices=["gen8randombattle", "gen8ou", "gen9ou", "gen9randombattle"])
 parser.add_argument("--backend", type=str, default="gpt-4o", choices=["gpt-4o-mini", "gpt-4o", "gpt-4o-2024-05-13", "llama", 'None'])
 parser.add_argument("--log_dir", type=str, default="./battle_log/ladder")
+parser.add_argument("--search_time_budget", type=float, default=None)
+parser.add_argument("--alpha_beta", action="store_true")
 parser.add_argument("--device", type=int, default=0)
 parser.add_argument("--name", type=str, default='pokechamp', choices=['pokechamp', 'pokellmon', 'one_step', 'abyssal', 'max_power', 'random'])
 args = parser.parse_args()
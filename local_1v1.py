@@ -24,6 +24,9 @@ parser.add_argument("--opponent_device", type=int, default=0)
 parser.add_argument("--temperature", type=float, default=0.3)
 parser.add_argument("--battle_format", default="gen9ou", choices=["gen8randombattle", "gen8ou", "gen9ou", "gen9randombattle"])
 parser.add_argument("--log_dir", type=str, default="./battle_log/one_vs_one")
+parser.add_argument("--search_time_budget", type=float, default=None)
+parser.add_argument("--alpha_beta", action="store_true")
+parser.add_argument("--mcts_simulations", type=int, default=2000)
 
 args = parser.parse_args()
 
@@ -1,9 +1,22 @@
 from poke_env.data.gen_data import GenData
+from poke_env.data.name_index import NameIndex, name_index
 from poke_env.data.normalize import to_id_str
 from poke_env.data.replay_template import REPLAY_TEMPLATE
+from poke_env.data.static_cache import (
+    MappedTable,
+    StaticData,
+    compile_static_data,
+    static_data,
+)
 
 __all__ = [
     "REPLAY_TEMPLATE",
     "GenData",
+    "MappedTable",
+    "NameIndex",
+    "StaticData",
+    "compile_static_data",
+    "name_index",
+    "static_data",
     "to_id_str",
 ]
@@ -1,20 +1,67 @@
 from __future__ import annotations
 
-import os
+import threading
 from functools import lru_cache
-from typing import Any, Dict, Optional, Union
+from typing import Any, Dict, Mapping, Optional, Sequence, Tuple, Union
 
-import orjson
+import numpy as np
 
 from poke_env.data.normalize import to_id_str
+from poke_env.data.static_cache import register_derived_table, static_data
+
+
+def process_pokedex(dex: Dict[str, Any]) -> Dict[str, Any]:
+    """Adds the cosmetic and pikachu gmax forms to a pokedex JSON, and the species
+    and baseSpecies of every entry."""
+    other_forms_dex: Dict[str, Any] = {}
+    for value in dex.values():
+        if "cosmeticFormes" in value:
+            for other_form in value["cosmeticFormes"]:
+                other_forms_dex[to_id_str(other_form)] = value
+
+    # Alternative pikachu gmax forms
+    for name, value in dex.items():
+        if name.startswith("pikachu") and name not in {"pikachu", "pikachugmax"}:
+            other_forms_dex[name + "gmax"] = dex["pikachugmax"]
+
+    dex.update(other_forms_dex)
+
+    for name, value in dex.items():
+        if "baseSpecies" in value:
+            value["species"] = value["baseSpecies"]
+        else:
+            value["baseSpecies"] = to_id_str(name)
+
+    return dex
+
+
+# GenData.pokedex, compiled processed into the static data cache
+for _gen in range(1, 10):
+    register_derived_table(f"derived/gen{_gen}pokedex", [f"pokedex/gen{_gen}pokedex"], process_pokedex)
+del _gen
 
 
 class GenData:
-    __slots__ = ("gen", "moves", "natures", "pokedex", "type_chart", "learnset")
+    __slots__ = (
+        "gen",
+        "moves",
+        "natures",
+        "pokedex",
+        "type_chart",
+        "type_index",
+        "type_matrix",
+        "_learnset",
+        "_usage_sets",
+    )
 
     UNKNOWN_ITEM = "unknown_item"
 
+    # Elo buckets with a parsed usage-sets file under static/gen{N}/ou
+    USAGE_SETS_ELOS = (0, 1000, 1825)
+    DEFAULT_USAGE_SETS_ELO = 1825
+
     _gen_data_per_gen: Dict[int, GenData] = {}
+    _usage_sets_lock = threading.Lock()
 
     def __init__(self, gen: int):
         if gen in self._gen_data_per_gen:
@@ -25,59 +72,37 @@ class GenData:
         self.natures = self.load_natures()
         self.pokedex = self.load_pokedex(gen)
         self.type_chart = self.load_type_chart(gen)
-        self.learnset = self.load_learnset()
+        self.type_index, self.type_matrix = self.load_type_matrix(self.type_chart)
+        self._learnset: Optional[Mapping[str, Dict[str, Any]]] = None
+        self._usage_sets: Dict[int, Mapping[str, Any]] = {}
 
     def __deepcopy__(self, memodict: Optional[Dict[int, Any]] = None) -> GenData:
         return self
 
-    def load_moves(self, gen: int) -> Dict[str, Any]:
-        with open(
-            os.path.join(self._static_files_root, "moves", f"gen{gen}moves.json")
-        ) as f:
-            return orjson.loads(f.read())
-
-    def load_natures(self) -> Dict[str, Dict[str, Union[int, float]]]:
-        with open(os.path.join(self._static_files_root, "natures.json")) as f:
-            return orjson.loads(f.read())
+    # the tables are shared with the other processes mapping the static data cache,
+    # and only the entries read by this process are decoded
 
-    def load_learnset(self) -> Dict[str, Dict[str, Union[int, float]]]:
-        with open(os.path.join(self._static_files_root, "learnset.json")) as f:
-            return orjson.loads(f.read())
+    def load_moves(self, gen: int) -> Mapping[str, Any]:
+        return static_data().table(f"moves/gen{gen}moves")
 
-    def load_pokedex(self, gen: int) -> Dict[str, Any]:
-        with open(
-            os.path.join(self._static_files_root, "pokedex", f"gen{gen}pokedex.json")
-        ) as f:
-            dex = orjson.loads(f.read())
-
-        other_forms_dex: Dict[str, Any] = {}
-        for value in dex.values():
-            if "cosmeticFormes" in value:
-                for other_form in value["cosmeticFormes"]:
-                    other_forms_dex[to_id_str(other_form)] = value
-
-        # Alternative pikachu gmax forms
-        for name, value in dex.items():
-            if name.startswith("pikachu") and name not in {"pikachu", "pikachugmax"}:
-                other_forms_dex[name + "gmax"] = dex["pikachugmax"]
+    def load_natures(self) -> Mapping[str, Dict[str, Union[int, float]]]:
+        return static_data().table("natures")
 
-        dex.update(other_forms_dex)
+    def load_learnset(self) -> Mapping[str, Dict[str, Any]]:
+        return static_data().table("learnset")
 
-        for name, value in dex.items():
-            if "baseSpecies" in value:
-                value["species"] = value["baseSpecies"]
-            else:
-                value["baseSpecies"] = to_id_str(name)
+    @property
+    def learnset(self) -> Mapping[str, Dict[str, Any]]:
+        """The learnsets of every pokemon, loaded on first access."""
+        if self._learnset is None:
+            self._learnset = self.load_learnset()
+        return self._learnset
 
-        return dex
+    def load_pokedex(self, gen: int) -> Dict[str, Any]:
+        return static_data().table(f"derived/gen{gen}pokedex")
 
     def load_type_chart(self, gen: int) -> Dict[str, Dict[str, float]]:
-        with open(
-            os.path.join(
-                self._static_files_root, "typechart", f"gen{gen}typechart.json"
-            )
-        ) as chart:
-            json_chart = orjson.loads(chart.read())
+        json_chart = static_data().load(f"typechart/gen{gen}typechart")
 
         types = [str(type_).upper() for type_ in json_chart]
         type_chart = {type_1: {type_2: 1.0 for type_2 in types} for type_1 in types}
@@ -109,9 +134,123 @@ class GenData:
 
         return type_chart
 
+    def load_type_matrix(
+        self, type_chart: Dict[str, Dict[str, float]]
+    ) -> Tuple[Dict[str, int], np.ndarray]:
+        # type_chart is indexed [defending][attacking], the matrix [attacking, defending]
+        types = list(type_chart)
+        type_index = {type_: i for i, type_ in enumerate(types)}
+
+        # the extra last index is neutral both ways: it stands for a missing second
+        # type as well as for types outside of the chart (STELLAR, ???)
+        matrix = np.ones((len(types) + 1, len(types) + 1))
+        for defending, effectiveness in type_chart.items():
+            for attacking, multiplier in effectiveness.items():
+                matrix[type_index[attacking], type_index[defending]] = multiplier
+        matrix.flags.writeable = False
+
+        return type_index, matrix
+
     @property
-    def _static_files_root(self) -> str:
-        return os.path.join(os.path.dirname(os.path.realpath(__file__)), "static")
+    def neutral_type_id(self) -> int:
+        """
+        :return: The type index that is neutral to and from every type.
+        :rtype: int
+        """
+        return len(self.type_index)
+
+    def type_id(self, type_: Any) -> int:
+        """Returns the index of a type in type_matrix.
+
+        :param type_: The type, as a PokemonType or its upper case name. None and
+            types absent from the type chart map to neutral_type_id.
+        :type type_: PokemonType or str, optional
+        :return: The type index.
+        :rtype: int
+        """
+        if type_ is None:
+            return len(self.type_index)
+        return self.type_index.get(getattr(type_, "name", type_), len(self.type_index))
+
+    def damage_multiplier(self, attacking_type: Any, type_1: Any, type_2: Any = None) -> float:
+        """Returns the damage multiplier of one attacking type on a pokemon with types
+        `type_1` and, optionally, `type_2`.
+
+        :param attacking_type: The type of the attack.
+        :type attacking_type: PokemonType or str
+        :param type_1: The first type of the target.
+        :type type_1: PokemonType or str
+        :param type_2: The second type of the target. Defaults to None.
+        :type type_2: PokemonType or str, optional
+        :return: The damage multiplier.
+        :rtype: float
+        """
+        row = self.type_matrix[self.type_id(attacking_type)]
+        return float(row[self.type_id(type_1)] * row[self.type_id(type_2)])
+
+    def damage_multipliers(
+        self,
+        attacking_types: Sequence[Any],
+        defending_types: Sequence[Union[Any, Tuple[Any, Any]]],
+    ) -> np.ndarray:
+        """Returns the damage multipliers of N attacking types on M defending pokemons
+        in one lookup.
+
+        :param attacking_types: The N attacking types.
+        :type attacking_types: Sequence of PokemonType or str
+        :param defending_types: The M defending types, either single types or
+            (type_1, type_2) pairs whose second type can be None.
+        :type defending_types: Sequence of PokemonType, str or tuples of those
+        :return: The (N, M) array of multipliers, indexed [attacking, defending].
+        :rtype: np.ndarray
+        """
+        attacking = np.fromiter(
+            (self.type_id(type_) for type_ in attacking_types),
+            dtype=np.intp,
+            count=len(attacking_types),
+        )
+        defending = np.full((len(defending_types), 2), self.neutral_type_id, dtype=np.intp)
+        for i, types in enumerate(defending_types):
+            if not isinstance(types, tuple):
+                types = (types,)
+            for j, type_ in enumerate(types[:2]):
+                defending[i, j] = self.type_id(type_)
+        rows = self.type_matrix[attacking]
+        return rows[:, defending[:, 0]] * rows[:, defending[:, 1]]
+
+    def load_usage_sets(self, elo: int) -> Mapping[str, Any]:
+        name = f"gen{self.gen}/ou/sets_{elo}"
+        if name not in static_data():
+            return {}
+        return static_data().table(name)
+
+    def usage_sets(self, elo: int = DEFAULT_USAGE_SETS_ELO) -> Mapping[str, Any]:
+        """Returns the usage statistics (abilities, items, moves, spreads, tera...)
+        of the given Elo bucket, keyed by lowercase species.
+
+        The table is loaded on first access and shared by every caller in the
+        process: it must be treated as read-only. With the static data cache, the
+        sets of a species are only decoded when first read. Generations without a
+        parsed sets file get an empty dict.
+
+        :param elo: The Elo bucket, one of USAGE_SETS_ELOS.
+        :type elo: int
+        :return: The usage statistics of this generation's OU metagame.
+        :rtype: Mapping[str, Any]
+        """
+        if elo not in self.USAGE_SETS_ELOS:
+            raise ValueError(
+                f"Unknown usage sets Elo bucket {elo}, expected one of "
+                f"{self.USAGE_SETS_ELOS}."
+            )
+        sets = self._usage_sets.get(elo)
+        if sets is None:
+            with self._usage_sets_lock:
+                sets = self._usage_sets.get(elo)
+                if sets is None:
+                    sets = self.load_usage_sets(elo)
+                    self._usage_sets[elo] = sets
+        return sets
 
     @classmethod
     @lru_cache(None)
@@ -0,0 +1,154 @@
+"""Fuzzy resolution of species, move, item and ability names, e.g. the ones written
+by LLMs, to their ids.
+"""
+from __future__ import annotations
+
+from collections import defaultdict
+from difflib import SequenceMatcher
+from functools import lru_cache
+from typing import Collection, Dict, Iterable, List, Optional, Tuple
+
+from poke_env.data.gen_data import GenData
+from poke_env.data.normalize import to_id_str
+from poke_env.data.static_cache import static_data
+
+NAME_KINDS = ("species", "moves", "items", "abilities")
+
+
+def _ngrams(id_: str, n: int) -> List[str]:
+    padded = f"^{id_}$"
+    if len(padded) <= n:
+        return [padded]
+    return [padded[i:i + n] for i in range(len(padded) - n + 1)]
+
+
+class NameIndex():
+    """Resolves names to the ids of a fixed set of names.
+
+    Names are compared as ids (see to_id_str), so that case, spaces and punctuation
+    never matter: "Knock Off", "knock-off" and "knockoff" resolve in one dict lookup.
+    Other names are matched with difflib's similarity ratio, against the names
+    sharing a character n-gram with them and whose length allows the cutoff, rather
+    than against every name. Ties are broken by the smallest id, and results are
+    memoized, so repeated outputs cost a dict lookup.
+
+    :param names: The names, any of their spellings.
+    :type names: Iterable[str]
+    :param n: Length of the n-grams candidates are looked up with.
+    :type n: int
+    :param cache_size: Maximum number of memoized fuzzy matches.
+    :type cache_size: int
+    """
+
+    def __init__(self, names: Iterable[str], n: int=3, cache_size: int=2**14):
+        self.n = n
+        self.cache_size = cache_size
+        self.ids: Tuple[str, ...] = tuple(sorted({to_id_str(name) for name in names} - {""}))
+        self._id_set = frozenset(self.ids)
+        postings: Dict[str, List[int]] = defaultdict(list)
+        for i, id_ in enumerate(self.ids):
+            for gram in set(_ngrams(id_, n)):
+                postings[gram].append(i)
+        self._postings = {gram: tuple(ids) for gram, ids in postings.items()}
+        self._cache: Dict[Tuple[str, float], Optional[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, name: str) -> bool:
+        return to_id_str(name) in self._id_set
+
+    def get(self, name: str, cutoff: float=0.8, within: Optional[Collection[str]]=None) -> Optional[str]:
+        """Returns the id closest to name.
+
+        :param name: The name to resolve.
+        :type name: str
+        :param cutoff: Minimum similarity ratio, in [0, 1], of a fuzzy match.
+        :type cutoff: float
+        :param within: Ids the match is restricted to, e.g. the moves of a pokemon.
+            They are matched exactly even if they are not indexed.
+        :type within: Collection[str], optional
+        :return: The matching id, None if no id is similar enough.
+        :rtype: str, optional
+        """
+        id_ = to_id_str(name)
+        if within is not None:
+            if id_ in within:
+                return id_
+            matches = self.matches(id_, cutoff, within)
+            return matches[0][1] if matches else None
+        if id_ in self._id_set:
+            return id_
+        key = (id_, cutoff)
+        if key in self._cache:
+            return self._cache[key]
+        matches = self.matches(id_, cutoff)
+        match = matches[0][1] if matches else None
+        if len(self._cache) >= self.cache_size:
+            self._cache.clear()
+        self._cache[key] = match
+        return match
+
+    def matches(self, id_: str, cutoff: float=0.8, within: Optional[Collection[str]]=None) -> List[Tuple[float, str]]:
+        """Returns the (ratio, id) of the ids similar to id_, best first and the
+        smallest id first among equal ratios."""
+        if not id_:
+            return []
+        length = len(id_)
+        candidates = set()
+        for gram in _ngrams(id_, self.n):
+            candidates.update(self._postings.get(gram, ()))
+        matcher = SequenceMatcher()
+        matcher.set_seq2(id_)
+        matches = []
+        for i in candidates:
+            candidate = self.ids[i]
+            # the ratio is at most 2 * min(len_a, len_b) / (len_a + len_b)
+            if 2 * min(length, len(candidate)) < cutoff * (length + len(candidate)):
+                continue
+            if within is not None and candidate not in within:
+                continue
+            matcher.set_seq1(candidate)
+            if (
+                matcher.real_quick_ratio() >= cutoff
+                and matcher.quick_ratio() >= cutoff
+            ):
+                ratio = matcher.ratio()
+                if ratio >= cutoff:
+                    matches.append((ratio, candidate))
+        matches.sort(key=lambda match: (-match[0], match[1]))
+        return matches
+
+
+def _load_names(kind: str, gen: int) -> Iterable[str]:
+    if kind == "species":
+        return GenData.from_gen(gen).pokedex.keys()
+    if kind == "moves":
+        return GenData.from_gen(gen).moves.keys()
+    if kind == "items":
+        return static_data().table("items/item_effect").keys()
+    if kind == "abilities":
+        return static_data().table("abilities/ability_effect").keys()
+    raise ValueError(f"Unknown name kind {kind}, expected one of {NAME_KINDS}.")
+
+
+@lru_cache(None)
+def _name_index(gen: int, kind: str) -> NameIndex:
+    return NameIndex(_load_names(kind, gen))
+
+
+def name_index(gen: int, kind: str) -> NameIndex:
+    """Returns the NameIndex of the species, moves, items or abilities of a
+    generation, built on first use and shared by the whole process.
+
+    :param gen: The generation.
+    :type gen: int
+    :param kind: One of "species", "moves", "items" and "abilities". Items and
+        abilities are the same for every generation.
+    :type kind: str
+    :return: The index.
+    :rtype: NameIndex
+    """
+    if kind in ("items", "abilities"):
+        gen = 0
+    return _name_index(gen, kind)
@@ -0,0 +1,399 @@
+"""Compiled cache of the static game data, memory-mapped and shared by the
+processes that read it.
+
+compile_static_data packs every JSON table under poke_env/data/static, along with
+the tables derived from them (see register_derived_table), into one versioned
+file. StaticData memory-maps that file: the pages are the OS page cache's, shared
+by every process mapping the file, and the entries of a table (a species, a move,
+the usage sets of a species...) are only decoded in a process when it reads them.
+StaticData falls back to the JSON files for tables the cache lacks or whose source
+changed since it was compiled, so a missing or stale cache only costs time and
+memory.
+
+    python compile_static_data.py
+"""
+import logging
+import mmap
+import os
+import struct
+import threading
+from collections.abc import Mapping
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+import orjson
+
+STATIC_ROOT = os.path.join(os.path.dirname(os.path.realpath(__file__)), "static")
+DEFAULT_CACHE_PATH = os.path.join(STATIC_ROOT, "static_data.bin")
+# the cache used by static_data(), an empty value disabling it
+CACHE_PATH_ENV = "POKE_ENV_STATIC_CACHE"
+
+MAGIC = b"PKESTAT\0"
+FORMAT_VERSION = 2
+# magic, format version, length of the JSON header that follows
+_PREAMBLE = struct.Struct("<8sIQ")
+# tables and span arrays start at multiples of this in the file
+_ALIGNMENT = 8
+
+# name -> (source tables, function of the decoded sources), see register_derived_table
+DERIVED_TABLES: Dict[str, Tuple[Tuple[str, ...], Callable[..., Any]]] = {}
+
+
+def register_derived_table(name: str, sources: Sequence[str], build: Callable[..., Any]):
+    """Registers a table computed from other tables, e.g. a processed pokedex. It is
+    compiled into the cache like the JSON tables, and built from its sources when
+    the cache lacks it.
+
+    :param name: Name of the derived table.
+    :type name: str
+    :param sources: Names of the tables it is computed from.
+    :type sources: Sequence[str]
+    :param build: Function returning the table from the decoded sources, given as
+        positional arguments. It owns them and may modify them.
+    :type build: Callable
+    """
+    DERIVED_TABLES[name] = (tuple(sources), build)
+
+
+def table_names(root: str=STATIC_ROOT) -> Iterator[str]:
+    """Yields the names of the JSON tables under root, their paths relative to it
+    without extension, e.g. "moves/gen9moves"."""
+    for directory, subdirectories, files in os.walk(root):
+        subdirectories.sort()
+        for file in sorted(files):
+            if file.endswith(".json"):
+                path = os.path.relpath(os.path.join(directory, file), root)
+                yield path[:-len(".json")].replace(os.sep, "/")
+
+
+def _source_path(root: str, name: str) -> str:
+    return os.path.join(root, *name.split("/")) + ".json"
+
+
+def _source_stamp(path: str) -> Optional[list]:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def _encode_table(table: Any) -> Tuple[bytes, Optional[List[str]], Optional[np.ndarray]]:
+    """Returns the compact JSON of a table and, for JSON objects, their keys and the
+    (start, end) spans of their values in it."""
+    if not isinstance(table, dict):
+        return orjson.dumps(table), None, None
+    keys = list(table)
+    spans = np.zeros((len(keys), 2), dtype="<u8")
+    parts = [b"{"]
+    offset = 1
+    for i, key in enumerate(keys):
+        prefix = (b"," if i else b"") + orjson.dumps(key) + b":"
+        value = orjson.dumps(table[key])
+        offset += len(prefix)
+        spans[i] = offset, offset + len(value)
+        offset += len(value)
+        parts += [prefix, value]
+    parts.append(b"}")
+    return b"".join(parts), keys, spans
+
+
+def _pad(blob: bytes) -> bytes:
+    return blob + b"\0" * (-len(blob) % _ALIGNMENT)
+
+
+def compile_static_data(path: str=DEFAULT_CACHE_PATH, root: str=STATIC_ROOT) -> Dict[str, Any]:
+    """Compiles the JSON tables under root and the derived tables into the cache
+    file at path.
+
+    The file starts with MAGIC, FORMAT_VERSION and a JSON header giving, for each
+    table, its offset and length, the stamps of its sources and, for JSON objects,
+    where their keys and the spans of their values are. The tables follow, each
+    one as compact JSON, then the keys as a JSON list and the spans as a
+    little-endian (n_keys, 2) uint64 array. The file is written next to path and
+    renamed over it, so processes mapping the previous cache are not affected.
+
+    :param path: The cache file to write.
+    :type path: str
+    :param root: Directory of the JSON tables.
+    :type root: str
+    :return: The header of the written cache.
+    :rtype: Dict[str, Any]
+    """
+    sources = StaticData(None, root)
+    blobs = []
+    tables = {}
+    offset = 0
+
+    def add(blob: bytes) -> Tuple[int, int]:
+        nonlocal offset
+        start = offset
+        blobs.append(_pad(blob))
+        offset += len(blobs[-1])
+        return start, len(blob)
+
+    names = list(table_names(root)) + sorted(DERIVED_TABLES)
+    for name in names:
+        table, keys, spans = _encode_table(sources.load(name))
+        entry: Dict[str, Any] = {"sources": sources.source_stamps(name)}
+        entry["offset"], entry["length"] = add(table)
+        if keys is not None:
+            entry["keys_offset"], entry["keys_length"] = add(orjson.dumps(keys))
+            entry["spans_offset"], _ = add(spans.tobytes())
+            entry["count"] = len(keys)
+        tables[name] = entry
+
+    header = {"format_version": FORMAT_VERSION, "tables": tables}
+    encoded_header = orjson.dumps(header)
+    # offsets in the header are relative to the aligned end of the header
+    data_start = _PREAMBLE.size + len(encoded_header)
+    data_start += -data_start % _ALIGNMENT
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_PREAMBLE.pack(MAGIC, FORMAT_VERSION, len(encoded_header)))
+        f.write(encoded_header)
+        f.write(b"\0" * (data_start - _PREAMBLE.size - len(encoded_header)))
+        for blob in blobs:
+            f.write(blob)
+    os.replace(tmp_path, path)
+    return header
+
+
+_MISSING = object()
+
+
+def _shared_table(name: str) -> Any:
+    return static_data().table(name)
+
+
+class MappedTable(Mapping):
+    """Read-only dict of a compiled JSON object, whose values are decoded from the
+    memory-mapped cache when first read and then kept.
+
+    Key lookups and iteration never decode values. Copies are the table itself,
+    and a pickled table is the shared table of the same name in the unpickling
+    process.
+    """
+
+    def __init__(self, name: str, buffer: memoryview, keys: List[str], spans: np.ndarray):
+        self.name = name
+        self._buffer = buffer
+        self._keys = keys
+        self._positions = {key: i for i, key in enumerate(keys)}
+        self._spans = spans
+        self._values: Dict[str, Any] = {}
+
+    def __getitem__(self, key: str) -> Any:
+        value = self._values.get(key, _MISSING)
+        if value is _MISSING:
+            start, end = self._spans[self._positions[key]]
+            value = self._values[key] = orjson.loads(self._buffer[start:end])
+        return value
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._positions
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._keys)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    @property
+    def decoded(self) -> int:
+        """Number of values decoded in this process."""
+        return len(self._values)
+
+    def __copy__(self) -> "MappedTable":
+        return self
+
+    def __deepcopy__(self, memodict: Optional[Dict[int, Any]] = None) -> "MappedTable":
+        return self
+
+    def __reduce__(self):
+        return _shared_table, (self.name,)
+
+    def __repr__(self) -> str:
+        return f"MappedTable({self.name!r}, {len(self)} keys, {self.decoded} decoded)"
+
+
+class StaticData():
+    """Read-only access to the static tables, through the compiled cache when it
+    is up to date.
+
+    :param cache_path: The compiled cache, None to read the JSON files only.
+    :type cache_path: str, optional
+    :param root: Directory of the JSON tables.
+    :type root: str
+    :param logger: Logger a stale or unreadable cache is reported to.
+    :type logger: logging.Logger, optional
+    """
+
+    def __init__(self,
+                 cache_path: Optional[str]=DEFAULT_CACHE_PATH,
+                 root: str=STATIC_ROOT,
+                 logger: Optional[logging.Logger]=None,
+                 ):
+        self.cache_path = cache_path
+        self.root = root
+        self.logger = logging.getLogger("StaticData") if logger is None else logger
+        self.tables_from_cache = 0
+        self.tables_from_source = 0
+        self._tables: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self._mmap: Optional[mmap.mmap] = None
+        self._data: Optional[memoryview] = None
+        self._header: Dict[str, Any] = {}
+        if cache_path is not None and os.path.exists(cache_path):
+            self._open(cache_path)
+
+    def _open(self, cache_path: str):
+        with open(cache_path, "rb") as f:
+            try:
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                # empty file
+                return
+        if len(buffer) < _PREAMBLE.size:
+            self.logger.warning("Ignoring truncated static data cache %s", cache_path)
+            return
+        magic, version, header_length = _PREAMBLE.unpack_from(buffer)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            self.logger.warning(
+                "Ignoring static data cache %s of format %s, expected %s: recompile it "
+                "with compile_static_data.py", cache_path, version, FORMAT_VERSION
+            )
+            return
+        self._header = orjson.loads(buffer[_PREAMBLE.size:_PREAMBLE.size + header_length])
+        data_start = _PREAMBLE.size + header_length
+        data_start += -data_start % _ALIGNMENT
+        self._mmap = buffer
+        self._data = memoryview(buffer)[data_start:]
+
+    @property
+    def cached(self) -> bool:
+        """Whether a compiled cache is open."""
+        return self._mmap is not None
+
+    def __contains__(self, name: str) -> bool:
+        return (
+            name in self._header.get("tables", {})
+            or name in DERIVED_TABLES
+            or os.path.exists(_source_path(self.root, name))
+        )
+
+    def source_stamps(self, name: str) -> Dict[str, Optional[list]]:
+        """Returns the (size, mtime) of the JSON files a table is read from, by name."""
+        sources = DERIVED_TABLES[name][0] if name in DERIVED_TABLES else (name,)
+        return {source: _source_stamp(_source_path(self.root, source)) for source in sources}
+
+    def stale(self) -> List[str]:
+        """Returns the tables of the cache whose sources changed since it was
+        compiled, and the tables missing from it."""
+        tables = self._header.get("tables", {})
+        names = list(table_names(self.root)) + sorted(DERIVED_TABLES)
+        return [name for name in names if name not in tables or self._cached_entry(name, log=False) is None]
+
+    def _cached_entry(self, name: str, log: bool=True) -> Optional[Dict[str, Any]]:
+        entry = self._header.get("tables", {}).get(name)
+        if entry is None:
+            return None
+        for source, stamp in self.source_stamps(name).items():
+            # the cache stands in for deleted sources, not for edited ones
+            if stamp is not None and stamp != entry["sources"].get(source):
+                if log:
+                    self.logger.warning(
+                        "Static table %s changed since %s was compiled, reading its JSON "
+                        "file: recompile it with compile_static_data.py", source, self.cache_path
+                    )
+                return None
+        return entry
+
+    def _build(self, name: str) -> Any:
+        self.tables_from_source += 1
+        if name in DERIVED_TABLES:
+            sources, build = DERIVED_TABLES[name]
+            return build(*[self.load(source) for source in sources])
+        with open(_source_path(self.root, name), "rb") as f:
+            return orjson.loads(f.read())
+
+    def load(self, name: str) -> Any:
+        """Decodes a whole table. Each call returns a new object, which the caller
+        owns.
+
+        :param name: The table, its path under the static directory without
+            extension, e.g. "pokedex/gen9pokedex", or a derived table.
+        :type name: str
+        :return: The decoded table.
+        :rtype: Any
+        """
+        entry = self._cached_entry(name)
+        if entry is None:
+            return self._build(name)
+        self.tables_from_cache += 1
+        return orjson.loads(self._data[entry["offset"]:entry["offset"] + entry["length"]])
+
+    def table(self, name: str) -> Any:
+        """Returns a table shared by every caller, which must treat it as read-only.
+        JSON objects of the cache are MappedTables, decoding their values as they
+        are read; other tables are decoded on first access.
+
+        :param name: The table, as in load.
+        :type name: str
+        :return: The table.
+        :rtype: Any
+        """
+        table = self._tables.get(name, _MISSING)
+        if table is _MISSING:
+            with self._lock:
+                table = self._tables.get(name, _MISSING)
+                if table is _MISSING:
+                    table = self._tables[name] = self._map(name)
+        return table
+
+    def _map(self, name: str) -> Any:
+        entry = self._cached_entry(name)
+        if entry is None or "count" not in entry:
+            return self.load(name)
+        self.tables_from_cache += 1
+        keys_start = entry["keys_offset"]
+        keys = orjson.loads(self._data[keys_start:keys_start + entry["keys_length"]])
+        spans = np.frombuffer(
+            self._data, dtype="<u8", count=2 * entry["count"], offset=entry["spans_offset"]
+        ).reshape(entry["count"], 2)
+        table_start = entry["offset"]
+        buffer = self._data[table_start:table_start + entry["length"]]
+        return MappedTable(name, buffer, keys, spans)
+
+
+@lru_cache(None)
+def static_data() -> StaticData:
+    """Returns the StaticData shared by the process. Its cache is the file named by
+    the POKE_ENV_STATIC_CACHE environment variable, DEFAULT_CACHE_PATH by default.
+    """
+    cache_path = os.environ.get(CACHE_PATH_ENV, DEFAULT_CACHE_PATH)
+    return StaticData(cache_path or None)
+
+
+def ensure_static_cache(logger: Optional[logging.Logger]=None) -> bool:
+    """Compiles the cache of static_data() if it is missing or stale, e.g. before
+    starting worker processes that will all map it.
+
+    :param logger: Logger a failed compilation is reported to.
+    :type logger: logging.Logger, optional
+    :return: Whether the cache is up to date.
+    :rtype: bool
+    """
+    logger = logging.getLogger("StaticData") if logger is None else logger
+    cache_path = os.environ.get(CACHE_PATH_ENV, DEFAULT_CACHE_PATH)
+    if not cache_path:
+        return False
+    if os.path.exists(cache_path) and not StaticData(cache_path, logger=logger).stale():
+        return True
+    try:
+        compile_static_data(cache_path)
+    except OSError as e:
+        logger.warning("Compiling the static data cache %s failed: %s", cache_path, e)
+        return False
+    return True
@@ -1,6 +1,8 @@
 import os
 from abc import ABC, abstractmethod
 from logging import Logger
+from collections import Counter
+from functools import lru_cache
 from typing import Any, Dict, List, Optional, Set, Tuple, Union
 
 from poke_env.data import GenData, to_id_str
@@ -12,9 +14,23 @@ from poke_env.environment.weather import Weather
 
 from difflib import get_close_matches
 
+@lru_cache(maxsize=4096)
 def sanitize_string(s: str) -> str:
     return ''.join(char for char in s if char.isalnum()).lower()
 
+# species whose dash is part of their name, not a forme suffix
+DASH_MONS = frozenset({'ho-oh', 'chi-yu', 'porygon-z', 'ting-lu', 'kommo-o'})
+
+
+def lookup_stats(lookups: Counter) -> Dict[str, float]:
+    """Returns the get_pokemon resolution counts by path with the miss rate: the
+    share of lookups that neither matched a team key nor an alias. The new Pokemon
+    are the misses the fuzzy matching did not resolve either."""
+    total = lookups["exact"] + lookups["alias"] + lookups["fuzzy"]
+    stats: Dict[str, float] = dict(lookups)
+    stats["miss_rate"] = lookups["fuzzy"] / total if total else 0.
+    return stats
+
 class AbstractBattle(ABC):
     MESSAGES_TO_IGNORE = {
         "-anim",
@@ -98,6 +114,9 @@ class AbstractBattle(ABC):
         "_player_role",
         "_player_username",
         "_players",
+        "_pokemon_aliases",
+        "_pokemon_aliases_size",
+        "pokemon_lookups",
         "_rating",
         "_reconnected",
         "_replay_data",
@@ -105,6 +124,7 @@ class AbstractBattle(ABC):
         "rules",
         "_reviving",
         "_save_replays",
+        "_shared_pokemon",
         "_side_conditions",
         "_team_size",
         "_team",
@@ -175,7 +195,125 @@ class AbstractBattle(ABC):
         self._team: Dict[str, Pokemon] = {}
         self._opponent_team: Dict[str, Pokemon] = {}
 
+        # ids of Pokemon objects shared with other snapshots of this battle
+        self._shared_pokemon: Optional[Set[int]] = None
+
+        # sanitized names, species and base species of the Pokemon of each team,
+        # and the identifiers the fuzzy fallback resolved, to their team keys. None
+        # marks an alias shared by several Pokemon
+        self._pokemon_aliases: Tuple[Dict[str, Optional[str]], Dict[str, Optional[str]]] = ({}, {})
+        self._pokemon_aliases_size: Tuple[int, int] = (0, 0)
+        # get_pokemon resolutions by path: exact key, alias or fuzzy, the latter
+        # creating a new Pokemon when nothing matched
+        self.pokemon_lookups: Counter = Counter()
+
 
+    def _own_pokemon(self, pokemon: Pokemon) -> Pokemon:
+        """Write barrier of battle snapshots: if pokemon is still shared with another
+        snapshot, replaces it by a private copy in this battle and returns the copy.
+        Must be called before mutating a Pokemon of a snapshotted battle.
+
+        :param pokemon: The pokemon about to be mutated.
+        :type pokemon: Pokemon
+        :return: The pokemon object owned by this battle.
+        :rtype: Pokemon
+        """
+        if not self._shared_pokemon or id(pokemon) not in self._shared_pokemon:
+            return pokemon
+        self._shared_pokemon.discard(id(pokemon))
+
+        mon = pokemon.copy()
+        for team in (self._team, self._opponent_team):
+            for key, value in team.items():
+                if value is pokemon:
+                    team[key] = mon
+        self._available_switches = [
+            mon if value is pokemon else value for value in self._available_switches
+        ]
+        return mon
+
+    def _share_pokemon(self) -> Set[int]:
+        """Marks every Pokemon of this battle as shared with a new snapshot.
+
+        :return: The ids of the shared pokemons, to be given to the snapshot.
+        :rtype: Set[int]
+        """
+        shared = {id(mon) for mon in self._team.values()}
+        shared.update(id(mon) for mon in self._opponent_team.values())
+        self._shared_pokemon = shared
+        return set(shared)
+
+    def _add_pokemon_aliases(self, team_index: int, key: str, mon: Pokemon):
+        aliases = self._pokemon_aliases[team_index]
+        aliases[sanitize_string(key)] = key
+        role = key[:2]
+        try:
+            species = {mon.species, mon.base_species}
+        except KeyError:
+            species = {mon.species}
+        for name in species:
+            if not name:
+                continue
+            alias = role + sanitize_string(name)
+            current = aliases.get(alias, key)
+            # the name of a Pokemon wins over the species of another
+            if current != key and (current is None or sanitize_string(current) != alias):
+                aliases[alias] = None
+            elif current == key:
+                aliases[alias] = key
+
+    def _index_pokemon(self, pokemon: Pokemon):
+        """Adds the aliases of pokemon to the index, e.g. after a switch revealed its
+        forme or a forme change."""
+        for team_index, team in enumerate((self._team, self._opponent_team)):
+            for key, mon in team.items():
+                if mon is pokemon:
+                    self._add_pokemon_aliases(team_index, key, mon)
+                    return
+
+    def _pokemon_alias_index(self) -> Tuple[Dict[str, Optional[str]], Dict[str, Optional[str]]]:
+        size = (len(self._team), len(self._opponent_team))
+        if size != self._pokemon_aliases_size:
+            # teams changed outside of get_pokemon: reindex them
+            self._pokemon_aliases = ({}, {})
+            for team_index, team in enumerate((self._team, self._opponent_team)):
+                for key, mon in team.items():
+                    self._add_pokemon_aliases(team_index, key, mon)
+            self._pokemon_aliases_size = size
+        return self._pokemon_aliases
+
+    def _find_pokemon(self, identifier: str, own_team: bool, opponent_team: bool) -> Optional[Pokemon]:
+        """Resolves an identifier that is not a team key through the alias index,
+        then through the fuzzy matching of the team keys, whose result is added to
+        the index."""
+        teams = []
+        if own_team:
+            teams.append((0, self._team))
+        if opponent_team:
+            teams.append((1, self._opponent_team))
+        sanitized = sanitize_string(identifier)
+        index = self._pokemon_alias_index()
+        for team_index, team in teams:
+            key = index[team_index].get(sanitized)
+            if key is not None and key in team:
+                self.pokemon_lookups["alias"] += 1
+                return team[key]
+
+        self.pokemon_lookups["fuzzy"] += 1
+        for team_index, team in teams:
+            for key in team.keys():
+                if sanitized in sanitize_string(key) or sanitize_string(key) in sanitized:
+                    index[team_index].setdefault(sanitized, key)
+                    return team[key]
+        for team_index, team in teams:
+            closest = get_close_matches(identifier, list(team.keys()), n=1, cutoff=1)
+            if len(closest) > 0:
+                index[team_index].setdefault(sanitized, closest[0])
+                return team[closest[0]]
+        return None
+
+    def pokemon_lookup_stats(self) -> Dict[str, float]:
+        return lookup_stats(self.pokemon_lookups)
 
     def get_pokemon(
         self,
@@ -202,54 +340,52 @@ class AbstractBattle(ABC):
         :raises ValueError: If the team has too many pokemons, as determined by the
             teamsize component of battle initialisation.
         """
+        pokemon = self._get_pokemon(
+            identifier,
+            force_self_team=force_self_team,
+            details=details,
+            request=request,
+            force_opp_team=force_opp_team,
+        )
+        if self._shared_pokemon:
+            return self._own_pokemon(pokemon)
+        return pokemon
+
+    def _get_pokemon(
+        self,
+        identifier: str,
+        force_self_team: bool = False,
+        details: str = "",
+        request: Optional[Dict[str, Any]] = None,
+        force_opp_team: bool = False,
+    ) -> Pokemon:
         # this is a monster but it works for the random pokemon name changes
         player_role = identifier[:2]
-        cutoff = 1
         if identifier[3] != " ":
             identifier = identifier[:2] + identifier[3:]
-        dash_mons = {'ho-oh', 'chi-yu', 'porygon-z', 'ting-lu', 'kommo-o'}
-        if '-' in identifier and len(dash_mons.intersection({identifier[4:].lower()})) == 0:
+        if '-' in identifier and identifier[4:].lower() not in DASH_MONS:
             identifier = identifier.split('-')[0]
         if not force_self_team and not force_opp_team:
-            if identifier in self._team.keys():
-                return self._team[identifier]
-            elif identifier in self._opponent_team.keys():
-                return self._opponent_team[identifier]
-            else:
-                for mon in self._team.keys():
-                    if sanitize_string(identifier) in sanitize_string(mon) or sanitize_string(mon) in sanitize_string(identifier):
-                        return self._team[mon]
-                for mon in self._opponent_team.keys():
-                    if sanitize_string(identifier) in sanitize_string(mon) or sanitize_string(mon) in sanitize_string(identifier):
-                        return self._opponent_team[mon]
-            closest = get_close_matches(identifier, list(self._team.keys()), n=1, cutoff=cutoff)
-            if len(closest) > 0:
-                identifier = closest[0]
+            if identifier in self._team:
+                self.pokemon_lookups["exact"] += 1
                 return self._team[identifier]
-            closest = get_close_matches(identifier, list(self._opponent_team.keys()), n=1, cutoff=cutoff)
-            if len(closest) > 0:
-                identifier = closest[0]
+            elif identifier in self._opponent_team:
+                self.pokemon_lookups["exact"] += 1
                 return self._opponent_team[identifier]
+            mon = self._find_pokemon(identifier, True, True)
         elif force_self_team:
             if identifier in self._team:
+                self.pokemon_lookups["exact"] += 1
                 return self._team[identifier]
-            for mon in self._team.keys():
-                if sanitize_string(identifier) in sanitize_string(mon) or sanitize_string(mon) in sanitize_string(identifier):
-                    return self._team[mon]
-            closest = get_close_matches(identifier, list(self._team.keys()), n=1, cutoff=cutoff)
-            if len(closest) > 0:
-                identifier = closest[0]
-                return self._team[identifier]
-        elif force_opp_team:
+            mon = self._find_pokemon(identifier, True, False)
+        else:
             if identifier in self._opponent_team:
+                self.pokemon_lookups["exact"] += 1
                 return self._opponent_team[identifier]
-            for mon in self._opponent_team.keys():
-                if sanitize_string(identifier) in sanitize_string(mon) or sanitize_string(mon) in sanitize_string(identifier):
-                    return self._opponent_team[mon]
-            closest = get_close_matches(identifier, list(self._opponent_team.keys()), n=1, cutoff=cutoff)
-            if len(closest) > 0:
-                identifier = closest[0]
-                return self._opponent_team[identifier]
+            mon = self._find_pokemon(identifier, False, True)
+        if mon is not None:
+            return mon
+        self.pokemon_lookups["new"] += 1
 
         is_mine = player_role == self._player_role
 
@@ -276,6 +412,9 @@ class AbstractBattle(ABC):
         else:
             species = identifier[4:]
             team[identifier] = Pokemon(species=species, gen=self._data.gen)
+        # the index was brought up to date by _find_pokemon, only this Pokemon is new
+        self._add_pokemon_aliases(0 if team is self._team else 1, identifier, team[identifier])
+        self._pokemon_aliases_size = (len(self._team), len(self._opponent_team))
         return team[identifier]
 
     @abstractmethod
@@ -355,6 +494,7 @@ class AbstractBattle(ABC):
             raise ValueError("Cannot end illusion without an active pokemon.")
         if illusioned is None:
             raise ValueError("Cannot end illusion without an illusioned pokemon.")
+        illusioned = self._own_pokemon(illusioned)
         illusionist_mon = self.get_pokemon(illusionist, details=details)
 
         if illusionist_mon is illusioned:
@@ -631,8 +771,8 @@ class AbstractBattle(ABC):
             team = (
                 self.team if pokemon[:2] == self._player_role else self._opponent_team
             )
-            for mon in team.values():
-                mon.cure_status()
+            for mon in list(team.values()):
+                self._own_pokemon(mon).cure_status()
         elif split_message[1] == "-end":
             pokemon, effect = split_message[2:4]
             self.get_pokemon(pokemon).end_effect(effect)
@@ -650,7 +790,9 @@ class AbstractBattle(ABC):
             self.field_start(condition)
         elif split_message[1] in ["-formechange", "detailschange"]:
             pokemon, species = split_message[2:4]
-            self.get_pokemon(pokemon).forme_change(species)
+            mon = self.get_pokemon(pokemon)
+            mon.forme_change(species)
+            self._index_pokemon(mon)
         elif split_message[1] == "-invertboost":
             pokemon = split_message[2]
             self.get_pokemon(pokemon).invert_boosts()
@@ -726,8 +868,8 @@ class AbstractBattle(ABC):
             self.get_pokemon(pokemon).used_z_move()
         elif split_message[1] == "clearpoke":
             self.in_team_preview = True
-            for mon in self.team.values():
-                mon.clear_active()
+            for mon in list(self.team.values()):
+                self._own_pokemon(mon).clear_active()
         elif split_message[1] == "gen":
             self._format = split_message[2]
         elif split_message[1] == "inactive":
@@ -1,3 +1,4 @@
+from copy import copy
 from logging import Logger
 from typing import Any, Dict, List, Optional, Union
 
@@ -5,6 +6,7 @@ from poke_env.environment.abstract_battle import AbstractBattle
 from poke_env.environment.move import Move
 from poke_env.environment.pokemon import Pokemon
 from poke_env.environment.pokemon_type import PokemonType
+from poke_env.environment.turn_history import TurnHistory
 
 
 class Battle(AbstractBattle):
@@ -32,7 +34,7 @@ class Battle(AbstractBattle):
         self._maybe_trapped: bool = False
         self._trapped: bool = False
 
-        self.battle_msg_history = ""
+        self.turn_history = TurnHistory()
         self.pokemon_hp_log_dict = {}
         self.speed_list = []
 
@@ -40,11 +42,50 @@ class Battle(AbstractBattle):
         self._tera_intent: bool = False
 
 
+    @property
+    def battle_msg_history(self) -> str:
+        """The "[sep]"-separated descriptions of the turns kept in turn_history."""
+        return str(self.turn_history)
+
+    @battle_msg_history.setter
+    def battle_msg_history(self, history: str):
+        self.turn_history = TurnHistory.from_string(history, self.turn_history.max_turns)
+
     def clear_all_boosts(self):
         if self.active_pokemon is not None:
-            self.active_pokemon.clear_boosts()
+            self._own_pokemon(self.active_pokemon).clear_boosts()
         if self.opponent_active_pokemon is not None:
-            self.opponent_active_pokemon.clear_boosts()
+            self._own_pokemon(self.opponent_active_pokemon).clear_boosts()
+
+    def snapshot(self) -> "Battle":
+        """Returns a copy-on-write snapshot of this battle, used by local simulations
+        to branch on a state.
+
+        The snapshot shares its Pokemon objects with this battle until one side
+        mutates them through ``get_pokemon``, at which point the mutating battle gets
+        a private copy. Side conditions, weather, fields and message logs are copied,
+        so branching only costs what the following step changes.
+
+        :return: The snapshot.
+        :rtype: Battle
+        """
+        battle = copy(self)
+        battle._shared_pokemon = self._share_pokemon()
+        battle._team = dict(self._team)
+        battle._opponent_team = dict(self._opponent_team)
+        battle._available_switches = list(self._available_switches)
+        battle._side_conditions = dict(self._side_conditions)
+        battle._opponent_side_conditions = dict(self._opponent_side_conditions)
+        battle._weather = dict(self._weather)
+        battle._fields = dict(self._fields)
+        battle.rules = list(self.rules)
+        if self._save_replays:
+            battle._replay_data = list(self._replay_data)
+        battle.turn_history = self.turn_history.copy()
+        battle._pokemon_aliases = (dict(self._pokemon_aliases[0]), dict(self._pokemon_aliases[1]))
+        battle.pokemon_hp_log_dict = dict(self.pokemon_hp_log_dict)
+        battle.speed_list = list(self.speed_list)
+        return battle
 
     def end_illusion(self, pokemon_name: str, details: str):
         if pokemon_name[:2] == self._player_role:
@@ -149,16 +190,17 @@ class Battle(AbstractBattle):
         identifier = pokemon_str.split(":")[0][:2]
         if identifier == self._player_role:
             if self.active_pokemon:
-                self.active_pokemon.switch_out()
+                self._own_pokemon(self.active_pokemon).switch_out()
             pokemon = self.get_pokemon(pokemon_str, details=details, force_self_team=True)
         else:
             if self.opponent_active_pokemon:
-                self.opponent_active_pokemon.switch_out()
+                self._own_pokemon(self.opponent_active_pokemon).switch_out()
 
             pokemon = self.get_pokemon(pokemon_str, details=details, force_opp_team=True)
 
         pokemon.switch_in(details=details)
         pokemon.set_hp_status(hp_status)
+        self._index_pokemon(pokemon)
 
     @property
     def active_pokemon(self) -> Optional[Pokemon]:
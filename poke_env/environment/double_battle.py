@@ -217,6 +217,7 @@ class DoubleBattle(AbstractBattle):
         pokemon_in = self.get_pokemon(pokemon_str, details=details)
         pokemon_in.switch_in()
         pokemon_in.set_hp_status(hp_status)
+        self._index_pokemon(pokemon_in)
         team[pokemon_identifier] = pokemon_in
 
     def _swap(self, pokemon_str: str, slot: str):
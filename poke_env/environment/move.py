@@ -102,6 +102,23 @@ class Move:
         self._dynamaxed_move = None
         self._request_target = None
 
+    def __deepcopy__(self, memodict: Optional[Dict[int, Any]] = None) -> "Move":
+        memodict = {} if memodict is None else memodict
+        move = type(self).__new__(type(self))
+        memodict[id(self)] = move
+        # the moves dict is GenData's static table
+        memodict.setdefault(id(self._moves_dict), self._moves_dict)
+        for slot in Move.__slots__:
+            try:
+                value = object.__getattribute__(self, slot)
+            except AttributeError:
+                continue
+            setattr(move, slot, copy.deepcopy(value, memodict))
+        state = getattr(self, "__dict__", None)
+        if state:
+            move.__dict__.update(copy.deepcopy(state, memodict))
+        return move
+
     def __repr__(self) -> str:
         return f"{self._id} (Move object)"
 
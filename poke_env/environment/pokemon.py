@@ -1,6 +1,7 @@
 from __future__ import annotations
 
-import json
+from collections import Counter
+from copy import deepcopy
 from typing import Any, Dict, List, Optional, Tuple, Union
 
 import numpy as np
@@ -14,6 +15,35 @@ from poke_env.environment.status import Status
 from poke_env.environment.z_crystal import Z_CRYSTAL
 import math
 
+# first +, second -
+NATURE_BOOSTS = {
+    'Adamant': ['atk', 'spa'],
+    'Bashful': [],
+    'Bold': ['def', 'atk'],
+    'Brave': ['atk', 'spe'],
+    'Calm': ['spd', 'atk'],
+    'Careful': ['spd', 'spa'],
+    'Docile': [],
+    'Gentle': ['spd', 'def'],
+    'Hardy': [],
+    'Hasty': ['spe', 'def'],
+    'Impish': ['def', 'spa'],
+    'Jolly': ['spe', 'spa'],
+    'Lax': ['def', 'spd'],
+    'Lonely': ['atk', 'def'],
+    'Mild': ['spa', 'def'],
+    'Modest': ['spa', 'atk'],
+    'Naive': ['spe', 'spd'],
+    'Naughty': ['atk', 'spd'],
+    'Quiet': ['spa', 'spe'],
+    'Quirky': [],
+    'Rash': ['spa', 'spd'],
+    'Relaxed': ['def', 'spe'],
+    'Sassy': ['spd', 'spe'],
+    'Serious': [],
+    'Timid': ['spe', 'atk'],
+}
+
 
 class Pokemon:
     __slots__ = (
@@ -27,6 +57,8 @@ class Pokemon:
         "_effects",
         "_first_turn",
         "_gender",
+        "_guessed_spread",
+        "_guessed_tera",
         "_heightm",
         "_item",
         "_last_details",
@@ -43,6 +75,7 @@ class Pokemon:
         "_shiny",
         "_revealed",
         "_species",
+        "_stats_cache",
         "_status",
         "_status_counter",
         "_terastallized",
@@ -53,6 +86,10 @@ class Pokemon:
         "_weightkg",
     )
 
+    # hits and misses of the stats, spread and tera caches, over all pokemons
+    _cache_hits: Counter = Counter()
+    _cache_misses: Counter = Counter()
+
     def __init__(
         self,
         gen: int,
@@ -111,15 +148,14 @@ class Pokemon:
         self._status: Optional[Status] = None
         self._status_counter: int = 0
 
-        if gen == 8:
-            gen_dir = 'poke_env/data/static/gen8/ou/gen8ou-1760.txt'
-        elif gen == 9:
-            gen_dir = 'poke_env/data/static/gen9/ou/sets_1825.json'
-        else:
-            gen_dir = None
-        with open(gen_dir, 'r') as f:
-            sets = json.load(f)
-        self._sets = sets
+        # Shared, read-only usage statistics: never mutate
+        self._sets: Dict[str, Any] = self._data.usage_sets()
+
+        # Memoized calculate_stats results and most likely set guesses, reset
+        # whenever species, forme or level change
+        self._stats_cache: Dict[Tuple[Any, ...], Dict[str, int]] = {}
+        self._guessed_spread: Optional[Tuple[Any, str]] = None
+        self._guessed_tera: Optional[str] = None
 
         if request_pokemon:
             self.update_from_request(request_pokemon)
@@ -144,6 +180,35 @@ class Pokemon:
             f"[Active: {self._active}, Status: {status_repr}]"
         )
 
+    def copy(self) -> Pokemon:
+        """Returns a copy of this pokemon that can be mutated independently.
+
+        Static data (pokedex entry, usage sets, Move objects) is shared with the
+        original; boosts, effects and the move dict are copied.
+
+        :return: The copied pokemon.
+        :rtype: Pokemon
+        """
+        mon = type(self).__new__(type(self))
+        for slot in self.__slots__:
+            if hasattr(self, slot):
+                setattr(mon, slot, getattr(self, slot))
+        mon._boosts = dict(self._boosts)
+        mon._effects = dict(self._effects)
+        mon._moves = dict(self._moves)
+        return mon
+
+    def __deepcopy__(self, memodict: Optional[Dict[int, Any]] = None) -> Pokemon:
+        memodict = {} if memodict is None else memodict
+        mon = type(self).__new__(type(self))
+        memodict[id(self)] = mon
+        # usage sets are shared and read-only
+        memodict.setdefault(id(self._sets), self._sets)
+        for slot in self.__slots__:
+            if hasattr(self, slot):
+                setattr(mon, slot, deepcopy(getattr(self, slot), memodict))
+        return mon
+
     def _add_move(self, move_id: str, use: bool = False) -> Optional[Move]:
         """Store the move if applicable."""
         id_ = Move.retrieve_id(move_id)
@@ -378,17 +443,60 @@ class Pokemon:
         # self._terastallized_type = None
         self._terastallized = False
 
+    def terastallized_copy(self, type_: str = '') -> Pokemon:
+        """Returns a copy of this pokemon as if it terastallized, see terastallize,
+        to evaluate a tera without touching a pokemon shared by battle snapshots.
+
+        :param type_: The tera type, guessed from the usage sets if empty and unknown.
+        :type type_: str
+        :return: The terastallized copy.
+        :rtype: Pokemon
+        """
+        mon = self.copy()
+        mon.terastallize(type_)
+        return mon
+
     def transform(self, into: Pokemon):
         current_hp = self.current_hp
         self._update_from_pokedex(into.species, store_species=False)
         self._current_hp = int(current_hp)
         self._boosts = into.boosts.copy()
 
+    def _clear_stats_cache(self):
+        # new objects rather than clear(): copies made with copy() share them
+        self._stats_cache = {}
+        self._guessed_spread = None
+        self._guessed_tera = None
+
+    @classmethod
+    def cache_info(cls) -> Dict[str, Dict[str, float]]:
+        """Returns the hits, misses and hit rate of the memoized stats, guessed
+        spreads and guessed tera types, over all pokemons of the process.
+
+        :return: The counters, keyed by 'stats', 'spread' and 'tera'.
+        :rtype: Dict[str, Dict[str, float]]
+        """
+        info = {}
+        for name in ('stats', 'spread', 'tera'):
+            hits, misses = cls._cache_hits[name], cls._cache_misses[name]
+            info[name] = {
+                'hits': hits,
+                'misses': misses,
+                'hit_rate': hits / (hits + misses) if hits + misses else 0.,
+            }
+        return info
+
+    @classmethod
+    def reset_cache_info(cls):
+        cls._cache_hits.clear()
+        cls._cache_misses.clear()
+
     def _update_from_pokedex(self, species: str, store_species: bool = True):
         species = to_id_str(species)
         dex_entry = self._data.pokedex[species]
         if store_species:
             self._species = species
+        self._clear_stats_cache()
         self._base_stats = dex_entry["baseStats"]
         self._type_1 = PokemonType.from_name(dex_entry["types"][0])
         if len(dex_entry["types"]) == 1:
@@ -445,10 +553,10 @@ class Pokemon:
         else:
             self._gender = PokemonGender.NEUTRAL
 
-        if level:
-            self._level = int(level[1:])
-        else:
-            self._level = 100
+        level = int(level[1:]) if level else 100
+        if level != self._level:
+            self._level = level
+            self._clear_stats_cache()
 
         if species != self._species:
             self._update_from_pokedex(species)
@@ -548,7 +656,7 @@ class Pokemon:
         Returns the damage multiplier associated with a given type or move on this
         pokemon.
 
-        This method is a shortcut for PokemonType.damage_multiplier with relevant types.
+        This method is a shortcut for GenData.damage_multiplier with relevant types.
 
         :param type_or_move: The type or move of interest.
         :type type_or_move: PokemonType or Move
@@ -557,9 +665,7 @@ class Pokemon:
         """
         if isinstance(type_or_move, Move):
             type_or_move = type_or_move.type
-        return type_or_move.damage_multiplier(
-            self._type_1, self._type_2, type_chart=self._data.type_chart
-        )
+        return self._data.damage_multiplier(type_or_move, self._type_1, self._type_2)
 
     @property
     def ability(self) -> Optional[str]:
@@ -816,7 +922,12 @@ class Pokemon:
         return self._revealed
     
     @property
-    def sets(self) -> Dict:
+    def sets(self) -> Dict[str, Any]:
+        """
+        :return: The usage statistics of the metagame, keyed by species. This dict is
+            shared between every Pokemon of the same generation and is read-only.
+        :rtype: Dict[str, Any]
+        """
         return self._sets
 
     @property
@@ -867,9 +978,14 @@ class Pokemon:
             return ''
 
         if guess_type == 'most_likely':
+            if self._guessed_tera is not None:
+                self._cache_hits['tera'] += 1
+                return self._guessed_tera
+            self._cache_misses['tera'] += 1
             # most likely based on stats
             set = sets[self.species.lower()]['tera'][0]
             tera = set['name']
+            self._guessed_tera = tera
         
         else:
             # statistically weighted choice (copy paste lol)
@@ -897,10 +1013,15 @@ class Pokemon:
         stat_types = ['hp', 'atk', 'def', 'spa', 'spd', 'spe']
         sets = self._sets
         if guess_type == 'most_likely':
+            if self._guessed_spread is not None:
+                self._cache_hits['spread'] += 1
+                return self._guessed_spread
+            self._cache_misses['spread'] += 1
             # most likely based on statistics
             set = sets[self.species.lower()]['spreads'][0]
             spread = set['stats']
             nature = set['nature']
+            self._guessed_spread = spread, nature
         else:
             # statistically weighted choice
             def get_weighted_choice(category, id, size=1):
@@ -966,6 +1087,18 @@ class Pokemon:
         if not 'random' in battle_format:
             # brute force the iv/ev
             evs, nature = self.guess_stats()
+        # species, forme and level are covered by _clear_stats_cache
+        key = (tuple(ivs), tuple(evs), nature)
+        stats = self._stats_cache.get(key)
+        if stats is not None:
+            self._cache_hits['stats'] += 1
+            return dict(stats)
+        self._cache_misses['stats'] += 1
+        stats = self._calculate_stats(ivs, evs, nature)
+        self._stats_cache[key] = stats
+        return dict(stats)
+
+    def _calculate_stats(self, ivs, evs, nature) -> Dict[str, int]:
         def common_pkmn_stat_calc(stat: int, iv: int, ev: int, level: int):
             return math.floor(((2 * stat + iv + math.floor(ev / 4)) * level) / 100)
 
@@ -1012,35 +1145,7 @@ class Pokemon:
                             self._level
                         ) + 5
         if nature is not None:
-            # first +, second -
-            nature_boosts = {
-                'Adamant': ['atk', 'spa'],
-                'Bashful': [],
-                'Bold': ['def', 'atk'],
-                'Brave': ['atk', 'spe'],
-                'Calm': ['spd', 'atk'],
-                'Careful': ['spd', 'spa'],
-                'Docile': [],
-                'Gentle': ['spd', 'def'],
-                'Hardy': [],
-                'Hasty': ['spe', 'def'],
-                'Impish': ['def', 'spa'],
-                'Jolly': ['spe', 'spa'],
-                'Lax': ['def', 'spd'],
-                'Lonely': ['atk', 'def'],
-                'Mild': ['spa', 'def'],
-                'Modest': ['spa', 'atk'],
-                'Naive': ['spe', 'spd'],
-                'Naughty': ['atk', 'spd'],
-                'Quiet': ['spa', 'spe'],
-                'Quirky': [],
-                'Rash': ['spa', 'spd'],
-                'Relaxed': ['def', 'spe'],
-                'Sassy': ['spd', 'spe'],
-                'Serious': [],
-                'Timid': ['spe', 'atk'],
-            }
-            buff, nerf = nature_boosts[nature]
+            buff, nerf = NATURE_BOOSTS[nature]
             new_stats[buff] = math.floor(1.1*new_stats[buff])
             new_stats[nerf] = math.floor(0.9*new_stats[nerf])
         
@@ -0,0 +1,104 @@
+"""Ring buffer of the turn descriptions of a battle, rendered for prompts.
+"""
+from typing import Dict, List, Tuple
+
+# (old, new) replacements rendering the history from a point of view, applied in
+# order
+Perspective = Tuple[Tuple[str, str], ...]
+
+PLAYER1_PERSPECTIVE: Perspective = (("p1a: ", ""), ("p2a:", "opposing"), ("Player1", "You"), ("Player2", "Opponent"))
+PLAYER2_PERSPECTIVE: Perspective = (("p2a: ", ""), ("p1a:", "opposing"), ("Player2", "You"), ("Player1", "Opponent"))
+# used by the LLM simulated transitions of LocalSim, from either side
+NEUTRAL_PERSPECTIVE: Perspective = (("p1a: ", "player:"), ("p2a:", "opponent:"), ("Player1", "Player"), ("Player2", "Opponent"))
+
+SEPARATOR = "[sep]"
+
+
+def _render(text: str, perspective: Perspective) -> str:
+    for old, new in perspective:
+        text = text.replace(old, new)
+    return text
+
+
+class _Turn():
+    """Description of a finished turn and its renderings, which never change."""
+
+    __slots__ = ("text", "rendered")
+
+    def __init__(self, text: str):
+        self.text = text
+        self.rendered: Dict[Perspective, str] = {}
+
+    def render(self, perspective: Perspective) -> str:
+        rendered = self.rendered.get(perspective)
+        if rendered is None:
+            rendered = self.rendered[perspective] = _render(self.text, perspective)
+        return rendered
+
+
+class TurnHistory():
+    """Descriptions of the last turns of a battle, appended as its messages are
+    handled. Each turn is rendered once per perspective, and copies of the history,
+    such as the ones of simulated branches, share their finished turns, so the text
+    of the last N turns costs O(N) however long the battle is.
+
+    The history reads as the "[sep]"-separated string it replaces: the first
+    segment is the battle start, then one per turn, the last one being the turn in
+    progress.
+
+    :param max_turns: Number of finished turns kept.
+    """
+
+    __slots__ = ("max_turns", "_turns", "_current")
+
+    def __init__(self, max_turns: int=16):
+        self.max_turns = max_turns
+        self._turns: Tuple[_Turn, ...] = ()
+        self._current = ""
+
+    @classmethod
+    def from_string(cls, history: str, max_turns: int=16) -> "TurnHistory":
+        turn_history = cls(max_turns)
+        turn_history.append(history)
+        return turn_history
+
+    def append(self, description: str):
+        """Appends a message description. "[sep]" in it starts a new turn."""
+        if SEPARATOR not in description:
+            self._current += description
+            return
+        segments = description.split(SEPARATOR)
+        turns = [_Turn(self._current + segments[0])] + [_Turn(segment) for segment in segments[1:-1]]
+        self._turns = (self._turns + tuple(turns))[-self.max_turns:]
+        self._current = segments[-1]
+
+    def copy(self) -> "TurnHistory":
+        turn_history = TurnHistory.__new__(TurnHistory)
+        turn_history.max_turns = self.max_turns
+        turn_history._turns = self._turns
+        turn_history._current = self._current
+        return turn_history
+
+    def __copy__(self) -> "TurnHistory":
+        return self.copy()
+
+    def __deepcopy__(self, memo) -> "TurnHistory":
+        return self.copy()
+
+    def last_turns(self, n_turn: int) -> List[str]:
+        """Returns the descriptions of the last n_turn finished turns and of the
+        turn in progress."""
+        turns = self._turns[-n_turn:] if n_turn > 0 else ()
+        return [turn.text for turn in turns] + [self._current]
+
+    def render(self, n_turn: int, perspective: Perspective) -> str:
+        """Returns the last n_turn finished turns and the turn in progress, one per
+        line, from a perspective."""
+        turns = self._turns[-n_turn:] if n_turn > 0 else ()
+        return "\n".join([turn.render(perspective) for turn in turns] + [_render(self._current, perspective)])
+
+    def __str__(self) -> str:
+        return SEPARATOR.join(self.last_turns(len(self._turns)))
+
+    def __len__(self) -> int:
+        return len(self._turns) + 1
@@ -2,9 +2,14 @@
 """
 from poke_env.concurrency import POKE_LOOP
 from poke_env.player import random_player, utils
+from poke_env.player.battle_farm import make_matchups, merge_farm_results, run_battle_farm
 from poke_env.player.baselines import MaxBasePowerPlayer, AbyssalPlayer, OneStepPlayer
+from poke_env.player.decision_executor import DecisionExecutor, DecisionStats
+from poke_env.player.llm_cache import LLMResponseCache
 from poke_env.player.llm_player import LLMPlayer
 from poke_env.player.local_simulation import LocalSim, SimNode
+from poke_env.player.log_writer import LogWriter, compact_score_log
+from poke_env.player.mcts_player import MCTSPlayer, MonteCarloTreeSearch
 from poke_env.player.battle_order import (
     BattleOrder,
     DefaultBattleOrder,
@@ -15,6 +20,7 @@ from poke_env.player.player import Player
 from poke_env.player.prompt_eval import eval_action_player
 from poke_env.player.prompts import prompt_translate, state_translate, state_translate2
 from poke_env.player.random_player import RandomPlayer
+from poke_env.player.transposition_table import TranspositionTable
 from poke_env.player.team_util import load_random_team, get_llm_player
 from poke_env.player.utils import (
     background_cross_evaluate,
@@ -39,8 +45,16 @@ __all__ = [
     "PSClient",
     "Player",
     "LLMPlayer",
+    "LLMResponseCache",
+    "DecisionExecutor",
+    "DecisionStats",
+    "LogWriter",
+    "compact_score_log",
     "RandomPlayer",
     "cross_evaluate",
+    "run_battle_farm",
+    "merge_farm_results",
+    "make_matchups",
     "background_cross_evaluate",
     "background_evaluate_player",
     "evaluate_player",
@@ -50,6 +64,9 @@ __all__ = [
     "MaxBasePowerPlayer",
     "AbyssalPlayer",
     "OneStepPlayer",
+    "MCTSPlayer",
+    "MonteCarloTreeSearch",
     "LocalSim",
     "SimNode",
+    "TranspositionTable",
 ]
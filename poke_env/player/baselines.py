@@ -1,6 +1,5 @@
-from copy import deepcopy
 from time import sleep
-from typing import List
+from typing import Dict, List
 import json
 import os
 
@@ -13,60 +12,29 @@ from poke_env.environment.move import Move
 from poke_env.environment.move_category import MoveCategory
 from poke_env.environment.pokemon import Pokemon
 from poke_env.environment.side_condition import SideCondition
+from poke_env.environment.turn_history import PLAYER1_PERSPECTIVE, PLAYER2_PERSPECTIVE
 from poke_env.player.local_simulation import LocalSim, SimNode
+from poke_env.player.local_simulation import calculate_move_type_damage_multipier as local_calculate_move_type_damage_multipier
 from poke_env.player.player import Player
+from poke_env.player.transposition_table import TranspositionTable
 from poke_env.data.gen_data import GenData
-from poke_env.player.prompts import get_micro_strat, get_move_prompt, get_number_turns_faint, get_status_num_turns_fnt, prompt_translate
-
-with open("./poke_env/data/static/moves/moves_effect.json", "r") as f:
-    move_effect = json.load(f)
-
-def calculate_move_type_damage_multipier(type_1, type_2, type_chart, constraint_type_list):
-    TYPE_list = 'BUG,DARK,DRAGON,ELECTRIC,FAIRY,FIGHTING,FIRE,FLYING,GHOST,GRASS,GROUND,ICE,NORMAL,POISON,PSYCHIC,ROCK,STEEL,WATER'.split(",")
-
-    move_type_damage_multiplier_list = []
-
-    if type_2:
-        for type in TYPE_list:
-            move_type_damage_multiplier_list.append(type_chart[type_1][type] * type_chart[type_2][type])
-        move_type_damage_multiplier_dict = dict(zip(TYPE_list, move_type_damage_multiplier_list))
-    else:
-        move_type_damage_multiplier_dict = type_chart[type_1]
-
-    effective_type_list = []
-    extreme_type_list = []
-    resistant_type_list = []
-    extreme_resistant_type_list = []
-    immune_type_list = []
-    for type, value in move_type_damage_multiplier_dict.items():
-        if value == 2:
-            effective_type_list.append(type)
-        elif value == 4:
-            extreme_type_list.append(type)
-        elif value == 1 / 2:
-            resistant_type_list.append(type)
-        elif value == 1 / 4:
-            extreme_resistant_type_list.append(type)
-        elif value == 0:
-            immune_type_list.append(type)
-        else:  # value == 1
-            continue
-
-    if constraint_type_list:
-        extreme_type_list = list(set(extreme_type_list).intersection(set(constraint_type_list)))
-        effective_type_list = list(set(effective_type_list).intersection(set(constraint_type_list)))
-        resistant_type_list = list(set(resistant_type_list).intersection(set(constraint_type_list)))
-        extreme_resistant_type_list = list(set(extreme_resistant_type_list).intersection(set(constraint_type_list)))
-        immune_type_list = list(set(immune_type_list).intersection(set(constraint_type_list)))
-
-    return extreme_type_list, effective_type_list, resistant_type_list, extreme_resistant_type_list, immune_type_list
-
-
-def move_type_damage_wraper(pokemon_name, type_1, type_2, type_chart, constraint_type_list=None):
+from poke_env.data.static_cache import static_data
+from poke_env.player.replay_context import load_static_tables
+from poke_env.player.prompts import get_micro_strat, get_move_prompt, get_number_turns_faint_batch, get_status_num_turns_fnt, prompt_translate
+
+move_effect = static_data().table("moves/moves_effect")
+
+def calculate_move_type_damage_multipier(type_1, type_2, gen, constraint_type_list):
+    # same lookup as the local simulator, with upper case type names
+    return tuple([type.upper() for type in type_list] for type_list in local_calculate_move_type_damage_multipier(
+        type_1, type_2, gen, constraint_type_list))
+
+
+def move_type_damage_wraper(pokemon_name, type_1, type_2, gen, constraint_type_list=None):
 
     move_type_damage_prompt = ""
     extreme_effective_type_list, effective_type_list, resistant_type_list, extreme_resistant_type_list, immune_type_list = calculate_move_type_damage_multipier(
-        type_1, type_2, type_chart, constraint_type_list)
+        type_1, type_2, gen, constraint_type_list)
 
     if effective_type_list or resistant_type_list or immune_type_list:
 
@@ -127,24 +95,19 @@ class Human(Player):
         self.team_str = team
         self.use_strat_prompt = _use_strat_prompt
         
-        with open("./poke_env/data/static/moves/moves_effect.json", "r") as f:
-            self.move_effect = json.load(f)
+        # shared with every player of the process, read-only
+        tables = load_static_tables()
+        self.move_effect = tables["move_effect"]
         # only used in old prompting method, replaced by statistcal sets data
-        with open(f"./poke_env/data/static/moves/gen8pokemon_move_dict.json", "r") as f:
-            self.pokemon_move_dict = json.load(f)
-        with open("./poke_env/data/static/abilities/ability_effect.json", "r") as f:
-            self.ability_effect = json.load(f)
+        self.pokemon_move_dict = tables["pokemon_move_dict"]
+        self.ability_effect = tables["ability_effect"]
         # only used is old prompting method
-        with open("./poke_env/data/static/abilities/gen8pokemon_ability_dict.json", "r") as f:
-            self.pokemon_ability_dict = json.load(f)
-        with open("./poke_env/data/static/items/item_effect.json", "r") as f:
-            self.item_effect = json.load(f)
+        self.pokemon_ability_dict = tables["pokemon_ability_dict"]
+        self.item_effect = tables["item_effect"]
         # unused
-        # with open(f"./poke_env/data/static/items/gen8pokemon_item_dict.json", "r") as f:
-        #     self.pokemon_item_dict = json.load(f)
+        # self.pokemon_item_dict = static_data().table("items/gen8pokemon_item_dict")
         self.pokemon_item_dict = {}
-        with open(f"./poke_env/data/static/pokedex/gen{self.gen.gen}pokedex.json", "r") as f:
-            self._pokemon_dict = json.load(f)
+        self._pokemon_dict = static_data().table(f"pokedex/gen{self.gen.gen}pokedex")
 
         self.last_plan = ""
     def choose_move(self, battle: AbstractBattle):
@@ -197,24 +160,24 @@ class OneStepPlayer(Player):
                          server_configuration=server_configuration)
         
         self.gen = GenData.from_format(battle_format)
-        with open("./poke_env/data/static/moves/moves_effect.json", "r") as f:
-            self.move_effect = json.load(f)
-        with open("./poke_env/data/static/moves/gen8pokemon_move_dict.json", "r") as f:
-            self.pokemon_move_dict = json.load(f)
-        with open("./poke_env/data/static/abilities/ability_effect.json", "r") as f:
-            self.ability_effect = json.load(f)
-        with open("./poke_env/data/static/abilities/gen8pokemon_ability_dict.json", "r") as f:
-            self.pokemon_ability_dict = json.load(f)
-        with open("./poke_env/data/static/items/item_effect.json", "r") as f:
-            self.item_effect = json.load(f)
-        with open("./poke_env/data/static/items/gen8pokemon_item_dict.json", "r") as f:
-            self.pokemon_item_dict = json.load(f)
-        with open("./poke_env/data/static/pokedex/gen8pokedex.json", "r") as f:
-            self._pokemon_dict = json.load(f)
+        # shared with every player of the process, read-only
+        tables = load_static_tables()
+        self.move_effect = tables["move_effect"]
+        self.pokemon_move_dict = tables["pokemon_move_dict"]
+        self.ability_effect = tables["ability_effect"]
+        self.pokemon_ability_dict = tables["pokemon_ability_dict"]
+        self.item_effect = tables["item_effect"]
+        self.pokemon_item_dict = static_data().table("items/gen8pokemon_item_dict")
+        self._pokemon_dict = static_data().table("pokedex/gen8pokedex")
             
         self.t = 0
         self.K = 1
+        self._transposition_tables: Dict[str, TranspositionTable] = {}
     
+    def _battle_finished_callback(self, battle: AbstractBattle):
+        # the search results of a finished battle are never looked up again
+        self._transposition_tables.pop(battle.battle_tag, None)
+
     def estimate_matchup(self, sim: LocalSim, battle: Battle, mon: Pokemon, mon_opp: Pokemon, is_opp: bool=False):
         hp_remaining = []
         moves = list(mon.moves.keys())
@@ -222,14 +185,12 @@ class OneStepPlayer(Player):
         #     moves = sim.get_opponent_current_moves(mon=mon)
         if battle.active_pokemon.species == mon.species and not is_opp:
             moves = [move.id for move in battle.available_moves]
-        for move_id in moves:
-            move = Move(move_id, gen=sim.gen.gen)
-            t = np.inf
+        move_list = [Move(move_id, gen=sim.gen.gen) for move_id in moves]
+        move_turns, _ = get_number_turns_faint_batch(mon, move_list, mon_opp, sim, boosts1=mon._boosts.copy(), boosts2=mon_opp.boosts.copy())
+        for move, t in zip(move_list, move_turns):
             if move.category == MoveCategory.STATUS:
                 # apply stat boosting effects to see if it will KO in fewer turns
                 t = get_status_num_turns_fnt(mon, move, mon_opp, sim, boosts=mon._boosts.copy())
-            else:
-                t = get_number_turns_faint(mon, move, mon_opp, sim, boosts1=mon._boosts.copy(), boosts2=mon_opp.boosts.copy())
             hp_remaining.append(t)
             # _, hp2, _, _ = sim.calculate_remaining_hp(battle.active_pokemon, battle.opponent_active_pokemon, move, None)
             # hp_remaining.append(hp2)
@@ -282,8 +243,7 @@ class OneStepPlayer(Player):
     def tree_search(self, retries, battle):
         # generate local simulation
         self.B = 5
-        q = [
-                SimNode(battle, 
+        root = SimNode(battle, 
                     self.move_effect,
                     self.pokemon_move_dict,
                     self.ability_effect,
@@ -295,8 +255,11 @@ class OneStepPlayer(Player):
                     depth=1,
                     format=self.format
                     ) 
-                for i in range(self.B*self.B)
-            ]
+        if battle.battle_tag not in self._transposition_tables:
+            self._transposition_tables[battle.battle_tag] = TranspositionTable()
+        table = self._transposition_tables[battle.battle_tag]
+        table.new_search()
+        q = [root.fork() for i in range(self.B*self.B)]
         # collect actions for next step
         available_actions = []
         if not battle.active_pokemon.fainted:
@@ -334,11 +297,25 @@ class OneStepPlayer(Player):
             action_opp = node.action_opp
             if action == None and action_opp == None: continue
 
+            # the sampled action pairs repeat: reuse the outcome of a transition
+            # already simulated from the same state when it ends the search
+            transition = (
+                node.simulation.state_key(),
+                action.message if action is not None else None,
+                action_opp.message if action_opp is not None else None,
+            )
+            outcome = table.get(transition, 'leaf')
+            if outcome is not None and node.depth == self.K:
+                node.hp_diff = outcome
+                leaf_nodes.append(node)
+                continue
+
             # simulate outcome
             node.simulation.step(action, action_opp)
 
             # determine value by difference in HP
             node.hp_diff = node.simulation.get_hp_diff()
+            table.put(transition, 'leaf', node.hp_diff)
 
             # if terminal condition: add to terminal list
             # else: update tree by adding node to queue B times
@@ -370,7 +347,7 @@ class OneStepPlayer(Player):
                     if actions_opp is None:
                         actions_opp = [None]
                     for j in range(len(actions_opp)):
-                        node_new = deepcopy(node)
+                        node_new = node.fork()
                         node_new.depth = node.depth + 1
                         node_new.action = available_actions[i]
                         node_new.action_opp = actions_opp[j]
@@ -685,9 +662,9 @@ class AbyssalPlayer(Player):
         system_prompt = "You are a pokemon master that targets to win the pokemon battle.\n"
         n_turn = 5
         if "p1" in list(battle.team.keys())[0]:
-            context_prompt = f"Historical turns:\n" + "\n".join(battle.battle_msg_history.split("[sep]")[-1 * (n_turn + 1):]).replace("p1a: ", "").replace("p2a:","opposing").replace("Player1", "You").replace("Player2", "Opponent")
+            context_prompt = f"Historical turns:\n" + battle.turn_history.render(n_turn, PLAYER1_PERSPECTIVE)
         else:
-            context_prompt = f"Historical turns:\n" + "\n".join(battle.battle_msg_history.split("[sep]")[-1 * (n_turn + 1):]).replace("p2a: ", "").replace("p1a:","opposing").replace("Player2", "You").replace("Player1", "Opponent")
+            context_prompt = f"Historical turns:\n" + battle.turn_history.render(n_turn, PLAYER2_PERSPECTIVE)
 
         if battle.active_pokemon.fainted:
             battle_prompt = system_prompt + context_prompt + f" Your {battle.active_pokemon.species} fainted. You need to decide which pokemon to switch.\nCurrent battle state:\n"
@@ -750,7 +727,7 @@ class AbyssalPlayer(Player):
         if opponent_boost_prompt:
             opponent_prompt = opponent_prompt + " Boosts: " + opponent_boost_prompt + "."
 
-        opponent_move_type_damage_prompt = move_type_damage_wraper(battle.opponent_active_pokemon.species, type_1, type_2, self.gen.type_chart, None)
+        opponent_move_type_damage_prompt = move_type_damage_wraper(battle.opponent_active_pokemon.species, type_1, type_2, self.gen, None)
 
         if opponent_move_type_damage_prompt:
             opponent_prompt = opponent_prompt + " " + opponent_move_type_damage_prompt + ".\n"
@@ -791,7 +768,7 @@ class AbyssalPlayer(Player):
                 type_2 = battle.active_pokemon.type_2.name
                 active_type = active_type + " and " + type_2
 
-        active_move_type_damage_prompt = move_type_damage_wraper(battle.active_pokemon.species, type_1, type_2, self.gen.type_chart, opponent_type_list)
+        active_move_type_damage_prompt = move_type_damage_wraper(battle.active_pokemon.species, type_1, type_2, self.gen, opponent_type_list)
 
         active_pokemon_prompt = (f"Your current pokemon: {battle.active_pokemon.species}, {active_type}, HP: {active_hp_fraction}%, Status: {self.check_status(active_status)}. "
                                  f"Attack: {active_base_states['atk']}, Defense: {active_base_states['def']}, Special attack: {active_base_states['spa']}, Special defense: {active_base_states['spd']}, Speed: {active_base_states['spe']}.")
@@ -903,7 +880,7 @@ class AbyssalPlayer(Player):
 
                               # f" Ability (times): attack: {round(rela_attack,2)}, defense: {round(rela_defense,2)}, special attack: {round(rela_spe_attack,2)}, special defense: {round(rela_spe_defense,2)}, speed: {round(rela_speed,2)}.")
 
-            pokemon_move_type_damage_prompt = move_type_damage_wraper(pokemon.species, type_1, type_2,self.gen.type_chart, opponent_type_list)
+            pokemon_move_type_damage_prompt = move_type_damage_wraper(pokemon.species, type_1, type_2,self.gen, opponent_type_list)
 
             if pokemon_move_type_damage_prompt:
                 switch_prompt = switch_prompt + " " + pokemon_move_type_damage_prompt + "\n"
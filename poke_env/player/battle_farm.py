@@ -0,0 +1,263 @@
+"""Multi-process battle farm, playing the matchups of a tournament in parallel
+against the local showdown server.
+
+Every worker process logs in its own accounts and pulls matchups from a shared
+queue, so that long games do not hold back the other workers. Results are
+appended to one JSONL file per worker as soon as a game ends; an interrupted
+tournament resumes where it stopped, and merge_farm_results gathers the files
+into the model_a / model_b / winner / turns table read by whr.
+"""
+import asyncio
+import glob
+import multiprocessing
+import os
+import queue
+import time
+from typing import Any, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+import numpy as np
+import orjson
+import pandas as pd
+from tqdm import tqdm
+
+from poke_env.data.static_cache import ensure_static_cache
+from poke_env.player.team_util import get_llm_player, list_team_ids, load_random_team
+
+# (backend, prompt_algo, name), as accepted by get_llm_player. The name is also
+# the model name of the results
+PlayerSpec = Tuple[str, str, str]
+
+
+class Matchup(NamedTuple):
+    game_id: int
+    player_a: PlayerSpec
+    player_b: PlayerSpec
+    team_a: Optional[int]
+    team_b: Optional[int]
+
+
+def make_matchups(
+    specs: Sequence[PlayerSpec],
+    n_challenges: int,
+    battle_format: str = "gen9ou",
+    seed: int = 0,
+) -> List[Matchup]:
+    """Returns n_challenges games for every pair of specs, player_a challenging
+    player_b, with random teams from the team pool of the format if it has one.
+    The same arguments always give the same matchups, which is what allows a farm
+    to resume.
+    """
+    rng = np.random.default_rng(seed)
+    team_ids = list_team_ids(battle_format)
+    matchups = []
+    for i, spec_a in enumerate(specs):
+        for spec_b in specs[i + 1:]:
+            for _ in range(n_challenges):
+                team_a = int(rng.choice(team_ids)) if team_ids else None
+                team_b = int(rng.choice(team_ids)) if team_ids else None
+                matchups.append(Matchup(len(matchups), tuple(spec_a), tuple(spec_b), team_a, team_b))
+    return matchups
+
+
+def _results_paths(results_dir: str) -> List[str]:
+    return sorted(glob.glob(os.path.join(results_dir, "worker-*.jsonl")))
+
+
+def read_farm_results(results_dir: str) -> List[dict]:
+    """Returns the results stored in results_dir, one per game id. A partially
+    written last line, left by a killed worker, is ignored."""
+    results = {}
+    for path in _results_paths(results_dir):
+        with open(path, "rb") as f:
+            for line in f:
+                try:
+                    result = orjson.loads(line)
+                except orjson.JSONDecodeError:
+                    continue
+                results.setdefault(result["game_id"], result)
+    return [results[game_id] for game_id in sorted(results)]
+
+
+def merge_farm_results(results_dir: str, file: Optional[str] = None) -> pd.DataFrame:
+    """Merges the results of every worker into the table of write_stats, also
+    written to file if given.
+
+    :param results_dir: Results directory of the farm.
+    :type results_dir: str
+    :param file: CSV file to write the table to.
+    :type file: str, optional
+    :return: One row per game, in game id order, with model_a, model_b, winner and
+        turns columns.
+    :rtype: pd.DataFrame
+    """
+    results = read_farm_results(results_dir)
+    df = pd.DataFrame(results, columns=["game_id", "model_a", "model_b", "winner", "turns"])
+    df = df[["model_a", "model_b", "winner", "turns"]]
+    if file is not None:
+        df.to_csv(file, mode="w")
+    return df
+
+
+async def _play(players: dict, matchup: Matchup, battle_format: str) -> dict:
+    player_a, player_b = players[matchup.player_a], players[matchup.player_b]
+    if matchup.team_a is not None:
+        player_a.update_team(load_random_team(matchup.team_a, battle_format))
+    if matchup.team_b is not None:
+        player_b.update_team(load_random_team(matchup.team_b, battle_format))
+
+    start = time.perf_counter()
+    await player_a.battle_against(player_b)
+    battle = next(iter(player_a.battles.values()))
+    if player_a.n_won_battles > 0:
+        winner = "model_a"
+    elif player_b.n_won_battles > 0:
+        winner = "model_b"
+    else:
+        winner = "tie"
+    result = {
+        "game_id": matchup.game_id,
+        "model_a": matchup.player_a[2],
+        "model_b": matchup.player_b[2],
+        "winner": winner,
+        "turns": battle.turn,
+        "team_a": matchup.team_a,
+        "team_b": matchup.team_b,
+        "battle_tag": battle.battle_tag,
+        "duration": time.perf_counter() - start,
+    }
+    player_a.reset_battles()
+    player_b.reset_battles()
+    return result
+
+
+async def _farm_worker_async(worker_index, args, battle_format, run_id, matchups, progress, results_dir):
+    players = {}
+    llm = None
+    path = os.path.join(results_dir, f"worker-{worker_index:03d}.jsonl")
+    with open(path, "ab") as store:
+        while True:
+            matchup = matchups.get()
+            if matchup is None:
+                break
+            for spec in (matchup.player_a, matchup.player_b):
+                if spec in players:
+                    continue
+                backend, prompt_algo, name = spec
+                llm_backend = None
+                if "llama" in backend:
+                    # a local model is loaded once per worker
+                    if llm is None:
+                        from poke_env.player.llama_player import LLAMAPlayer
+                        llm = LLAMAPlayer(device=getattr(args, "device", 0))
+                    llm_backend = llm
+                players[spec] = get_llm_player(
+                    args, backend, prompt_algo, name,
+                    battle_format=battle_format,
+                    llm_backend=llm_backend,
+                    PNUMBER1=f"{run_id}{worker_index}",
+                )
+            result = await _play(players, matchup, battle_format)
+            result["worker"] = worker_index
+            store.write(orjson.dumps(result) + b"\n")
+            store.flush()
+            progress.put(result)
+
+
+def _farm_worker(worker_index, args, battle_format, run_id, matchups, progress, results_dir):
+    """Worker process entry point: plays matchups until it gets None."""
+    asyncio.run(_farm_worker_async(
+        worker_index, args, battle_format, run_id, matchups, progress, results_dir
+    ))
+
+
+def run_battle_farm(
+    specs: Sequence[PlayerSpec],
+    args: Any,
+    n_workers: int,
+    n_challenges: int,
+    results_dir: str,
+    battle_format: str = "gen9ou",
+    run_id: Optional[str] = None,
+    seed: int = 0,
+    rating_engine: Any = None,
+) -> int:
+    """Plays the matchups of make_matchups(specs, n_challenges, battle_format, seed)
+    that have no result in results_dir yet, in n_workers processes.
+
+    :param specs: The players of the tournament.
+    :type specs: Sequence[PlayerSpec]
+    :param args: Arguments passed to get_llm_player, e.g. the parsed command line.
+        Must be picklable.
+    :type args: Any
+    :param n_workers: Number of worker processes.
+    :type n_workers: int
+    :param n_challenges: Number of games per pair of players.
+    :type n_challenges: int
+    :param results_dir: Directory of the append-only results of the workers.
+    :type results_dir: str
+    :param battle_format: Format of the games.
+    :type battle_format: str
+    :param run_id: Suffix making the account names of this run unique on the
+        server. Random if None.
+    :type run_id: str, optional
+    :param seed: Seed of the matchups and teams.
+    :type seed: int
+    :param rating_engine: Receives every result as it arrives, through
+        add_game(model_a, model_b, winner), e.g. a whr.RatingEngine.
+    :type rating_engine: Any, optional
+    :return: The number of games played.
+    :rtype: int
+    """
+    os.makedirs(results_dir, exist_ok=True)
+    if run_id is None:
+        run_id = str(np.random.randint(0, 1000))
+    matchups = make_matchups(specs, n_challenges, battle_format, seed)
+    done: Set[int] = {result["game_id"] for result in read_farm_results(results_dir)}
+    pending = [matchup for matchup in matchups if matchup.game_id not in done]
+    n_workers = max(1, min(n_workers, len(pending)))
+
+    # the workers map the same compiled static data instead of each parsing the
+    # JSON files
+    ensure_static_cache()
+    ctx = multiprocessing.get_context("spawn")
+    matchup_queue = ctx.Queue()
+    progress = ctx.Queue()
+    for matchup in pending:
+        matchup_queue.put(matchup)
+    for _ in range(n_workers):
+        matchup_queue.put(None)
+
+    workers = [
+        ctx.Process(
+            target=_farm_worker,
+            args=(i, args, battle_format, run_id, matchup_queue, progress, results_dir),
+        )
+        for i in range(n_workers)
+    ]
+    for worker in workers:
+        worker.start()
+
+    played = 0
+    start = time.time()
+    pbar = tqdm(total=len(matchups), initial=len(done), desc="Games")
+    while played < len(pending):
+        try:
+            result = progress.get(timeout=1.)
+        except queue.Empty:
+            if not any(worker.is_alive() for worker in workers):
+                break
+            continue
+        played += 1
+        if rating_engine is not None:
+            rating_engine.add_game(result["model_a"], result["model_b"], result["winner"])
+        pbar.update(1)
+        pbar.set_postfix(games_per_hour=f"{played / (time.time() - start) * 3600:.0f}")
+    pbar.close()
+
+    for i, worker in enumerate(workers):
+        worker.join()
+        if worker.exitcode != 0:
+            print(f"Battle farm worker {i} exited with code {worker.exitcode}")
+    print(f"Played {played}/{len(pending)} games in {time.time() - start:.1f}s, "
+          f"results in {results_dir}")
+    return played
@@ -0,0 +1,229 @@
+"""Batched damage calculator for LocalSim.
+
+Evaluates every (attacker, move, defender) triple of a matchup grid in one pass.
+Per-pokemon and per-move quantities (stats, boosts, items, stab, ...) are computed
+once with the scalar helpers of LocalSim. The grid itself is then combined with
+NumPy broadcasting, in the same order of operations as LocalSim.calc_base_dmg and
+LocalSim.modify_damage, so the results match the scalar path exactly.
+"""
+from typing import TYPE_CHECKING, Dict, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+from poke_env.environment.move import Move
+from poke_env.environment.move_category import MoveCategory
+from poke_env.environment.pokemon import Pokemon
+from poke_env.environment.status import Status
+
+if TYPE_CHECKING:
+    from poke_env.player.local_simulation import LocalSim
+
+
+class DamageBatch(NamedTuple):
+    """Results of a batched damage calculation, indexed [attacker, move, defender].
+
+    Moves are padded to the longest move list; padded slots are False in `valid`
+    and deal no damage.
+    """
+
+    damage: np.ndarray
+    turns_to_faint: np.ndarray
+    remaining_hp: np.ndarray
+    moves_first: np.ndarray
+    valid: np.ndarray
+
+
+def _stat(sim: "LocalSim", stats: Dict[str, int], boosts: Dict[str, int], stat: str):
+    if boosts[stat] == 0:
+        return stats[stat]
+    return round(stats[stat] * sim.boost_multiplier(stat, boosts[stat]))
+
+
+def calculate_damage_batch(
+    sim: "LocalSim",
+    attackers: Sequence[Pokemon],
+    moves: Sequence[Sequence[Move]],
+    defenders: Sequence[Pokemon],
+    attacker_boosts: Optional[Sequence[Dict[str, int]]] = None,
+    defender_boosts: Optional[Sequence[Dict[str, int]]] = None,
+    team=None,
+) -> DamageBatch:
+    """Computes expected damage, KO turns and move order of every attacker's moves
+    on every defender, the defender not moving (as calculate_remaining_hp with no
+    opponent move).
+
+    :param sim: The simulator whose battle state, format and gen data are used.
+    :type sim: LocalSim
+    :param attackers: The A attacking pokemons.
+    :type attackers: Sequence[Pokemon]
+    :param moves: For each attacker, the moves to evaluate.
+    :type moves: Sequence[Sequence[Move]]
+    :param defenders: The D defending pokemons.
+    :type defenders: Sequence[Pokemon]
+    :param attacker_boosts: Boosts of each attacker. Defaults to their current boosts.
+    :type attacker_boosts: Sequence[Dict[str, int]], optional
+    :param defender_boosts: Boosts of each defender. Defaults to their current boosts.
+    :type defender_boosts: Sequence[Dict[str, int]], optional
+    :param team: The attackers' team, used by supremeoverlord.
+    :type team: Dict[str, Pokemon], optional
+    :return: (A, M, D) arrays of damage, turns to faint the defender, defender hp
+        percentage left after one hit and whether the attacker moves first, and the
+        (A, M) valid move mask.
+    :rtype: DamageBatch
+    """
+    n_attackers, n_defenders = len(attackers), len(defenders)
+    n_moves = max([len(mon_moves) for mon_moves in moves], default=0)
+    if attacker_boosts is None:
+        attacker_boosts = [mon._boosts for mon in attackers]
+    if defender_boosts is None:
+        defender_boosts = [mon._boosts for mon in defenders]
+    shape = (n_attackers, n_moves)
+
+    # attackers
+    level = np.zeros(n_attackers)
+    stab = np.ones(n_attackers)
+    lifeorb = np.ones(n_attackers)
+    overlord = np.ones(n_attackers)
+    attack = np.zeros((n_attackers, 2))
+    proto_defense = np.ones((n_attackers, 2))
+    weight = np.zeros(n_attackers)
+    speed = np.zeros(n_attackers)
+    proto_speed = np.ones(n_attackers)
+    hp = np.zeros(n_attackers)
+    for i, (mon, boosts) in enumerate(zip(attackers, attacker_boosts)):
+        stats = mon.calculate_stats(battle_format=sim.format)
+        item_boosts = sim.apply_item(mon, boosts)
+        level[i] = mon.level
+        stab[i] = mon.stab_multiplier
+        attack[i] = [
+            _stat(sim, stats, item_boosts, 'atk') * sim.apply_protosynthesis(mon, 'atk'),
+            _stat(sim, stats, item_boosts, 'spa') * sim.apply_protosynthesis(mon, 'spa'),
+        ]
+        proto_defense[i] = [sim.apply_protosynthesis(mon, 'def'), sim.apply_protosynthesis(mon, 'spd')]
+        if mon.item == 'LifeOrb':
+            lifeorb[i] = 1.3
+        if mon.ability == 'supremeoverlord' and team is not None:
+            boost_atk = 0
+            for teammate in team.values():
+                if teammate.fainted:
+                    boost_atk += 0.1
+            overlord[i] = 1.0 + boost_atk
+        weight[i] = mon.weight
+        speed[i] = round(stats['spe'] * sim.boost_multiplier('spe', boosts['spe']))
+        proto_speed[i] = sim.apply_protosynthesis(mon, 'spe')
+        hp[i] = mon.current_hp_fraction * stats['hp']
+
+    # defenders
+    defense = np.zeros((n_defenders, 2))
+    defender_weight = np.zeros(n_defenders)
+    defender_speed = np.zeros(n_defenders)
+    defender_hp = np.zeros(n_defenders)
+    defender_hp_total = np.zeros(n_defenders)
+    for j, (mon, boosts) in enumerate(zip(defenders, defender_boosts)):
+        stats = mon.calculate_stats(battle_format=sim.format)
+        item_boosts = sim.apply_item(mon, boosts)
+        defense[j] = [_stat(sim, stats, item_boosts, 'def'), _stat(sim, stats, item_boosts, 'spd')]
+        defender_weight[j] = mon.weight
+        defender_speed[j] = round(stats['spe'] * sim.boost_multiplier('spe', boosts['spe']))
+        defender_hp_total[j] = stats['hp']
+        defender_hp[j] = mon.current_hp_fraction * stats['hp']
+
+    # attacker x move
+    valid = np.zeros(shape, dtype=bool)
+    physical = np.zeros(shape, dtype=bool)
+    base_power = np.zeros(shape)
+    heavy = np.zeros(shape, dtype=bool)
+    grassknot = np.zeros(shape, dtype=bool)
+    technician = np.zeros(shape, dtype=bool)
+    acrobatics = np.ones(shape)
+    move_stab = np.ones(shape)
+    burn = np.ones(shape)
+    accuracy = np.ones(shape)
+    expected_hits = np.ones(shape)
+    priority = np.zeros(shape, dtype=bool)
+    move_types: List[object] = []
+    for i, (mon, mon_moves) in enumerate(zip(attackers, moves)):
+        types = [mon.type_1.name, mon.type_2.name if mon.type_2 is not None else None]
+        for k, move in enumerate(mon_moves):
+            move_types.append(move.type)
+            if move.category == MoveCategory.STATUS:
+                continue
+            valid[i, k] = True
+            physical[i, k] = move.category == MoveCategory.PHYSICAL
+            base_power[i, k] = move.base_power
+            heavy[i, k] = move.id in ('heavyslam', 'heatcrash')
+            grassknot[i, k] = move.id in ('grassknot', 'lowkick')
+            technician[i, k] = mon.ability == 'technician'
+            if move.id == 'acrobatics' and (mon.item == None or mon.item == 'flyinggem'):
+                acrobatics[i, k] = 2
+            if move.type != '???' and move.type.name in types:
+                move_stab[i, k] = stab[i]
+            if mon.status == Status.BRN and move.category == MoveCategory.PHYSICAL and not mon.ability == 'guts':
+                if sim.gen.gen < 6 or move.id != 'facade':
+                    burn[i, k] = 0.5
+            accuracy[i, k] = move.accuracy
+            expected_hits[i, k] = move.expected_hits
+            priority[i, k] = move.priority == 1
+        move_types.extend([None] * (n_moves - len(mon_moves)))
+
+    # move x defender: type effectiveness and target abilities/items
+    type_multiplier = sim.gen.damage_multipliers(
+        move_types, [(mon.type_1, mon.type_2) for mon in defenders]
+    ).reshape(n_attackers, n_moves, n_defenders)
+    # only depends on the defender, the move type and its multiplier: few distinct values
+    target_modifier = np.ones((n_attackers, n_moves, n_defenders))
+    modifiers = {}
+    for i, mon_moves in enumerate(moves):
+        for k, move in enumerate(mon_moves):
+            for j, target in enumerate(defenders):
+                key = (j, move.type, type_multiplier[i, k, j])
+                if key not in modifiers:
+                    modifiers[key] = sim.target_damage_modifier(target, move.type, type_multiplier[i, k, j])
+                target_modifier[i, k, j] = modifiers[key]
+
+    # base power (modify_base_power)
+    relative_weight = defender_weight[None, :] / weight[:, None]
+    heavy_power = np.select(
+        [relative_weight < 0.2, relative_weight < 0.25, relative_weight < 0.334, relative_weight < 0.5],
+        [120, 100, 80, 60],
+        40,
+    )
+    grassknot_power = np.select(
+        [defender_weight > 200, defender_weight > 100, defender_weight > 50, defender_weight > 25, defender_weight > 10],
+        [120, 100, 80, 60, 40],
+        20,
+    )
+    power = np.broadcast_to(base_power[:, :, None], (n_attackers, n_moves, n_defenders)).copy()
+    power = np.where(heavy[:, :, None], heavy_power[:, None, :], power)
+    power = np.where(grassknot[:, :, None], grassknot_power[None, None, :], power)
+    power = np.where(technician[:, :, None] & (power <= 60), power * 1.5, power)
+    power = power * acrobatics[:, :, None]
+    power = power * overlord[:, None, None]
+
+    # base damage (calc_base_dmg)
+    category = np.where(physical, 0, 1)
+    attack_stat = np.take_along_axis(attack, category, axis=1)
+    defense_stat = defense.T[category] * np.take_along_axis(proto_defense, category, axis=1)[:, :, None]
+    damage = ((2 * level) / 5. + 2)[:, None, None] * power * attack_stat[:, :, None] / defense_stat
+    damage = 2 + (damage / 50. + 2)
+
+    # modifiers (modify_damage), in the scalar order
+    damage = damage * move_stab[:, :, None]
+    damage = damage * type_multiplier
+    damage = damage * target_modifier
+    damage = damage * burn[:, :, None]
+    damage = damage * lifeorb[:, None, None]
+    damage = np.where(damage == 0, 1, damage)
+    damage = damage * accuracy[:, :, None]
+    damage = np.trunc(damage) * expected_hits[:, :, None]
+    damage = np.where(valid[:, :, None], damage, 0)
+
+    # KO turns and order (calculate_remaining_hp)
+    turns_to_faint = defender_hp[None, None, :] / np.maximum(damage, 0.001)
+    outspeeds = (speed * proto_speed)[:, None] > defender_speed[None, :] * proto_speed[:, None]
+    moves_first = outspeeds[:, None, :] | priority[:, :, None]
+    hit = moves_first | (hp != 0)[:, None, None]
+    remaining = np.where(hit, np.maximum(defender_hp[None, None, :] - damage, 0), defender_hp[None, None, :])
+    remaining_hp = np.trunc(remaining / defender_hp_total[None, None, :] * 100)
+
+    return DamageBatch(damage, turns_to_faint, remaining_hp, moves_first, valid)
@@ -0,0 +1,117 @@
+"""Runs players' decisions off POKE_LOOP, so that a slow choose_move does not
+stall the other battles, the websocket keepalive and challenges of the process.
+"""
+import asyncio
+import functools
+import logging
+import time
+from concurrent.futures import Executor, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+
+@dataclass
+class DecisionStats:
+    """Timings of the decisions of one battle, in seconds. Queueing delay is the
+    time a decision waited for a free worker before starting."""
+
+    decisions: int = 0
+    total_queue_delay: float = 0.
+    max_queue_delay: float = 0.
+    total_decision_time: float = 0.
+    max_decision_time: float = 0.
+
+    @property
+    def mean_queue_delay(self) -> float:
+        return self.total_queue_delay / self.decisions if self.decisions else 0.
+
+    @property
+    def mean_decision_time(self) -> float:
+        return self.total_decision_time / self.decisions if self.decisions else 0.
+
+    def add(self, queue_delay: float, decision_time: float):
+        self.decisions += 1
+        self.total_queue_delay += queue_delay
+        self.max_queue_delay = max(self.max_queue_delay, queue_delay)
+        self.total_decision_time += decision_time
+        self.max_decision_time = max(self.max_decision_time, decision_time)
+
+
+class DecisionExecutor():
+    """Bounded pool running synchronous decision functions, typically
+    Player.choose_move, while the calling event loop keeps serving other battles.
+    Coroutine functions and awaitables returned by decision functions are awaited
+    on the calling loop instead.
+
+    :param max_workers: Maximum number of decisions computed at the same time.
+        Further decisions wait for a free worker, which shows as queueing delay.
+    :param executor: Executor to submit decisions to, instead of an owned thread
+        pool of max_workers threads. A process pool only works with picklable
+        decision functions and arguments, which players holding a showdown client
+        are not.
+    :param logger: Logger the timing of every decision is reported to.
+    """
+
+    def __init__(self,
+                 max_workers: Optional[int]=None,
+                 executor: Optional[Executor]=None,
+                 logger: Optional[logging.Logger]=None,
+                 ):
+        if executor is None:
+            executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="decision")
+            self._owns_executor = True
+        else:
+            self._owns_executor = False
+        self.executor = executor
+        self.max_workers = max_workers
+        self.logger = logging.getLogger("DecisionExecutor") if logger is None else logger
+        self._stats: Dict[str, DecisionStats] = {}
+
+    @staticmethod
+    def _timed(fn: Callable[..., Any], *args: Any) -> Any:
+        started = time.perf_counter()
+        return started, fn(*args)
+
+    async def run(self, battle_tag: str, fn: Callable[..., Any], *args: Any) -> Any:
+        """Computes fn(*args) for the given battle without blocking the running
+        event loop, and records its queueing delay and duration.
+
+        :param battle_tag: Battle the decision belongs to, for the statistics.
+        :type battle_tag: str
+        :param fn: The decision function.
+        :type fn: Callable
+        :return: The decision, awaited if fn is a coroutine function or returns an
+            awaitable.
+        :rtype: Any
+        """
+        submitted = time.perf_counter()
+        if asyncio.iscoroutinefunction(fn):
+            started, result = submitted, await fn(*args)
+        else:
+            loop = asyncio.get_running_loop()
+            started, result = await loop.run_in_executor(
+                self.executor, functools.partial(self._timed, fn, *args)
+            )
+            if isinstance(result, Awaitable):
+                result = await result
+        finished = time.perf_counter()
+
+        queue_delay = max(started - submitted, 0.)
+        stats = self._stats.setdefault(battle_tag, DecisionStats())
+        stats.add(queue_delay, finished - started)
+        self.logger.info(
+            "%s: decision %d queued %.3fs, computed in %.3fs",
+            battle_tag, stats.decisions, queue_delay, finished - started,
+        )
+        return result
+
+    def stats(self, battle_tag: Optional[str]=None) -> Any:
+        """Returns the decision statistics of a battle, or of every battle keyed by
+        battle tag if battle_tag is None."""
+        if battle_tag is None:
+            return dict(self._stats)
+        return self._stats.get(battle_tag, DecisionStats())
+
+    def shutdown(self, wait: bool=True):
+        if self._owns_executor:
+            self.executor.shutdown(wait=wait)
@@ -5,9 +5,8 @@ import numpy as np
 
 from poke_env.environment.move import Move
 from poke_env.player.llm_player import LLMPlayer
-from poke_env.player.local_simulation import LocalSim
 from poke_env.player.prompts import get_avail_actions, prompt_translate as pt
-from poke_env.ps_client.account_configuration import AccountConfiguration
+from poke_env.player.replay_context import ReplayContext
 import ast
 
 def recursive_nick_removal(text, start=0):
@@ -47,7 +46,7 @@ def get_player_team(battle_turns_text, player_id):
     return team_player, team_mons
 
 
-async def data_battle(llm: LLMPlayer, file, format, battle_id, json_text, gen, prompt_translate=pt):
+async def data_battle(llm: LLMPlayer, file, format, battle_id, json_text, gen, prompt_translate=pt, context=None):
     # load data file and split data into turns
     # with open('scraper/data_all/gen8randombattle/1044473102.txt', 'r') as f:
     print(f'adding {file}')
@@ -156,33 +155,11 @@ async def data_battle(llm: LLMPlayer, file, format, battle_id, json_text, gen, p
                 battle_turns_text[0].insert(start_line, mon)
             battle_turns_text[0].insert(start_line, '|teampreview')
 
-        # load battle sim
-        # create player
-        llm_player = LLMPlayer(battle_format=format,
-                                    backend='gpt',
-                                    temperature=1.0,
-                                    prompt_algo='io',
-                                    account_configuration=AccountConfiguration(username, ''),
-                                    prompt_translate=prompt_translate,
-                                    save_replays=False,
-                                    )
-        llm_player._dynamax_disable = False
-        # create battle object
-        battle_info = f'>battle-{format}-{battle_id}'.split("-")
-        battle = await llm_player._create_battle(battle_info)
-
-        # create simulator
-        sim = LocalSim(battle,
-                    llm_player.move_effect,
-                    llm_player.pokemon_move_dict,
-                    llm_player.ability_effect,
-                    llm_player.pokemon_ability_dict,
-                    llm_player.item_effect,
-                    llm_player.pokemon_item_dict,
-                    llm_player.gen,
-                    llm_player._dynamax_disable,
-                    format=llm_player.format,
-                    prompt_translate=llm_player.prompt_translate)
+        # load battle sim from the shared static tables
+        if context is None:
+            context = ReplayContext.for_format(format, prompt_translate)
+        battle = context.create_battle(battle_id, username)
+        sim = context.create_sim(battle)
 
         # send turn to battle sim: update simulator with each message from the data
         # [['>battle-gen8randombattle-54418'], ['', 'init', 'battle'], ['', 'title', 'SimpleHeuristics 7 vs. llamaio6'], ['', 'j', '☆SimpleHeuristics 7'], ['']]
@@ -264,7 +241,7 @@ async def data_battle(llm: LLMPlayer, file, format, battle_id, json_text, gen, p
             # current_moves = [move.id for move in sim.battle.available_moves]
             if sim.battle.active_pokemon.species in moves_parsed.keys():
                 move_list = moves_parsed[sim.battle.active_pokemon.species]
-                sim.battle._available_moves = [Move(move, gen=llm_player.gen.gen) for move in move_list]
+                sim.battle._available_moves = [Move(move, gen=context.gen.gen) for move in move_list]
 
             # create player prompt from battle sim
             # print(split_messages)
@@ -1,10 +1,68 @@
-from openai import OpenAI
-from time import sleep
-from openai import RateLimitError
+import asyncio
 import os
+import random
+import threading
+import time
+from time import sleep
+from typing import Any, Dict, List, Optional, Tuple
+
+from openai import (
+    APIConnectionError,
+    APITimeoutError,
+    AsyncOpenAI,
+    InternalServerError,
+    OpenAI,
+    RateLimitError,
+)
+
+# errors worth retrying: the request itself is fine, the service is busy or flaky
+RETRYABLE_ERRORS = (RateLimitError, APITimeoutError, APIConnectionError, InternalServerError)
+
+
+class TokenBucket():
+    """Thread-safe token bucket refilled continuously at `rate` tokens per second,
+    holding at most `capacity` tokens."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _reserve(self, amount: float) -> float:
+        # take the tokens now and return how long to wait until they are covered
+        amount = min(amount, self.capacity)
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= amount
+            if self.tokens >= 0:
+                return 0.
+            return -self.tokens / self.rate
+
+    def acquire(self, amount: float = 1.):
+        delay = self._reserve(amount)
+        if delay > 0:
+            sleep(delay)
+
+    async def acquire_async(self, amount: float = 1.):
+        delay = self._reserve(amount)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
 
 class GPTPlayer():
-    def __init__(self, api_key=""):
+    def __init__(self,
+                 api_key="",
+                 max_retries: int=6,
+                 backoff_base: float=1.,
+                 backoff_max: float=60.,
+                 requests_per_minute: Optional[float]=None,
+                 tokens_per_minute: Optional[float]=None,
+                 batch_concurrency: int=16,
+                 ):
         if api_key == "":
             self.api_key = os.getenv('OPENAI_API_KEY')
         else:
@@ -12,75 +70,187 @@ class GPTPlayer():
         self.completion_tokens = 0
         self.prompt_tokens = 0
 
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.batch_concurrency = batch_concurrency
+
+        # long-lived clients, created on first use and shared by every battle of
+        # this player so that HTTP connections are pooled
+        self._client: Optional[OpenAI] = None
+        self._async_client: Optional[AsyncOpenAI] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._rate_limiters: Dict[Tuple[str, str], TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def client(self) -> OpenAI:
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    # retries are handled here, with jitter and rate limiting
+                    self._client = OpenAI(api_key=self.api_key, max_retries=0)
+        return self._client
+
+    @property
+    def async_client(self) -> AsyncOpenAI:
+        # only used from self._loop, which owns its connections
+        if self._async_client is None:
+            self._async_client = AsyncOpenAI(api_key=self.api_key, max_retries=0)
+        return self._async_client
+
+    def _get_loop(self) -> asyncio.AbstractEventLoop:
+        if self._loop is None:
+            with self._lock:
+                if self._loop is None:
+                    loop = asyncio.new_event_loop()
+                    thread = threading.Thread(target=loop.run_forever, daemon=True)
+                    thread.start()
+                    self._loop = loop
+        return self._loop
+
+    def _rate_limiter(self, model: str, kind: str) -> Optional[TokenBucket]:
+        per_minute = self.requests_per_minute if kind == 'requests' else self.tokens_per_minute
+        if per_minute is None:
+            return None
+        key = (model, kind)
+        if key not in self._rate_limiters:
+            with self._lock:
+                if key not in self._rate_limiters:
+                    self._rate_limiters[key] = TokenBucket(per_minute / 60., per_minute)
+        return self._rate_limiters[key]
+
+    def _rate_limits(self, model: str, messages: List[Dict[str, str]], max_tokens: int) -> List[Tuple[TokenBucket, float]]:
+        limits = []
+        requests = self._rate_limiter(model, 'requests')
+        if requests is not None:
+            limits.append((requests, 1.))
+        tokens = self._rate_limiter(model, 'tokens')
+        if tokens is not None:
+            # rough estimate: 4 characters per prompt token, plus the completion
+            n_tokens = sum(len(m['content']) for m in messages) / 4 + max_tokens
+            limits.append((tokens, n_tokens))
+        return limits
+
+    def _count_tokens(self, response):
+        # log completion tokens
+        with self._lock:
+            self.completion_tokens += response.usage.completion_tokens
+            self.prompt_tokens += response.usage.prompt_tokens
+
+    def _backoff(self, attempt: int) -> float:
+        # exponential backoff with full jitter
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def _request_kwargs(self, system_prompt, user_prompt, model, temperature, json_format, stop, max_tokens) -> Dict[str, Any]:
+        kwargs = dict(
+            model=model,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}
+            ],
+            temperature=temperature,
+            stream=False,
+            # seed=seed,
+            stop=stop,
+            max_tokens=max_tokens
+        )
+        if json_format:
+            kwargs['response_format'] = {"type": "json_object"}
+        return kwargs
+
+    def _complete(self, **kwargs):
+        limits = self._rate_limits(kwargs['model'], kwargs['messages'], kwargs['max_tokens'])
+        for attempt in range(self.max_retries + 1):
+            for bucket, amount in limits:
+                bucket.acquire(amount)
+            try:
+                response = self.client.chat.completions.create(**kwargs)
+                break
+            except RETRYABLE_ERRORS as e:
+                if attempt == self.max_retries:
+                    raise
+                print(f'{type(e).__name__}, retrying')
+                sleep(self._backoff(attempt))
+        self._count_tokens(response)
+        return response
+
+    async def _complete_async(self, **kwargs):
+        limits = self._rate_limits(kwargs['model'], kwargs['messages'], kwargs['max_tokens'])
+        for attempt in range(self.max_retries + 1):
+            for bucket, amount in limits:
+                await bucket.acquire_async(amount)
+            try:
+                response = await self.async_client.chat.completions.create(**kwargs)
+                break
+            except RETRYABLE_ERRORS as e:
+                if attempt == self.max_retries:
+                    raise
+                print(f'{type(e).__name__}, retrying')
+                await asyncio.sleep(self._backoff(attempt))
+        self._count_tokens(response)
+        return response
+
     def get_LLM_action(self, system_prompt, user_prompt, model='gpt-4o', temperature=0.7, json_format=False, seed=None, stop=[], max_tokens=200, actions=None) -> str:
-        client = OpenAI(api_key=self.api_key)
-        # client = AzureOpenAI()
-        try:
-            if json_format:
-                response = client.chat.completions.create(
-                    response_format={"type": "json_object"},
-                    model= model,
-                    messages=[
-                        {"role": "system", "content": system_prompt},
-                        {"role": "user", "content": user_prompt}
-                    ],
-                    temperature=temperature,
-                    stream=False,
-                    # seed=seed,
-                    stop=stop,
-                    max_tokens=max_tokens
-                )
-            else:
-                response = client.chat.completions.create(
-                    model=model,
-                    messages=[
-                        {"role": "system", "content": system_prompt},
-                        {"role": "user", "content": user_prompt}
-                    ],
-                    temperature=temperature,
-                    stream=False,
-                    stop=stop,
-                    max_tokens=max_tokens
-                )
-        except RateLimitError:
-            # sleep 5 seconds and try again
-            sleep(5)  
-            print('rate limit error')
-            return self.get_LLM_action(system_prompt, user_prompt, model, temperature, json_format, seed, stop, max_tokens, actions)
+        response = self._complete(**self._request_kwargs(system_prompt, user_prompt, model, temperature, json_format, stop, max_tokens))
         outputs = response.choices[0].message.content
-        # log completion tokens
-        self.completion_tokens += response.usage.completion_tokens
-        self.prompt_tokens += response.usage.prompt_tokens
         if json_format:
             return outputs, True
         return outputs, False
-    
+
+    async def _get_LLM_actions_batch(self, requests: List[Dict[str, Any]], concurrency: int) -> List[Tuple[str, bool]]:
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def run(request):
+            request = dict(request)
+            json_format = request.get('json_format', False)
+            kwargs = self._request_kwargs(request['system_prompt'],
+                                          request['user_prompt'],
+                                          request.get('model', 'gpt-4o'),
+                                          request.get('temperature', 0.7),
+                                          json_format,
+                                          request.get('stop', []),
+                                          request.get('max_tokens', 200))
+            async with semaphore:
+                response = await self._complete_async(**kwargs)
+            return response.choices[0].message.content, json_format
+
+        return await asyncio.gather(*[run(request) for request in requests])
+
+    def get_LLM_actions_batch(self, requests: List[Dict[str, Any]], concurrency: Optional[int]=None) -> List[Tuple[str, bool]]:
+        """Sends several chat completions concurrently over the pooled async client.
+
+        Each request is a dict with the keyword arguments of get_LLM_action
+        (system_prompt, user_prompt, model, temperature, json_format, stop,
+        max_tokens). Outputs are returned in request order, as (output, json_format)
+        tuples like get_LLM_action. Safe to call from any thread, including one
+        running an event loop.
+        """
+        if concurrency is None:
+            concurrency = self.batch_concurrency
+        future = asyncio.run_coroutine_threadsafe(
+            self._get_LLM_actions_batch(requests, concurrency), self._get_loop()
+        )
+        return future.result()
+
+    async def aget_LLM_actions_batch(self, requests: List[Dict[str, Any]], concurrency: Optional[int]=None) -> List[Tuple[str, bool]]:
+        """Awaitable version of get_LLM_actions_batch, usable from any event loop."""
+        if concurrency is None:
+            concurrency = self.batch_concurrency
+        future = asyncio.run_coroutine_threadsafe(
+            self._get_LLM_actions_batch(requests, concurrency), self._get_loop()
+        )
+        return await asyncio.wrap_future(future)
+
     def get_LLM_query(self, system_prompt, user_prompt, temperature=0.7, model='gpt-4o', json_format=False, seed=None, stop=[], max_tokens=200):
-        client = OpenAI(api_key=self.api_key)
-        # client = AzureOpenAI()
-        try:
-            output_padding = ''
-            if json_format:
-                output_padding  = '\n{"'
-                
-            response = client.chat.completions.create(
-                model=model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt+output_padding}
-                ],
-                temperature=temperature,
-                stream=False,
-                stop=stop,
-                max_tokens=max_tokens
-            )
-            message = response.choices[0].message.content
-        except RateLimitError:
-            # sleep 5 seconds and try again
-            sleep(5)  
-            print('rate limit error1')
-            return self.get_LLM_query(system_prompt, user_prompt, temperature, model, json_format, seed, stop, max_tokens)
-        
+        output_padding = ''
+        if json_format:
+            output_padding  = '\n{"'
+        response = self._complete(**self._request_kwargs(system_prompt, user_prompt+output_padding, model, temperature, False, stop, max_tokens))
+        message = response.choices[0].message.content
+
         if json_format:
             json_start = 0
             json_end = message.find('}') + 1 # find the first "}
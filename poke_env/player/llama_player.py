@@ -1,35 +1,310 @@
 # import ollama
+import copy
+import queue
+import threading
+import time
+from collections import Counter, OrderedDict
+from concurrent.futures import Future
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+
 import numpy as np
 import torch
 from transformers import AutoTokenizer, AutoModelForCausalLM, BitsAndBytesConfig
 import torch.nn.functional as F
-    
+
+
+class Generation(NamedTuple):
+    """Completion of one prompt. scores holds the logits of every generated
+    token, [len(token_ids), vocab_size], when they were requested."""
+    text: str
+    token_ids: torch.Tensor
+    scores: Optional[torch.Tensor]
+
+
+class _Request(NamedTuple):
+    prompt: str
+    max_tokens: int
+    temperature: float
+    output_scores: bool
+    future: Future
+    # candidate continuations of a scoring request, None for a generation
+    continuations: Optional[Tuple[str, ...]] = None
+
+
 class LLAMAPlayer():
-    def __init__(self, model="meta-llama/Meta-Llama-3.1-8B-Instruct", device=3) -> None:
+    """Local model backend. Prompts are generated in batches by a worker thread:
+    requests submitted at the same time, by the threads of a tree search or by
+    every player sharing this backend, are padded into one generate call.
+
+    The prompts of a batch share their system prompt and battle state, so the KV
+    cache of their common token prefix is computed once and expanded to the batch.
+    The last few prefixes are kept, which also serves prompts sent one at a time
+    that extend the prompt before them.
+
+    :param model: Model id or path, loaded with flash attention and compiled on
+        GPU, in float32 with SDPA attention on CPU.
+    :param device: CUDA device index, or a torch device string such as "cpu".
+    :param max_batch_size: Maximum number of prompts generated together.
+    :param batch_wait: Seconds the worker waits for more requests after the first
+        one of a batch.
+    :param prefix_cache_size: Number of prefix KV caches kept.
+    :param min_prefix_tokens: Shortest shared prefix worth caching.
+    """
+
+    def __init__(self,
+                 model="meta-llama/Meta-Llama-3.1-8B-Instruct",
+                 device=3,
+                 max_batch_size: int=8,
+                 batch_wait: float=0.01,
+                 prefix_cache_size: int=4,
+                 min_prefix_tokens: int=32,
+                 ) -> None:
         model_id = model
         self.device = device
+        self.torch_device = torch.device(f'cuda:{device}' if isinstance(device, int) else device)
         self.tokenizer = AutoTokenizer.from_pretrained(model_id)
         quantization_config = BitsAndBytesConfig(load_in_4bit=True, bnb_4bit_compute_dtype=torch.bfloat16)
-        self.model = AutoModelForCausalLM.from_pretrained(
-            model_id,
-            torch_dtype=torch.bfloat16,
-            device_map=self.device,
-            # quantization_config=quantization_config,
-            attn_implementation="flash_attention_2",
-        )
-        self.model = torch.compile(self.model)
+        if self.torch_device.type == 'cuda':
+            self.model = AutoModelForCausalLM.from_pretrained(
+                model_id,
+                torch_dtype=torch.bfloat16,
+                device_map=self.device,
+                # quantization_config=quantization_config,
+                attn_implementation="flash_attention_2",
+            )
+            self.model = torch.compile(self.model)
+        else:
+            self.model = AutoModelForCausalLM.from_pretrained(
+                model_id,
+                torch_dtype=torch.float32,
+                attn_implementation="sdpa",
+            ).to(self.torch_device)
+        self.model.eval()
         self.tokenizer.pad_token = self.tokenizer.eos_token
         self.model.config.pad_token_id = self.model.config.eos_token_id
         self.model.generation_config.pad_token_id = self.tokenizer.pad_token_id
 
+        self.max_batch_size = max_batch_size
+        self.batch_wait = batch_wait
+        self.prefix_cache_size = prefix_cache_size
+        self.min_prefix_tokens = min_prefix_tokens
+        self.requests: "queue.Queue[_Request]" = queue.Queue()
+        # number of generate calls per batch size
+        self.batch_sizes: Counter = Counter()
+        self.prefix_tokens_reused = 0
+        self._prefix_cache: "OrderedDict[Tuple[int, ...], object]" = OrderedDict()
+        self._last_prompt: List[int] = []
+        self._worker: Optional[threading.Thread] = None
+        self._worker_lock = threading.Lock()
+
+    def _start_worker(self):
+        with self._worker_lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._serve, name="llama-batcher", daemon=True)
+                self._worker.start()
+
+    def submit(self, prompt: str, max_tokens: int=20, temperature: float=0.7, output_scores: bool=False) -> Future:
+        """Queues a prompt for generation.
+
+        :param prompt: The full prompt.
+        :type prompt: str
+        :param max_tokens: Maximum number of generated tokens.
+        :type max_tokens: int
+        :param temperature: Sampling temperature.
+        :type temperature: float
+        :param output_scores: Whether to return the logits of the generated tokens.
+        :type output_scores: bool
+        :return: Future of the Generation of the prompt.
+        :rtype: Future
+        """
+        self._start_worker()
+        future = Future()
+        self.requests.put(_Request(prompt, max_tokens, temperature, output_scores, future))
+        return future
+
+    def generate(self, prompt: str, max_tokens: int=20, temperature: float=0.7, output_scores: bool=False) -> Generation:
+        return self.submit(prompt, max_tokens, temperature, output_scores).result()
+
+    def score(self, prompt: str, continuations: Sequence[str]) -> List[float]:
+        """Log-likelihoods of continuations of a prompt, computed in one batched
+        forward pass over the cached prompt prefix.
+
+        :param prompt: The full prompt.
+        :type prompt: str
+        :param continuations: Candidate texts following the prompt.
+        :type continuations: Sequence[str]
+        :return: Sum of the log-probabilities of the tokens of every continuation.
+        :rtype: List[float]
+        """
+        if len(continuations) == 0:
+            return []
+        self._start_worker()
+        future = Future()
+        self.requests.put(_Request(prompt, 0, 0., False, future, tuple(continuations)))
+        return future.result()
+
+    def _serve(self):
+        while True:
+            batch = [self.requests.get()]
+            deadline = time.monotonic() + self.batch_wait
+            while len(batch) < self.max_batch_size:
+                try:
+                    batch.append(self.requests.get(timeout=max(deadline - time.monotonic(), 0.)))
+                except queue.Empty:
+                    break
+            groups = {}
+            for request in batch:
+                if request.continuations is not None:
+                    # a scoring request is a batch of its own continuations
+                    if request.future.set_running_or_notify_cancel():
+                        try:
+                            request.future.set_result(self._score_batch(request.prompt, request.continuations))
+                        except Exception as e:
+                            request.future.set_exception(e)
+                    continue
+                groups.setdefault((request.max_tokens, request.temperature, request.output_scores), []).append(request)
+            for (max_tokens, temperature, output_scores), requests in groups.items():
+                requests = [request for request in requests if request.future.set_running_or_notify_cancel()]
+                if len(requests) == 0:
+                    continue
+                try:
+                    generations = self._generate_batch(
+                        [request.prompt for request in requests], max_tokens, temperature, output_scores
+                    )
+                except Exception as e:
+                    for request in requests:
+                        request.future.set_exception(e)
+                    continue
+                for request, generation in zip(requests, generations):
+                    request.future.set_result(generation)
+
+    def _shared_prefix(self, prompts_ids: Sequence[List[int]]) -> int:
+        """Length of the token prefix shared by the prompts of a batch, or by a
+        single prompt and the one before it. At least one token of every prompt is
+        left to generate from."""
+        others = prompts_ids[1:] if len(prompts_ids) > 1 else [self._last_prompt]
+        first = prompts_ids[0]
+        length = min(len(ids) for ids in prompts_ids) - 1
+        for ids in others:
+            length = min(length, len(ids))
+            for i in range(length):
+                if ids[i] != first[i]:
+                    length = i
+                    break
+        return max(length, 0)
+
+    @torch.no_grad()
+    def _prefix_kv(self, prefix: List[int]):
+        """Returns the KV cache of prefix, extending the longest cached prefix of it,
+        or None if prefix is too short to be worth caching."""
+        if len(prefix) < self.min_prefix_tokens:
+            return None
+        key = tuple(prefix)
+        if key in self._prefix_cache:
+            self._prefix_cache.move_to_end(key)
+            self.prefix_tokens_reused += len(prefix)
+            return self._prefix_cache[key]
+        start, cache = 0, None
+        for cached, cached_kv in self._prefix_cache.items():
+            if start < len(cached) <= len(prefix) and key[:len(cached)] == cached:
+                start, cache = len(cached), cached_kv
+        self.prefix_tokens_reused += start
+        cache = copy.deepcopy(cache) if cache is not None else None
+        input_ids = torch.tensor([prefix[start:]], device=self.torch_device)
+        cache = self.model(input_ids=input_ids, past_key_values=cache, use_cache=True).past_key_values
+        self._prefix_cache[key] = cache
+        while len(self._prefix_cache) > self.prefix_cache_size:
+            self._prefix_cache.popitem(last=False)
+        return cache
+
+    @torch.no_grad()
+    def _score_batch(self, prompt: str, continuations: Sequence[str]) -> List[float]:
+        prompt_ids = self.tokenizer(prompt)['input_ids']
+        self._last_prompt = prompt_ids
+        # the logits of the last prompt token predict the first continuation token,
+        # so that token is run with the continuations
+        prefix = prompt_ids[:-1]
+        cache = self._prefix_kv(prefix)
+        if cache is None:
+            prefix = []
+        else:
+            cache = copy.deepcopy(cache)
+            if len(continuations) > 1:
+                cache.batch_repeat_interleave(len(continuations))
+        rows = [prompt_ids[len(prefix):] + self.tokenizer(text, add_special_tokens=False)['input_ids']
+                for text in continuations]
+        length = max(len(row) for row in rows)
+        pad_id = self.tokenizer.pad_token_id
+        input_ids = torch.tensor([row + [pad_id] * (length - len(row)) for row in rows], device=self.torch_device)
+        attention_mask = torch.tensor(
+            [[1] * (len(prefix) + len(row)) + [0] * (length - len(row)) for row in rows], device=self.torch_device
+        )
+        logits = self.model(
+            input_ids=input_ids, attention_mask=attention_mask, past_key_values=cache, use_cache=cache is not None
+        ).logits.float()
+        # log-softmax only at the positions predicting continuation tokens
+        start = len(prompt_ids) - len(prefix) - 1
+        targets = input_ids[:, start + 1:]
+        logits = logits[:, start:-1]
+        log_probs = logits.gather(-1, targets.unsqueeze(-1)).squeeze(-1) - torch.logsumexp(logits, dim=-1)
+        mask = attention_mask[:, len(prefix) + start + 1:].to(log_probs.dtype)
+        return (log_probs * mask).sum(dim=-1).tolist()
+
+    @torch.no_grad()
+    def _generate_batch(self, prompts: List[str], max_tokens: int, temperature: float, output_scores: bool) -> List[Generation]:
+        prompts_ids = [self.tokenizer(prompt)['input_ids'] for prompt in prompts]
+        prefix_len = self._shared_prefix(prompts_ids)
+        prefix = prompts_ids[0][:prefix_len]
+        self._last_prompt = prompts_ids[-1]
+        cache = self._prefix_kv(prefix)
+        if cache is None:
+            prefix, prefix_len = [], 0
+        else:
+            cache = copy.deepcopy(cache)
+            if len(prompts) > 1:
+                cache.batch_repeat_interleave(len(prompts))
+
+        # the suffixes are padded on their left, after the shared prefix, so that
+        # they all end where generation starts
+        pad_id = self.tokenizer.pad_token_id
+        suffixes = [ids[prefix_len:] for ids in prompts_ids]
+        length = max(len(suffix) for suffix in suffixes)
+        input_ids = [prefix + [pad_id] * (length - len(suffix)) + suffix for suffix in suffixes]
+        attention_mask = [[1] * prefix_len + [0] * (length - len(suffix)) + [1] * len(suffix) for suffix in suffixes]
+        input_ids = torch.tensor(input_ids, device=self.torch_device)
+        attention_mask = torch.tensor(attention_mask, device=self.torch_device)
+        outputs = self.model.generate(
+            input_ids=input_ids,
+            attention_mask=attention_mask,
+            past_key_values=cache,
+            max_new_tokens=max_tokens,
+            temperature=temperature,
+            pad_token_id=self.tokenizer.eos_token_id,
+            output_scores=output_scores,
+            return_dict_in_generate=True,
+        )
+        self.batch_sizes[len(prompts)] += 1
+
+        generations = []
+        responses = outputs.sequences[:, input_ids.shape[-1]:].to('cpu')
+        scores = torch.stack(outputs.scores, dim=1).to('cpu') if output_scores else None
+        for i, response in enumerate(responses):
+            # rows that finished before the others are padded with eos tokens
+            eos = (response == self.tokenizer.eos_token_id).nonzero(as_tuple=True)[0]
+            end = eos[0].item() + 1 if len(eos) > 0 else len(response)
+            response = response[:end]
+            generations.append(Generation(
+                self.tokenizer.decode(response, skip_special_tokens=True),
+                response,
+                scores[i, :end] if scores is not None else None,
+            ))
+        return generations
+
     def get_LLM_action(self, system_prompt, user_prompt, model, temperature=0.7, json_format=True, seed=None, stop=[], max_tokens=20, actions=None) -> str:
         output_padding = ''
         if json_format:
             output_padding  = '\n{"'
-        inputs = self.tokenizer(system_prompt+user_prompt+output_padding, return_tensors='pt').to(f'cuda:{self.device}')
-        generated_ids = self.model.generate(**inputs, max_new_tokens=max_tokens, temperature=temperature, pad_token_id=self.tokenizer.eos_token_id)
-        response = generated_ids[0][inputs['input_ids'].shape[-1]:]
-        message = self.tokenizer.decode(response, skip_special_tokens=True)
+        message = self.generate(system_prompt+user_prompt+output_padding, max_tokens, temperature).text
         if json_format:
             # json_start = message.find('{"')
             json_start = 0
@@ -42,33 +317,27 @@ class LLAMAPlayer():
     
     def get_LLM_action_topK_single(
         self, system_prompt, user_prompt, model, actions, top_k=3, temperature=0.7, 
-        json_format=True, seed=None, stop=[], max_tokens=50, id_included=False
+        json_format=True, seed=None, stop=[], max_tokens=50, id_included=False, single_pass=True
     ) -> list:
 
         # Prepare inputs
         output_padding = ''
         if json_format:
             output_padding = '\n{"'
-        inputs = self.tokenizer(system_prompt + user_prompt + output_padding, return_tensors='pt').to(f'cuda:{self.device}')
+
+        if single_pass:
+            # score every action as a continuation of the prompt, in one forward pass
+            candidates = [action if id_included else action[2:] for action in actions]
+            log_probs = self.score(system_prompt + user_prompt + output_padding, candidates)
+            sorted_actions = sorted(zip(candidates, log_probs), key=lambda x: x[1], reverse=True)
+            print("sorted", sorted_actions[:top_k])
+            return ['{"' + action[0] for action in sorted_actions[:top_k]]
 
         # Generate logits and output
-        generated_outputs = self.model.generate(
-            **inputs,
-            max_new_tokens=max_tokens,
-            temperature=temperature,
-            pad_token_id=self.tokenizer.eos_token_id,
-            output_scores=True,
-            return_dict_in_generate=True
-        )
-        
-        logits = torch.stack(generated_outputs.scores, dim=1).to('cpu')  # Shape: [seq_len, vocab_size]
-        logits = logits[0]
-        generated_ids = generated_outputs.sequences[0]
-        
-        # Slice out only the response portion
-        response_start = inputs['input_ids'].shape[-1]
-        response_ids = generated_ids[response_start:]
-        message = self.tokenizer.decode(response_ids, skip_special_tokens=True)
+        generation = self.generate(system_prompt + user_prompt + output_padding, max_tokens, temperature, output_scores=True)
+        logits = generation.scores  # Shape: [seq_len, vocab_size]
+        response_ids = generation.token_ids
+        message = generation.text
         # print("output message:", message)
         # Calculate probabilities for each action - player
         action_probabilities = {}
@@ -114,26 +383,12 @@ class LLAMAPlayer():
         output_padding = ''
         if json_format:
             output_padding = '\n{"'
-        inputs = self.tokenizer(system_prompt + user_prompt + output_padding, return_tensors='pt').to(f'cuda:{self.device}')
 
         # Generate logits and output
-        generated_outputs = self.model.generate(
-            **inputs,
-            max_new_tokens=max_tokens,
-            temperature=temperature,
-            pad_token_id=self.tokenizer.eos_token_id,
-            output_scores=True,
-            return_dict_in_generate=True
-        )
-        
-        logits = torch.stack(generated_outputs.scores, dim=1).to('cpu')  # Shape: [seq_len, vocab_size]
-        logits = logits[0]
-        generated_ids = generated_outputs.sequences[0]
-        
-        # Slice out only the response portion
-        response_start = inputs['input_ids'].shape[-1]
-        response_ids = generated_ids[response_start:]
-        message = self.tokenizer.decode(response_ids, skip_special_tokens=True)
+        generation = self.generate(system_prompt + user_prompt + output_padding, max_tokens, temperature, output_scores=True)
+        logits = generation.scores  # Shape: [seq_len, vocab_size]
+        response_ids = generation.token_ids
+        message = generation.text
         action_player_tokens = message[:message.index(',')+2]
         player_tokens = self.tokenizer(action_player_tokens, return_tensors='pt')['input_ids'].squeeze(0)
         action_player_index = len(player_tokens)
@@ -206,20 +461,12 @@ class LLAMAPlayer():
         output_padding = ''
         if json_format:
             output_padding = '\n{"'
-        inputs = self.tokenizer(system_prompt + user_prompt + output_padding, return_tensors='pt').to(f'cuda:{self.device}')
-
         # Generate tokens with scores enabled
-        generated_outputs = self.model.generate(**inputs, max_new_tokens=max_tokens, temperature=temperature, 
-                                                pad_token_id=self.tokenizer.eos_token_id, output_scores=True, return_dict_in_generate=True)
-
-        # Extract token IDs and corresponding logits
-        generated_ids = generated_outputs.sequences[0]
-        logits = torch.stack(generated_outputs.scores, dim=1).to('cpu')  # Stack along sequence to get scores for each token
-
-        # Slice out only the response portion
-        response_ids = generated_ids[inputs['input_ids'].shape[-1]:]
+        generation = self.generate(system_prompt + user_prompt + output_padding, max_tokens, temperature, output_scores=True)
+        logits = generation.scores  # Scores of each generated token
+        response_ids = generation.token_ids
         # Decode the response to find the "<winner>" token positions
-        message = self.tokenizer.decode(response_ids, skip_special_tokens=True)
+        message = generation.text
         print(message)
         probs = F.softmax(logits, dim=-1)  # Convert logits to probabilities
 
@@ -241,8 +488,8 @@ class LLAMAPlayer():
             if token_id == 3517:
                 winner = 'player'
             if token_id == 3517 or token_id == 454 or token_id == 1166:
-                print('compare', token_id, probs[0, t, 3517].item(), probs[0, t, 454].item(), probs[0, t, 1166].item())
-            token_prob = probs[0, t, token_id].item()
+                print('compare', token_id, probs[t, 3517].item(), probs[t, 454].item(), probs[t, 1166].item())
+            token_prob = probs[t, token_id].item()
             winner_prob *= token_prob
             # winner_probs.append((self.tokenizer.decode([token_id]), token_prob))
             # print(token_id, winner_prob)
@@ -254,7 +501,7 @@ class LLAMAPlayer():
         # winner_token_ids = response_ids[0:].tolist()
         # print(winner_token_ids)
         for t, token_id in zip(np.arange(start, end), winner_token_ids):
-            token_prob = probs[0, t, token_id].item()
+            token_prob = probs[t, token_id].item()
             winner_probs.append((token_id, token_prob))
         for token, prob in winner_probs:
             print(f"Token: '{token}' - Probability: {prob}")
@@ -275,25 +522,22 @@ class LLAMAPlayer():
         if dmg_calc_action is not None:
             if dmg_calc_action not in actions_top_k:
                 actions_top_k[-1] = dmg_calc_action
-        outputs = []
+        # the continuations of the top K actions share the prompt, and are generated
+        # as one batch
+        futures = []
         for action_player in actions_top_k:
             output_padding = ''
             if json_format:
                 output_padding = '\n' + action_player
-            inputs = self.tokenizer(system_prompt + user_prompt + output_padding, return_tensors='pt').to(f'cuda:{self.device}')
-
+            futures.append(self.submit(system_prompt + user_prompt + output_padding, max_tokens, temperature, output_scores=True))
+        outputs = []
+        for action_player, future in zip(actions_top_k, futures):
             # Generate tokens with scores enabled
-            generated_outputs = self.model.generate(**inputs, max_new_tokens=max_tokens, temperature=temperature, 
-                                                    pad_token_id=self.tokenizer.eos_token_id, output_scores=True, return_dict_in_generate=True)
-
-            # Extract token IDs and corresponding logits
-            generated_ids = generated_outputs.sequences[0]
-            logits = torch.stack(generated_outputs.scores, dim=1).to('cpu')  # Stack along sequence to get scores for each token
-
-            # Slice out only the response portion
-            response_ids = generated_ids[inputs['input_ids'].shape[-1]:]
+            generation = future.result()
+            logits = generation.scores  # Scores of each generated token
+            response_ids = generation.token_ids
             # Decode the response to find the "<winner>" token positions
-            message = self.tokenizer.decode(response_ids, skip_special_tokens=True)
+            message = generation.text
             # print(message)
             probs = F.softmax(logits, dim=-1)  # Convert logits to probabilities
 
@@ -315,8 +559,8 @@ class LLAMAPlayer():
                 if token_id == 3517:
                     winner = 'player'
                 if token_id == 3517 or token_id == 454 or token_id == 1166:
-                    print('compare', token_id, probs[0, t, 3517].item(), probs[0, t, 454].item(), probs[0, t, 1166].item())
-                token_prob = probs[0, t, token_id].item()
+                    print('compare', token_id, probs[t, 3517].item(), probs[t, 454].item(), probs[t, 1166].item())
+                token_prob = probs[t, token_id].item()
                 winner_prob *= token_prob
             if winner == 'opponent':
                 winner_prob = 1 - winner_prob
@@ -0,0 +1,152 @@
+"""Response cache for LLM calls, keyed on the normalized request.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+def normalize_prompt(prompt: str) -> str:
+    # whitespace differences between prompt builders do not change the request
+    return " ".join(prompt.split())
+
+
+class LLMResponseCache():
+    """Two-tier cache of LLM outputs: an in-memory LRU in front of an optional
+    SQLite database shared across runs and processes.
+
+    :param max_entries: Maximum number of responses kept in memory.
+    :param path: SQLite file of the on-disk tier. No disk tier if None.
+    :param max_disk_entries: Maximum number of responses kept on disk, least
+        recently used ones are evicted first.
+    :param ttl: Seconds after which a response expires. Never if None.
+    """
+
+    def __init__(self,
+                 max_entries: int=4096,
+                 path: Optional[str]=None,
+                 max_disk_entries: int=100000,
+                 ttl: Optional[float]=None,
+                 ):
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries
+        self.ttl = ttl
+        self.path = path
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._memory: OrderedDict[str, Tuple[str, float]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self._disk_puts = 0
+        if path is not None:
+            if os.path.dirname(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses "
+                "(key TEXT PRIMARY KEY, value TEXT, created REAL, accessed REAL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS accessed_idx ON responses (accessed)")
+            self._db.commit()
+
+    @staticmethod
+    def make_key(system_prompt: str, user_prompt: str, model: str, temperature: float, json_format: bool=False, max_tokens: int=200, stop: Optional[List[str]]=None, seed: Optional[int]=None) -> str:
+        request = "\x00".join([
+            str(model),
+            repr(float(temperature)),
+            str(bool(json_format)),
+            str(max_tokens),
+            repr(list(stop or [])),
+            str(seed),
+            normalize_prompt(system_prompt),
+            normalize_prompt(user_prompt),
+        ])
+        return hashlib.sha256(request.encode("utf-8")).hexdigest()
+
+    def _expired(self, created: float, now: float) -> bool:
+        return self.ttl is not None and now - created > self.ttl
+
+    def get(self, key: str, validate: Optional[Callable[[str], bool]]=None) -> Optional[str]:
+        """Returns the cached response of a request, None on a miss.
+
+        :param key: The request key, see make_key.
+        :param validate: Whether a cached response is usable. Responses it rejects
+            are evicted and counted as misses.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if not self._expired(entry[1], now) and (validate is None or validate(entry[0])):
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    return entry[0]
+                del self._memory[key]
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT value, created FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    if not self._expired(row[1], now) and (validate is None or validate(row[0])):
+                        self._db.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+                        self._db.commit()
+                        self._put_memory(key, row[0], row[1])
+                        self.hits += 1
+                        self.disk_hits += 1
+                        return row[0]
+                    self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self._db.commit()
+            self.misses += 1
+            return None
+
+    def _put_memory(self, key: str, value: str, created: float):
+        self._memory[key] = (value, created)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def put(self, key: str, value: str):
+        now = time.time()
+        with self._lock:
+            self._put_memory(key, value, now)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)", (key, value, now, now)
+                )
+                self._disk_puts += 1
+                # counting rows is a table scan: only trim the disk tier periodically
+                if self._disk_puts % 256 == 0:
+                    count = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+                    if count > self.max_disk_entries:
+                        self._db.execute(
+                            "DELETE FROM responses WHERE key IN "
+                            "(SELECT key FROM responses ORDER BY accessed LIMIT ?)",
+                            (count - self.max_disk_entries,),
+                        )
+                self._db.commit()
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM responses")
+                self._db.commit()
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total > 0 else 0.
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": self.hit_rate,
+            "entries": len(self._memory),
+        }
@@ -1,4 +1,7 @@
 import ast
+from collections import Counter, defaultdict
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
 from copy import copy, deepcopy
 import datetime
 import json
@@ -19,14 +22,49 @@ from poke_env.environment.move import Move
 import time
 import json
 from poke_env.data.gen_data import GenData
+from poke_env.data.static_cache import static_data
 from poke_env.player.gpt_player import GPTPlayer
 from poke_env.player.llama_player import LLAMAPlayer
+from poke_env.player.decision_executor import DecisionExecutor
+from poke_env.player.llm_cache import LLMResponseCache
 from poke_env.player.local_simulation import LocalSim, SimNode
-from difflib import get_close_matches
-from poke_env.player.prompts import get_number_turns_faint, get_status_num_turns_fnt, state_translate, get_gimmick_motivation
+from poke_env.player.log_writer import LogWriter, get_log_writer
+from poke_env.player.replay_context import load_static_tables
+from poke_env.player.transposition_table import TranspositionTable
+from poke_env.data.name_index import name_index
+from poke_env.player.prompts import get_number_turns_faint_batch, get_status_num_turns_fnt, state_translate, get_gimmick_motivation
 
 DEBUG=False
 
+
+class SearchTimeout(Exception):
+    """Raised when the time budget of a tree search runs out."""
+
+
+class _DamageCalculatorChoice(Exception):
+    """Ends an alpha-beta search when the LLM chooses the damage calculator's
+    action over the search."""
+
+    def __init__(self, result):
+        super().__init__()
+        self.result = result
+
+
+def _is_json_object(output: str) -> bool:
+    try:
+        return isinstance(json.loads(output), dict)
+    except ValueError:
+        return False
+
+
+def _is_leaf_value(output: str) -> bool:
+    """Whether output is a leaf evaluation the search can read a score from."""
+    try:
+        int(json.loads(output)['score'])
+        return True
+    except (ValueError, TypeError, KeyError):
+        return False
+
 class LLMPlayer(Player):
     def __init__(self,
                  battle_format,
@@ -43,14 +81,25 @@ class LLMPlayer(Player):
                  _use_strat_prompt=False,
                  prompt_translate: Callable=state_translate,
                  device=0,
-                 llm_backend=None
+                 llm_backend=None,
+                 search_concurrency: Optional[int]=None,
+                 llm_cache: Optional[LLMResponseCache]=None,
+                 cache_nonzero_temperature: bool=False,
+                 max_concurrent_battles: int=1,
+                 decision_executor: Optional[DecisionExecutor]=None,
+                 transposition_table_size: int=100000,
+                 search_time_budget: Optional[float]=None,
+                 alpha_beta: bool=False,
+                 log_writer: Optional[LogWriter]=None,
                  ):
 
         super().__init__(battle_format=battle_format,
                          team=team,
                          save_replays=save_replays,
                          account_configuration=account_configuration,
-                         server_configuration=server_configuration)
+                         server_configuration=server_configuration,
+                         max_concurrent_battles=max_concurrent_battles,
+                         decision_executor=decision_executor)
 
         self._reward_buffer: Dict[AbstractBattle, float] = {}
         self._battle_last_action : Dict[AbstractBattle, Dict] = {}
@@ -68,24 +117,19 @@ class LLMPlayer(Player):
         self.team_str = team
         self.use_strat_prompt = _use_strat_prompt
 
-        with open("./poke_env/data/static/moves/moves_effect.json", "r") as f:
-            self.move_effect = json.load(f)
+        # shared with every player of the process, read-only
+        tables = load_static_tables()
+        self.move_effect = tables["move_effect"]
         # only used in old prompting method, replaced by statistcal sets data
-        with open(f"./poke_env/data/static/moves/gen8pokemon_move_dict.json", "r") as f:
-            self.pokemon_move_dict = json.load(f)
-        with open("./poke_env/data/static/abilities/ability_effect.json", "r") as f:
-            self.ability_effect = json.load(f)
+        self.pokemon_move_dict = tables["pokemon_move_dict"]
+        self.ability_effect = tables["ability_effect"]
         # only used is old prompting method
-        with open("./poke_env/data/static/abilities/gen8pokemon_ability_dict.json", "r") as f:
-            self.pokemon_ability_dict = json.load(f)
-        with open("./poke_env/data/static/items/item_effect.json", "r") as f:
-            self.item_effect = json.load(f)
+        self.pokemon_ability_dict = tables["pokemon_ability_dict"]
+        self.item_effect = tables["item_effect"]
         # unused
-        # with open(f"./poke_env/data/static/items/gen8pokemon_item_dict.json", "r") as f:
-        #     self.pokemon_item_dict = json.load(f)
+        # self.pokemon_item_dict = static_data().table("items/gen8pokemon_item_dict")
         self.pokemon_item_dict = {}
-        with open(f"./poke_env/data/static/pokedex/gen{self.gen.gen}pokedex.json", "r") as f:
-            self._pokemon_dict = json.load(f)
+        self._pokemon_dict = static_data().table(f"pokedex/gen{self.gen.gen}pokedex")
 
         self.last_plan = ""
 
@@ -100,12 +144,70 @@ class LLMPlayer(Player):
             self.llm = llm_backend
         self.llm_value = self.llm
         self.K = K      # for minimax, SC, ToT
-
-    def get_LLM_action(self, system_prompt, user_prompt, model, temperature=0.7, json_format=False, seed=None, stop=[], max_tokens=200, actions=None, llm=None, battle=None) -> str:
-        if llm is None:
-            output, _ = self.llm.get_LLM_action(system_prompt, user_prompt, model, temperature, True, seed, stop, max_tokens=max_tokens, actions=actions)
-        else:
-            output, _ = llm.get_LLM_action(system_prompt, user_prompt, model, temperature, True, seed, stop, max_tokens=max_tokens, actions=actions)
+        # max LLM requests in flight while expanding a minimax layer. API backends
+        # fan out, a local LLAMAPlayer generates a full batch of siblings at once,
+        # other local models serve one request at a time
+        if search_concurrency is None:
+            if isinstance(self.llm, GPTPlayer):
+                search_concurrency = 8
+            elif isinstance(self.llm, LLAMAPlayer):
+                search_concurrency = self.llm.max_batch_size
+            else:
+                search_concurrency = 1
+        self.search_concurrency = search_concurrency
+        # decisions block for seconds on the LLM: compute them off POKE_LOOP. API
+        # backends and the batched LLAMAPlayer decide every battle at once, other
+        # local models one at a time
+        if self._decision_executor is None:
+            if isinstance(self.llm, (GPTPlayer, LLAMAPlayer)):
+                decision_workers = max_concurrent_battles if max_concurrent_battles > 0 else 32
+            else:
+                decision_workers = 1
+            self._decision_executor = DecisionExecutor(max_workers=decision_workers, logger=self.logger)
+        # identical requests recur within a turn (transpositions, repeated io
+        # samples) and across turns (leaf evaluations). Responses sampled with a
+        # nonzero temperature are only cached when explicitly asked
+        self.llm_cache = LLMResponseCache() if llm_cache is None else llm_cache
+        # search results per battle, reused across transpositions and turns
+        self.transposition_table_size = transposition_table_size
+        self._transposition_tables: Dict[str, TranspositionTable] = {}
+        # seconds a minimax decision may take, None for a fixed depth K search. The
+        # depth reached in every turn is kept per ongoing battle, and counted over
+        # the finished ones
+        self.search_time_budget = search_time_budget
+        self.search_depths: Dict[str, Dict[int, int]] = {}
+        self.search_depth_counts: Counter = Counter()
+        # depth-first minimax skipping the leaf evaluations that can't change the
+        # decision, with the number of evaluations made and pruned per ongoing
+        # battle, and summed over the finished ones
+        self.alpha_beta = alpha_beta
+        self.alpha_beta_stats: Dict[str, Counter] = defaultdict(Counter)
+        self.alpha_beta_totals: Counter = Counter()
+        self.cache_nonzero_temperature = cache_nonzero_temperature
+        # turn scores and rationales are appended to per-battle JSONL logs by a
+        # background thread, shared by the players of the process by default
+        self.log_writer = get_log_writer() if log_writer is None else log_writer
+
+    def get_LLM_action(self, system_prompt, user_prompt, model, temperature=0.7, json_format=False, seed=None, stop=[], max_tokens=200, actions=None, llm=None, battle=None, cache=None, validate=None) -> str:
+        if cache is None:
+            cache = temperature == 0 or self.cache_nonzero_temperature
+        # actions constrain the output of local models: part of the request
+        cache = cache and self.llm_cache is not None and actions is None
+        # only outputs the caller can use are cached, a malformed one would
+        # otherwise be replayed for every later identical request
+        if validate is None:
+            validate = _is_json_object if json_format else None
+        output = None
+        if cache:
+            cache_key = self.llm_cache.make_key(system_prompt, user_prompt, model, temperature, json_format, max_tokens, stop, seed)
+            output = self.llm_cache.get(cache_key, validate)
+        if output is None:
+            if llm is None:
+                output, _ = self.llm.get_LLM_action(system_prompt, user_prompt, model, temperature, True, seed, stop, max_tokens=max_tokens, actions=actions)
+            else:
+                output, _ = llm.get_LLM_action(system_prompt, user_prompt, model, temperature, True, seed, stop, max_tokens=max_tokens, actions=actions)
+            if cache and (validate is None or validate(output)):
+                self.llm_cache.put(cache_key, output)
         rationale_text = None
         parsed_json = None
         if output.lstrip().startswith("{"):
@@ -126,16 +228,10 @@ class LLMPlayer(Player):
 
     
     def check_all_pokemon(self, pokemon_str: str) -> Pokemon:
-        valid_pokemon = None
-        if pokemon_str in self._pokemon_dict:
-            valid_pokemon = pokemon_str
-        else:
-            closest = get_close_matches(pokemon_str, self._pokemon_dict.keys(), n=1, cutoff=0.8)
-            if len(closest) > 0:
-                valid_pokemon = closest[0]
+        valid_pokemon = name_index(self.genNum, "species").get(pokemon_str)
         if valid_pokemon is None:
             return None
-        pokemon = Pokemon(species=pokemon_str, gen=self.genNum)
+        pokemon = Pokemon(species=valid_pokemon, gen=self.genNum)
         return pokemon
 
     def choose_move(self, battle: AbstractBattle):
@@ -293,46 +389,14 @@ class LLMPlayer(Player):
                     "Player Next Action": player_action_desc,
                     "Opponent Next Action": opp_action_desc,
                     "Rationale": rationale,
-                    "Score": score
+                    "Score": score,
+                    "Search Depth": self.search_depth(battle)
                 }
-                # Determine file name (one per battle per player) and append the turn entry
-                player_name = getattr(self.ps_client.account_configuration, "username", "player")
-                # Use battle ID or tag for the JSON structure key
-                battle_id_str = ''.join(filter(str.isdigit, battle.battle_tag)) or battle.battle_tag
-                battle_key = f"Battle Id: {int(battle_id_str):03d}" if battle_id_str.isdigit() else f"Battle Id: {battle_id_str}"
-                if battle.finished:
-                    if battle.won is None:  # tie
-                        outcome_tag = "tie"
-                    else:
-                        outcome_tag = "winner" if battle.won else "loser"
-                else:
-                    outcome_tag = "inprogress"
-                # Open or create the JSON log file
-                if self.log_dir is None:
-                    log_path = f"score_evaluation_{battle_key}_{player_name}_{outcome_tag}.json"
-                else:
-                    os.makedirs(self.log_dir, exist_ok=True)
-                    log_path = os.path.join(
-                        self.log_dir,
-                        f"score_evaluation_{battle_key}_{player_name}_{outcome_tag}.json"
-                    )
-                if battle.finished and outcome_tag != "inprogress":
-                    tmp_path = log_path.replace(outcome_tag, "inprogress")
-                    if os.path.exists(tmp_path):
-                        os.replace(tmp_path, log_path)
-                try:
-                    with open(log_path, "r") as f:
-                        data = json.load(f)
-                except FileNotFoundError:
-                    data = {}
-                # Append or create the battle entry
-
-                if battle_key not in data:
-                    data[battle_key] = {}
-                data[battle_key][f"Turn {battle.turn}"] = turn_entry
-                # Save back to the JSON file
-                with open(log_path, "w") as f:
-                    json.dump(data, f, indent=4)
+                self.log_writer.append(self._score_log_path(battle), {
+                    "battle": self._score_log_key(battle),
+                    "turn": battle.turn,
+                    "entry": turn_entry,
+                })
                 return best_action  # execute the chosen action
             except Exception as e:
                 print("minimax step failed. Using dmg calc")
@@ -374,14 +438,16 @@ class LLMPlayer(Player):
                     move_list = battle.active_pokemon.moves.values()
                     if dont_verify: # opponent
                         move_list = battle.opponent_active_pokemon.moves.values()
-                    for i, move in enumerate(move_list):
-                        if move.id.lower().replace(' ', '') == llm_move_id.lower().replace(' ', ''):
-                            #next_action = self.create_order(move, dynamax=sim._should_dynamax(battle), terastallize=sim._should_terastallize(battle))
-                            next_action = self.create_order(move, dynamax=dynamax, terastallize=tera)
+                    moves_by_id = {move.id: move for move in move_list}
+                    move_id = name_index(self.gen.gen, "moves").get(llm_move_id, within=moves_by_id)
+                    if move_id is not None:
+                        #next_action = self.create_order(move, dynamax=sim._should_dynamax(battle), terastallize=sim._should_terastallize(battle))
+                        next_action = self.create_order(moves_by_id[move_id], dynamax=dynamax, terastallize=tera)
                     if next_action is None and dont_verify:
                         # unseen move so just check if it is in the action prompt
-                        if llm_move_id.lower().replace(' ', '') in state_action_prompt:
-                            next_action = self.create_order(Move(llm_move_id.lower().replace(' ', ''), self.gen.gen), dynamax=dynamax, terastallize=tera)
+                        move_id = name_index(self.gen.gen, "moves").get(llm_move_id)
+                        if move_id is not None and move_id in state_action_prompt:
+                            next_action = self.create_order(Move(move_id, self.gen.gen), dynamax=dynamax, terastallize=tera)
                 elif "switch" in llm_action_json.keys():
                     llm_switch_species = llm_action_json["switch"].strip()
                     switch_list = battle.available_switches
@@ -391,9 +457,10 @@ class LLMPlayer(Player):
                             if not opponent_pokemon.active:
                                 observable_switches.append(opponent_pokemon)
                         switch_list = observable_switches
-                    for i, pokemon in enumerate(switch_list):
-                        if pokemon.species.lower().replace(' ', '') == llm_switch_species.lower().replace(' ', ''):
-                            next_action = self.create_order(pokemon)
+                    switches_by_species = {pokemon.species: pokemon for pokemon in switch_list}
+                    species = name_index(self.gen.gen, "species").get(llm_switch_species, within=switches_by_species)
+                    if species is not None:
+                        next_action = self.create_order(switches_by_species[species])
                 else:
                     raise ValueError('No valid action')
                 
@@ -444,12 +511,8 @@ class LLMPlayer(Player):
             ensuring each agent writes to its own file.
         """
         try:
-            # 1) figure out names
-            if player_name is None:
-                player_name = getattr(
-                    self.ps_client.account_configuration, "username", "player"
-                )
-            battle_id = getattr(battle, "battle_tag", "unknown").replace(":", "_")
+            # 1) figure out the per-player file
+            out_path = self._rationale_log_path(battle, player_name)
 
             # 2) split out rationale vs action
             rationale_text = llm_action_json.get("thought")
@@ -466,21 +529,47 @@ class LLMPlayer(Player):
                 "response": response_json,
             }
 
-            # 4) ensure directory and file path
-            rationale_dir = os.path.join("battle_log", "rationale")
-            os.makedirs(rationale_dir, exist_ok=True)
-            file_name = f"{battle_id}_{player_name}_rationales.jsonl"
-            out_path = os.path.join(rationale_dir, file_name)
-
-            # 5) write one JSONL line
-            with open(out_path, "a", encoding="utf8") as f:
-                f.write(json.dumps(log_entry, ensure_ascii=False) + "\n")
+            # 4) queue one JSONL line, the file is closed when the battle ends
+            self.log_writer.append(out_path, log_entry)
 
         except Exception:
             # never break gameplay if logging fails
             pass
 
 
+    def _score_log_key(self, battle: AbstractBattle) -> str:
+        # Use battle ID or tag for the JSON structure key
+        battle_id_str = ''.join(filter(str.isdigit, battle.battle_tag)) or battle.battle_tag
+        return f"Battle Id: {int(battle_id_str):03d}" if battle_id_str.isdigit() else f"Battle Id: {battle_id_str}"
+
+    def _score_log_path(self, battle: AbstractBattle, outcome_tag: str="inprogress") -> str:
+        """Minimax score log of a battle, one per battle per player. It is renamed
+        with the outcome of the battle when it ends, and compact_score_log gives
+        its score_evaluation JSON."""
+        player_name = getattr(self.ps_client.account_configuration, "username", "player")
+        file_name = f"score_evaluation_{self._score_log_key(battle)}_{player_name}_{outcome_tag}.jsonl"
+        if self.log_dir is None:
+            return file_name
+        return os.path.join(self.log_dir, file_name)
+
+    def _battle_finished_callback(self, battle: AbstractBattle):
+        if battle.won is None:  # tie
+            outcome_tag = "tie"
+        else:
+            outcome_tag = "winner" if battle.won else "loser"
+        self.log_writer.finish(self._score_log_path(battle), self._score_log_path(battle, outcome_tag))
+        self.log_writer.finish(self._rationale_log_path(battle))
+        # the search results of a finished battle are never looked up again
+        self._transposition_tables.pop(battle.battle_tag, None)
+        self.search_depth_counts.update(self.search_depths.pop(battle.battle_tag, {}).values())
+        self.alpha_beta_totals.update(self.alpha_beta_stats.pop(battle.battle_tag, Counter()))
+
+    def _rationale_log_path(self, battle: AbstractBattle, player_name: Optional[str]=None) -> str:
+        if player_name is None:
+            player_name = getattr(self.ps_client.account_configuration, "username", "player")
+        battle_id = getattr(battle, "battle_tag", "unknown").replace(":", "_")
+        return os.path.join("battle_log", "rationale", f"{battle_id}_{player_name}_rationales.jsonl")
+
     def sc(self, retries, system_prompt, state_prompt, constraint_prompt_cot, constraint_prompt_io, state_action_prompt, battle, sim):
         actions = [self.io(retries, system_prompt, state_prompt, constraint_prompt_cot, constraint_prompt_io, state_action_prompt, battle, sim) for i in range(self.K)]
         action_message = [action.message for action in actions]
@@ -495,14 +584,12 @@ class LLMPlayer(Player):
             moves = sim.get_opponent_current_moves(mon=mon)
         if battle.active_pokemon.species == mon.species and not is_opp:
             moves = [move.id for move in battle.available_moves]
-        for move_id in moves:
-            move = Move(move_id, gen=sim.gen.gen)
-            t = np.inf
+        move_list = [Move(move_id, gen=sim.gen.gen) for move_id in moves]
+        move_turns, _ = get_number_turns_faint_batch(mon, move_list, mon_opp, sim, boosts1=mon._boosts.copy(), boosts2=mon_opp.boosts.copy())
+        for move, t in zip(move_list, move_turns):
             if move.category == MoveCategory.STATUS:
                 # apply stat boosting effects to see if it will KO in fewer turns
                 t = get_status_num_turns_fnt(mon, move, mon_opp, sim, boosts=mon._boosts.copy())
-            else:
-                t = get_number_turns_faint(mon, move, mon_opp, sim, boosts1=mon._boosts.copy(), boosts2=mon_opp.boosts.copy())
             hp_remaining.append(t)
             # _, hp2, _, _ = sim.calculate_remaining_hp(battle.active_pokemon, battle.opponent_active_pokemon, move, None)
             # hp_remaining.append(hp2)
@@ -514,24 +601,24 @@ class LLMPlayer(Player):
         # check special moves: tera/dyna
         # dyna for gen 8
         if sim.battle._data.gen == 8 and sim.battle.can_dynamax:
-            for move_id in moves:
-                move = Move(move_id, gen=sim.gen.gen).dynamaxed
+            move_list = [Move(move_id, gen=sim.gen.gen).dynamaxed for move_id in moves]
+            move_turns, _ = get_number_turns_faint_batch(mon, move_list, mon_opp, sim, boosts1=mon._boosts.copy(), boosts2=mon_opp.boosts.copy())
+            for move, t in zip(move_list, move_turns):
                 if move.category != MoveCategory.STATUS:
-                    t = get_number_turns_faint(mon, move, mon_opp, sim, boosts1=mon._boosts.copy(), boosts2=mon_opp.boosts.copy())
                     if t < best_move_turns:
                         best_move = self.create_order(move, dynamax=True)
                         best_move_turns = t
         # tera for gen 9
         elif sim.battle._data.gen == 9 and sim.battle.can_tera:
-            mon.terastallize()
-            for move_id in moves:
-                move = Move(move_id, gen=sim.gen.gen)
+            # a copy: mon may be shared with other battle snapshots
+            mon_tera = mon.terastallized_copy()
+            move_list = [Move(move_id, gen=sim.gen.gen) for move_id in moves]
+            move_turns, _ = get_number_turns_faint_batch(mon_tera, move_list, mon_opp, sim, boosts1=mon._boosts.copy(), boosts2=mon_opp.boosts.copy())
+            for move, t in zip(move_list, move_turns):
                 if move.category != MoveCategory.STATUS:
-                    t = get_number_turns_faint(mon, move, mon_opp, sim, boosts1=mon._boosts.copy(), boosts2=mon_opp.boosts.copy())
                     if t < best_move_turns:
                         best_move = self.create_order(move, terastallize=True)
                         best_move_turns = t
-            mon.unterastallize()
             
         return best_move, best_move_turns
 
@@ -591,274 +678,523 @@ class LLMPlayer(Player):
         else:
             return None
 
-    def tree_search(self, retries, battle, sim=None, return_opp = False) -> BattleOrder:
-        # generate local simulation
-        root = SimNode(battle, 
-                        self.move_effect,
-                        self.pokemon_move_dict,
-                        self.ability_effect,
-                        self.pokemon_ability_dict,
-                        self.item_effect,
-                        self.pokemon_item_dict,
-                        self.gen,
-                        self._dynamax_disable,
-                        depth=1,
-                        format=self.format,
-                        prompt_translate=self.prompt_translate,
-                        sim=sim
-                        ) 
-        q = [
-                root
-            ]
-        leaf_nodes = []
-        # create node and add to q B times
+    def transposition_table(self, battle: AbstractBattle) -> TranspositionTable:
+        if battle.battle_tag not in self._transposition_tables:
+            self._transposition_tables[battle.battle_tag] = TranspositionTable(self.transposition_table_size)
+        return self._transposition_tables[battle.battle_tag]
+
+    def search_depth(self, battle: AbstractBattle, turn: Optional[int]=None) -> int:
+        """Returns the depth of the deepest tree search completed for a turn of a
+        battle, the current turn by default. 0 when the search ran out of time
+        before completing a depth and the damage calculator's move was played."""
+        turn = battle.turn if turn is None else turn
+        return self.search_depths.get(battle.battle_tag, {}).get(turn, 0)
+
+    def _wait(self, future: Future, deadline: Optional[float]=None):
+        """Returns the result of a search LLM call, raising SearchTimeout if it is
+        not available by the deadline."""
+        if deadline is None:
+            return future.result()
+        try:
+            return future.result(timeout=max(deadline - time.time(), 0.))
+        except FutureTimeoutError:
+            raise SearchTimeout()
+
+    def _fallback_action(self, battle: AbstractBattle) -> BattleOrder:
+        move, _ = self.dmg_calc_move(battle)
+        if move is None:
+            return self.choose_max_damage_move(battle)
+        return move
+
+    def tree_search(self, retries, battle, sim=None, return_opp = False, time_budget: Optional[float]=None) -> BattleOrder:
+        """Minimax search of depth self.K over the actions proposed by the LLM.
+
+        With a time budget, in seconds, the search is anytime: it deepens one
+        depth at a time from 2 up to self.K, keeps the best action of the deepest
+        completed search, and returns it once the budget runs out, or the damage
+        calculator's move if no search completed. Expansions and values of the
+        shallower searches are reused through the transposition table, so that
+        deepening only pays for the new layer. The reached depth is stored in
+        search_depths.
+        """
+        if time_budget is None:
+            time_budget = self.search_time_budget
         start_time = time.time()
-        while len(q) != 0:
-            node = q.pop(0)
-            # choose node for expansion
-            # generate B actions
-            player_actions = []
-            system_prompt, state_prompt, constraint_prompt_cot, constraint_prompt_io, state_action_prompt, action_prompt_switch, action_prompt_move = node.simulation.get_player_prompt(return_actions=True)
-            # panic_move = self.check_timeout(start_time, battle)
-            # if panic_move is not None:
-            #     return panic_move
-            # end if terminal
-            if node.simulation.is_terminal() or node.depth == self.K:
-                try:
-                    # value estimation for leaf nodes
-                    value_prompt = 'Evaluate the score from 1-100 based on how likely the player is to win. Higher is better. Start at 50 points.' +\
-                                    'Add points based on the effectiveness of current available moves.' +\
-                                    'Award points for each pokemon remaining on the player\'s team, weighted by their strength.' +\
-                                    'Add points for boosted status and opponent entry hazards and subtract points for status effects and player entry hazards. ' +\
-                                    'Subtract points for excessive switching.' +\
-                                    'Subtract points based on the effectiveness of the opponent\'s current moves, especially if they have a faster speed.' +\
-                                    'Remove points for each pokemon remaining on the opponent\'s team, weighted by their strength.\n'
-                    cot_prompt = (
-                        "Think step-by-step (≤ 7 short sentences in total). "
-                        "list every pivotal ability, move, "
-                        "or type interaction that influences the score, each with a brief "
-                        "description (e.g. *\"Quark-Drive boosts Speed → outspeeds Primarina\"*). "
-                        'After the explanation, output **one** JSON object exactly in this form:\n'
-                        '{"thought":"<your brief justification>", "score": <total_points>}\n'
-                    )
-                    state_prompt_io = state_prompt + value_prompt + cot_prompt
-                    llm_output = self.get_LLM_action(system_prompt=system_prompt,
-                                                    user_prompt=state_prompt_io,
-                                                    model=self.backend,
-                                                    temperature=self.temperature,
-                                                    max_tokens=500,
-                                                    json_format=True,
-                                                    llm=self.llm_value,
-                                                    battle=battle,
-                                                    )
-                    # load when llm does heavylifting for parsing
-                    llm_action_json = json.loads(llm_output)
-                    node.hp_diff = int(llm_action_json['score'])
-                    node.rationale = llm_action_json.get("thought")
-                except Exception as e:
-                    node.hp_diff = node.simulation.get_hp_diff()                    
-                    print(e)
-                
-                leaf_nodes.append(node)
-                continue
-            # panic_move = self.check_timeout(start_time, battle)
-            # if panic_move is not None:
-            #     return panic_move
-            # estimate opp
-            try:
-                opp_move, opp_turns = self.estimate_matchup(
-                    node.simulation,
-                    node.simulation.battle,
-                    node.simulation.battle.opponent_active_pokemon,
-                    node.simulation.battle.active_pokemon,
-                    is_opp=True,
-                )
-            except Exception:
-                opp_move, opp_turns = None, np.inf
-            if isinstance(opp_move, Move):
-                action_opp = BattleOrder.move_to_order(opp_move, target=0)
-            else:
-                action_opp = None
-            node.action_opp = action_opp
-            ##############################
-            # generate players's action  #
-            ##############################
-            if not node.simulation.battle.active_pokemon.fainted and len(battle.available_moves) > 0:
-                # get dmg calc move
-                dmg_calc_out, dmg_calc_turns = self.dmg_calc_move(node.simulation.battle)
-                if dmg_calc_out is not None:
-                    if dmg_calc_turns <= opp_turns:
-                        try:
-                            # ask LLM to use heuristic tool or minimax search
-                            tool_prompt = '''Based on the current battle state, evaluate whether to use the damage calculator tool or the minimax tree search method. Consider the following factors:
-
-                                1. Damage calculator advantages:
-                                - Quick and efficient for finding optimal damaging moves
-                                - Useful when a clear type advantage or high-power move is available
-                                - Effective when the opponent's is not switching and current pokemon is likely to KO opponent
-
-                                2. Minimax tree search advantages:
-                                - Can model opponent behavior and predict future moves
-                                - Useful in complex situations with multiple viable options
-                                - Effective when long-term strategy is crucial
-
-                                3. Current battle state:
-                                - Remaining Pokémon on each side
-                                - Health of active Pokémon
-                                - Type matchups
-                                - Available moves and their effects
-                                - Presence of status conditions or field effects
-
-                                4. Uncertainty level:
-                                - How predictable is the opponent's next move?
-                                - Are there multiple equally viable options for your next move?
-
-                                Evaluate these factors and decide which method would be more beneficial in the current situation. Output your choice in the following JSON format:
-                                First **think step by step** about these factors,  list every pivotal ability, move, or type interaction that influences the score, each with a brief description (e.g. *\"Quark-Drive boosts Speed → outspeeds Primarina\"*). 
-                                After the explanation, output **one** JSON object exactly in this form:\n'
-                            
-                                {"thought":"<your short justification (≤ 4 sentences)>",
-                                 "choice":"damage calculator" or "choice":"minimax"} '''
-
-                            state_prompt_io = state_prompt + tool_prompt
-                            llm_output = self.get_LLM_action(system_prompt=system_prompt,
-                                                            user_prompt=state_prompt_io,
-                                                            model=self.backend,
-                                                            temperature=0.6,
-                                                            max_tokens=100,
-                                                            json_format=True,
-                                                            battle=battle
-                                                            )
-                            # load when llm does heavy lifting for parsing
-                            llm_action_json = json.loads(llm_output)
-                            rationale = llm_action_json.get("thought", "").strip()
-                            if not rationale:
-                                rationale = (
-                                    f"Heuristic TTK shortcut: my_turns={dmg_calc_turns}, "
-                                    f"opp_turns={opp_turns}"
+        deadline = None if time_budget is None else start_time + time_budget
+        depth_limits = [self.K] if deadline is None else list(range(min(2, self.K), self.K + 1))
+        # expand the tree one BFS layer at a time: the LLM calls of a layer are
+        # independent, so they are all issued at once on a bounded thread pool
+        executor = ThreadPoolExecutor(max_workers=self.search_concurrency)
+        table = self.transposition_table(battle)
+        table.new_search()
+        best, reached = None, 0
+        try:
+            for max_depth in depth_limits:
+                root = SimNode(battle,
+                                self.move_effect,
+                                self.pokemon_move_dict,
+                                self.ability_effect,
+                                self.pokemon_ability_dict,
+                                self.item_effect,
+                                self.pokemon_item_dict,
+                                self.gen,
+                                self._dynamax_disable,
+                                depth=1,
+                                format=self.format,
+                                prompt_translate=self.prompt_translate,
+                                sim=sim
                                 )
-                            if 'choice' in llm_action_json.keys():
-                                if llm_action_json['choice']  != 'minimax':
-                                    heuristic_score = -1
-                                    if return_opp:
-                                        return dmg_calc_out, action_opp, heuristic_score, rationale
-                                    return dmg_calc_out
-                        except:
-                            print('defaulting to minimax')
-                    player_actions.append(dmg_calc_out)
-            # panic_move = self.check_timeout(start_time, battle)
-            # if panic_move is not None:
-            #     return panic_move
-            # get llm switch
-
-            # LLM Suggested Up to 2 switch Pokemons
-            if len(node.simulation.battle.available_switches) != 0:# or opp_turns < dmg_calc_turns):
-                state_action_prompt_switch = state_action_prompt + action_prompt_switch + '\nYou can only choose to switch this turn.\n'
-                constraint_prompt_io = 'Choose the best action and your output MUST be a JSON like: {"switch":"<switch_pokemon_name>"}.\n'
-                for i in range(2):
-                    action_llm_switch = self.io(retries, system_prompt, state_prompt, constraint_prompt_cot, constraint_prompt_io, state_action_prompt_switch, node.simulation.battle, node.simulation)
-                    if len(player_actions) == 0:
-                        player_actions.append(action_llm_switch)
-                    elif action_llm_switch.message != player_actions[-1].message:
-                        player_actions.append(action_llm_switch)
-
-            # LLM Suggested Up to 1 Move
-            if not node.simulation.battle.active_pokemon.fainted and len(battle.available_moves) > 0:# and not opp_turns < dmg_calc_turns:
-                # get llm move
-                state_action_prompt_move = state_action_prompt + action_prompt_move + '\nYou can only choose to move this turn.\n'
-                constraint_prompt_io = 'Choose the best action and your output MUST be a JSON like: {"move":"<move_name>"}.\n'
-                action_llm_move = self.io(retries, system_prompt, state_prompt, constraint_prompt_cot, constraint_prompt_io, state_action_prompt_move, node.simulation.battle, node.simulation)
-                if len(player_actions) == 0:
-                    player_actions.append(action_llm_move)
-                elif action_llm_move.message != player_actions[0].message:
-                    player_actions.append(action_llm_move)
-            # panic_move = self.check_timeout(start_time, battle)
-            # if panic_move is not None:
-            #     return panic_move
-            ##############################
-            # generate opponent's action #
-            ##############################
-            opponent_actions = []
-            tool_is_optimal = False
-            # dmg calc suggestion
-            # action_opp, opp_turns = self.estimate_matchup(node.simulation, node.simulation.battle, node.simulation.battle.opponent_active_pokemon, node.simulation.battle.active_pokemon, is_opp=True)
-            if action_opp is not None:
-                tool_is_optimal = True
-                opponent_actions.append(self.create_order(action_opp))
-            # heuristic matchup switch action
-            best_score = np.inf
-            best_action = None
-            for mon in node.simulation.battle.opponent_team.values():
-                if mon.species == node.simulation.battle.opponent_active_pokemon.species:
-                    continue
-                score = self._estimate_matchup(mon, node.simulation.battle.active_pokemon)
-                if score < best_score:
-                    best_score = score
-                    best_action = mon
-            if best_action is not None:
-                opponent_actions.append(self.create_order(best_action))
-            # panic_move = self.check_timeout(start_time, battle)
-            # if panic_move is not None:
-            #     return panic_move
-            # create opponent prompt from battle sim
-            system_prompt_o, state_prompt_o, constraint_prompt_cot_o, constraint_prompt_io_o, state_action_prompt_o = node.simulation.get_opponent_prompt(system_prompt)
-            action_o = self.io(2, system_prompt_o, state_prompt_o, constraint_prompt_cot_o, constraint_prompt_io_o, state_action_prompt_o, node.simulation.battle, node.simulation, dont_verify=True)
-            is_repeat_action_o = np.array([action_o.message == opponent_action.message for opponent_action in opponent_actions]).any()
-            if not is_repeat_action_o:
-                opponent_actions.append(action_o)
-            # panic_move = self.check_timeout(start_time, battle)
-            # if panic_move is not None:
-            #     return panic_move
-            # simulate outcome
-            if node.depth < self.K:
-                for action_p in player_actions:
-                    for action_o in opponent_actions:
-                        node_new = copy(node)
-                        node_new.simulation.battle = copy(node.simulation.battle)
-                        # if not tool_is_optimal:
-                        node_new.children = []
-                        node_new.depth = node.depth + 1
-                        node_new.action = action_p
-                        node_new.action_opp = action_o
-                        node_new.parent_node = node
-                        node_new.parent_action = node.action
-                        node.children.append(node_new)
-                        node_new.simulation.step(action_p, action_o)
-                        q.append(node_new)
-
-        # choose best action according to max or min rule
-        def get_tree_action(node: SimNode):
-            if len(node.children) == 0:  # leaf node
-                return node.action, node.hp_diff, node.action_opp, node.rationale
-            score_dict, action_dict, opp_dict, rationale_dict = {}, {}, {}, {}
-            for child in node.children:
-                action_str = str(child.action.order)  # player's action as string key
-                # Recursively get action, score, opp action, rationale for child node
-                action_obj, score_val, opp_act, rationale_text = get_tree_action(child)
-                if action_str in score_dict:
-                    # Minimax: opponent will minimize the score for this action
-                    if score_val < score_dict[action_str]:
-                        score_dict[action_str] = score_val
-                        opp_dict[action_str] = opp_act
-                        rationale_dict[action_str] = rationale_text
-                else:
-                    score_dict[action_str] = score_val
-                    action_dict[action_str] = action_obj
-                    opp_dict[action_str] = opp_act
-                    rationale_dict[action_str] = rationale_text
-            # Choose the player action with the highest worst-case score
-            best_action_str = max(score_dict, key=score_dict.get)
-            best_player_action = action_dict[best_action_str]
-            best_score = score_dict[best_action_str]
-            best_opp_action = opp_dict[best_action_str]
-            best_rationale = rationale_dict[best_action_str]
-            return best_player_action, best_score, best_opp_action, best_rationale
-
-        best_action, best_score, best_opp_action, best_rationale = get_tree_action(root)
+                try:
+                    if self.alpha_beta:
+                        result, best_at_depth = self._alpha_beta_tree(retries, battle, root, max_depth, executor, table, return_opp, deadline)
+                    else:
+                        result = self._search_tree(retries, battle, root, max_depth, executor, table, return_opp, deadline)
+                        best_at_depth = self._best_action(root) if result is None else None
+                except SearchTimeout:
+                    break
+                reached = max_depth
+                if result is not None:
+                    # the LLM chose the damage calculator's action
+                    return result
+                best = best_at_depth
+        finally:
+            # an early return leaves the rest of the layer in flight: drop it
+            executor.shutdown(wait=False, cancel_futures=True)
+            self.search_depths.setdefault(battle.battle_tag, {})[battle.turn] = reached
+            self.logger.info("%s turn %d: searched depth %d/%d in %.2fs, transposition table: %s",
+                             battle.battle_tag, battle.turn, reached, self.K, time.time() - start_time, table.stats())
+
+        if best is None:
+            print('default due to time')
+            best_action = self._fallback_action(battle)
+            if return_opp:
+                return best_action, None, None, f"Search timed out after {time_budget}s, damage calculator move"
+            return best_action
+        best_action, best_opp_action, best_score, best_rationale = best
         if return_opp:
             return best_action, best_opp_action, best_score, best_rationale
         return best_action
+
+    def _search_tree(self, retries, battle, root: SimNode, max_depth: int, executor: ThreadPoolExecutor,
+                     table: TranspositionTable, return_opp: bool=False, deadline: Optional[float]=None):
+        """Expands and evaluates the tree of root down to max_depth. Returns the
+        result of the search if the LLM prefers the damage calculator's action to a
+        search, None otherwise. Raises SearchTimeout when the deadline passes.
+        """
+        layer = [
+                root
+            ]
+        while len(layer) != 0:
+            if deadline is not None and time.time() > deadline:
+                raise SearchTimeout()
+            # a state reached through several action sequences is expanded once:
+            # nodes of the layer in the same state share an expansion, and values
+            # and expansions of earlier layers and turns are reused
+            keys = [node.simulation.state_key() for node in layer]
+            expansions = []
+            layer_expansions = {}
+            for node, key in zip(layer, keys):
+                if key in layer_expansions:
+                    expansions.append(layer_expansions[key])
+                    continue
+                layer_expansions[key] = self._node_expansion(retries, battle, node, key, executor, table, max_depth)
+                expansions.append(layer_expansions[key])
+            next_layer = []
+            for node, key, expansion in zip(layer, keys, expansions):
+                player_actions, opponent_actions, result = self._apply_expansion(node, key, expansion, table, return_opp, deadline)
+                if result is not None:
+                    return result
+                if expansion['leaf']:
+                    continue
+                # simulate outcome
+                if node.depth < max_depth:
+                    for action_p in player_actions:
+                        for action_o in opponent_actions:
+                            node_new = node.fork()
+                            node_new.depth = node.depth + 1
+                            node_new.action = action_p
+                            node_new.action_opp = action_o
+                            node_new.parent_node = node
+                            node_new.parent_action = node.action
+                            node.children.append(node_new)
+                            node_new.simulation.step(action_p, action_o)
+                            next_layer.append(node_new)
+            layer = next_layer
+        return None
+
+    def _alpha_beta_tree(self, retries, battle, root: SimNode, max_depth: int, executor: ThreadPoolExecutor,
+                         table: TranspositionTable, return_opp: bool=False, deadline: Optional[float]=None):
+        """Alpha-beta variant of _search_tree. The tree of root is searched depth
+        first, down to max_depth, with the player's and the opponent's actions
+        ordered by the damage calculator heuristics, and leaves are only evaluated
+        by the LLM when they can still change the decision at root.
+
+        Returns (result, best): result is the result of the search if the LLM
+        prefers the damage calculator's action to a search, None otherwise; best is
+        the (action, opponent action, score, rationale) chosen at root. Raises
+        SearchTimeout when the deadline passes.
+        """
+        stats = Counter()
+
+        def count_pruned(node: SimNode, n: int):
+            stats['pruned_leaves' if node.depth + 1 == max_depth else 'pruned_subtrees'] += n
+
+        def search(node: SimNode, alpha: float, beta: float):
+            if deadline is not None and time.time() > deadline:
+                raise SearchTimeout()
+            key = node.simulation.state_key()
+            expansion = self._node_expansion(retries, battle, node, key, executor, table, max_depth)
+            if expansion['leaf'] and 'cached' not in expansion:
+                stats['leaf_evaluations'] += 1
+            player_actions, opponent_actions, result = self._apply_expansion(node, key, expansion, table, return_opp, deadline)
+            if result is not None:
+                raise _DamageCalculatorChoice(result)
+            if expansion['leaf'] or len(player_actions) == 0 or len(opponent_actions) == 0:
+                return node.hp_diff, (node.action, node.action_opp, node.hp_diff, node.rationale)
+            player_actions = self._order_actions(node.simulation, player_actions)
+            opponent_actions = self._order_actions(node.simulation, opponent_actions, is_opp=True)
+            best_value, best = -np.inf, None
+            for i, action_p in enumerate(player_actions):
+                # the opponent minimizes the score of each player action
+                value, reply = np.inf, None
+                for j, action_o in enumerate(opponent_actions):
+                    node_new = node.fork()
+                    node_new.depth = node.depth + 1
+                    node_new.action = action_p
+                    node_new.action_opp = action_o
+                    node_new.parent_node = node
+                    node_new.parent_action = node.action
+                    node.children.append(node_new)
+                    node_new.simulation.step(action_p, action_o)
+                    child_value, child_best = search(node_new, max(alpha, best_value), min(beta, value))
+                    if child_value < value:
+                        value, reply = child_value, (action_p, action_o, child_value, child_best[3])
+                    if value <= max(alpha, best_value):
+                        # this action can't do better than one already searched
+                        count_pruned(node, len(opponent_actions) - j - 1)
+                        break
+                if value > best_value:
+                    best_value, best = value, reply
+                if best_value >= beta:
+                    # the opponent won't let the game reach this node
+                    count_pruned(node, (len(player_actions) - i - 1) * len(opponent_actions))
+                    break
+            return best_value, best
+
+        try:
+            _, best = search(root, -np.inf, np.inf)
+            return None, best
+        except _DamageCalculatorChoice as choice:
+            return choice.result, None
+        finally:
+            for name, count in stats.items():
+                self.alpha_beta_stats[battle.battle_tag][name] += count
+            self.logger.info("%s turn %d: alpha-beta depth %d, %d leaf evaluations, %d leaves and %d subtrees pruned",
+                             battle.battle_tag, battle.turn, max_depth, stats['leaf_evaluations'],
+                             stats['pruned_leaves'], stats['pruned_subtrees'])
+
+    def _order_actions(self, sim: LocalSim, actions: List[BattleOrder], is_opp: bool=False) -> List[BattleOrder]:
+        """Sorts actions from best to worst for the side playing them, by
+        _action_heuristic."""
+        return sorted(actions, key=lambda action: self._action_heuristic(sim, action, is_opp), reverse=True)
+
+    def _action_heuristic(self, sim: LocalSim, action: BattleOrder, is_opp: bool=False) -> float:
+        """Cheap estimate of how good an action is for the side playing it, higher is
+        better: how fast a move KOs the opposing active pokemon, or the matchup of a
+        switch-in against it. Only used to order the actions of alpha-beta.
+        """
+        battle = sim.battle
+        mon, mon_opp = battle.active_pokemon, battle.opponent_active_pokemon
+        if is_opp:
+            mon, mon_opp = mon_opp, mon
+        order = action.order
+        try:
+            if isinstance(order, Pokemon):
+                return self._estimate_matchup(order, mon_opp) / 2
+            if isinstance(order, str):
+                # orders of BattleOrder.move_to_order, e.g. /choose move knockoff 1
+                words = order.split()
+                order = Move(words[words.index('move') + 1], gen=sim.gen.gen)
+            if isinstance(order, Move):
+                turns, _ = get_number_turns_faint_batch(mon, [order], mon_opp, sim,
+                                                        boosts1=mon._boosts.copy(), boosts2=mon_opp.boosts.copy())
+                return 2. / max(turns[0], 1)
+        except Exception:
+            pass
+        return 0.
+
+    def _node_expansion(self, retries, battle, node: SimNode, key, executor: ThreadPoolExecutor,
+                        table: TranspositionTable, max_depth: int) -> Dict:
+        """Returns the expansion of node cached in the transposition table, or
+        prepares it."""
+        leaf = node.simulation.is_terminal() or node.depth == max_depth
+        cached = table.get(key, 'value' if leaf else 'expansion')
+        if cached is not None:
+            return {'leaf': leaf, 'cached': cached}
+        return self._prepare_expansion(retries, battle, node, executor, max_depth)
+
+    def _apply_expansion(self, node: SimNode, key, expansion: Dict, table: TranspositionTable,
+                         return_opp: bool=False, deadline: Optional[float]=None):
+        """Sets the value of a leaf node, or the candidate actions of an inner node,
+        from its prepared or cached expansion, and stores them in the transposition
+        table. Returns the player's and the opponent's candidate actions (empty for
+        leaves), and the result of the search if the LLM prefers the damage
+        calculator's action to a search (None otherwise).
+        """
+        if expansion['leaf']:
+            if 'cached' in expansion:
+                node.hp_diff, node.rationale = expansion['cached']
+                return [], [], None
+            try:
+                # value estimation for leaf nodes
+                llm_action_json = json.loads(self._wait(expansion['value'], deadline))
+                node.hp_diff = int(llm_action_json['score'])
+                node.rationale = llm_action_json.get("thought")
+                table.put(key, 'value', (node.hp_diff, node.rationale))
+            except SearchTimeout:
+                raise
+            except Exception as e:
+                node.hp_diff = node.simulation.get_hp_diff()
+                print(e)
+            return [], [], None
+        if 'cached' in expansion:
+            node.action_opp, player_actions, opponent_actions = expansion['cached']
+            return player_actions, opponent_actions, None
+        player_actions, opponent_actions, result = self._resolve_expansion(expansion, node, return_opp, deadline)
+        if result is None:
+            table.put(key, 'expansion', (node.action_opp, player_actions, opponent_actions))
+        return player_actions, opponent_actions, result
+
+    def _best_action(self, node: SimNode):
+        """Returns the (action, opponent action, score, rationale) of node chosen by
+        the max or min rule."""
+        if len(node.children) == 0:  # leaf node
+            return node.action, node.action_opp, node.hp_diff, node.rationale
+        score_dict, action_dict, opp_dict, rationale_dict = {}, {}, {}, {}
+        for child in node.children:
+            action_str = str(child.action.order)  # player's action as string key
+            # Recursively get the backed up score and rationale of the child node
+            _, _, score_val, rationale_text = self._best_action(child)
+            if action_str in score_dict:
+                # Minimax: opponent will minimize the score for this action
+                if score_val < score_dict[action_str]:
+                    score_dict[action_str] = score_val
+                    opp_dict[action_str] = child.action_opp
+                    rationale_dict[action_str] = rationale_text
+            else:
+                score_dict[action_str] = score_val
+                action_dict[action_str] = child.action
+                opp_dict[action_str] = child.action_opp
+                rationale_dict[action_str] = rationale_text
+        # Choose the player action with the highest worst-case score
+        best_action_str = max(score_dict, key=score_dict.get)
+        return action_dict[best_action_str], opp_dict[best_action_str], score_dict[best_action_str], rationale_dict[best_action_str]
+
+    def _resolve_expansion(self, expansion: Dict, node: SimNode, return_opp: bool=False, deadline: Optional[float]=None):
+        """Waits for the LLM calls of a node expansion and returns the player's and
+        the opponent's candidate actions, and the result of the search if the LLM
+        prefers the damage calculator's action to a search (None otherwise).
+        """
+        action_opp = expansion['action_opp']
+        node.action_opp = action_opp
+        dmg_calc_out = expansion['dmg_calc_out']
+        ##############################
+        # generate players's action  #
+        ##############################
+        player_actions = []
+        if dmg_calc_out is not None:
+            if expansion['tool'] is not None:
+                try:
+                    # load when llm does heavy lifting for parsing
+                    llm_action_json = json.loads(self._wait(expansion['tool'], deadline))
+                    rationale = llm_action_json.get("thought", "").strip()
+                    if not rationale:
+                        rationale = (
+                            f"Heuristic TTK shortcut: my_turns={expansion['dmg_calc_turns']}, "
+                            f"opp_turns={expansion['opp_turns']}"
+                        )
+                    if 'choice' in llm_action_json.keys():
+                        if llm_action_json['choice']  != 'minimax':
+                            heuristic_score = -1
+                            if return_opp:
+                                return None, None, (dmg_calc_out, action_opp, heuristic_score, rationale)
+                            return None, None, dmg_calc_out
+                except SearchTimeout:
+                    raise
+                except:
+                    print('defaulting to minimax')
+            player_actions.append(dmg_calc_out)
+        # LLM Suggested Up to 2 switch Pokemons
+        for future in expansion['switches']:
+            action_llm_switch = self._wait(future, deadline)
+            if len(player_actions) == 0:
+                player_actions.append(action_llm_switch)
+            elif action_llm_switch.message != player_actions[-1].message:
+                player_actions.append(action_llm_switch)
+        # LLM Suggested Up to 1 Move
+        if expansion['move'] is not None:
+            action_llm_move = self._wait(expansion['move'], deadline)
+            if len(player_actions) == 0:
+                player_actions.append(action_llm_move)
+            elif action_llm_move.message != player_actions[0].message:
+                player_actions.append(action_llm_move)
+        ##############################
+        # generate opponent's action #
+        ##############################
+        opponent_actions = list(expansion['opponent_actions'])
+        action_o = self._wait(expansion['opponent'], deadline)
+        is_repeat_action_o = np.array([action_o.message == opponent_action.message for opponent_action in opponent_actions]).any()
+        if not is_repeat_action_o:
+            opponent_actions.append(action_o)
+        return player_actions, opponent_actions, None
+
+    def _prepare_expansion(self, retries, battle, node: SimNode, executor: ThreadPoolExecutor, max_depth: Optional[int]=None) -> Dict:
+        """Runs the cheap, local part of a node expansion and submits its LLM calls
+        to executor. The returned dict holds the heuristic actions and the futures of
+        the LLM calls, resolved by tree_search once the whole layer is submitted.
+        """
+        max_depth = self.K if max_depth is None else max_depth
+        system_prompt, state_prompt, constraint_prompt_cot, constraint_prompt_io, state_action_prompt, action_prompt_switch, action_prompt_move = node.simulation.get_player_prompt(return_actions=True)
+        # end if terminal
+        if node.simulation.is_terminal() or node.depth == max_depth:
+            # value estimation for leaf nodes
+            value_prompt = 'Evaluate the score from 1-100 based on how likely the player is to win. Higher is better. Start at 50 points.' +\
+                            'Add points based on the effectiveness of current available moves.' +\
+                            'Award points for each pokemon remaining on the player\'s team, weighted by their strength.' +\
+                            'Add points for boosted status and opponent entry hazards and subtract points for status effects and player entry hazards. ' +\
+                            'Subtract points for excessive switching.' +\
+                            'Subtract points based on the effectiveness of the opponent\'s current moves, especially if they have a faster speed.' +\
+                            'Remove points for each pokemon remaining on the opponent\'s team, weighted by their strength.\n'
+            cot_prompt = (
+                "Think step-by-step (≤ 7 short sentences in total). "
+                "list every pivotal ability, move, "
+                "or type interaction that influences the score, each with a brief "
+                "description (e.g. *\"Quark-Drive boosts Speed → outspeeds Primarina\"*). "
+                'After the explanation, output **one** JSON object exactly in this form:\n'
+                '{"thought":"<your brief justification>", "score": <total_points>}\n'
+            )
+            state_prompt_io = state_prompt + value_prompt + cot_prompt
+            value = executor.submit(self.get_LLM_action,
+                                    system_prompt=system_prompt,
+                                    user_prompt=state_prompt_io,
+                                    model=self.backend,
+                                    temperature=self.temperature,
+                                    max_tokens=500,
+                                    json_format=True,
+                                    llm=self.llm_value,
+                                    battle=battle,
+                                    validate=_is_leaf_value,
+                                    )
+            return {'leaf': True, 'value': value}
+        # estimate opp
+        try:
+            opp_move, opp_turns = self.estimate_matchup(
+                node.simulation,
+                node.simulation.battle,
+                node.simulation.battle.opponent_active_pokemon,
+                node.simulation.battle.active_pokemon,
+                is_opp=True,
+            )
+        except Exception:
+            opp_move, opp_turns = None, np.inf
+        if isinstance(opp_move, Move):
+            action_opp = BattleOrder.move_to_order(opp_move, target=0)
+        else:
+            action_opp = None
+        node.action_opp = action_opp
+        expansion = {
+            'leaf': False,
+            'action_opp': action_opp,
+            'opp_turns': opp_turns,
+            'dmg_calc_out': None,
+            'dmg_calc_turns': None,
+            'tool': None,
+            'switches': [],
+            'move': None,
+        }
+        can_move = not node.simulation.battle.active_pokemon.fainted and len(battle.available_moves) > 0
+        if can_move:
+            # get dmg calc move
+            dmg_calc_out, dmg_calc_turns = self.dmg_calc_move(node.simulation.battle)
+            if dmg_calc_out is not None:
+                expansion['dmg_calc_out'] = dmg_calc_out
+                expansion['dmg_calc_turns'] = dmg_calc_turns
+                if dmg_calc_turns <= opp_turns:
+                    # ask LLM to use heuristic tool or minimax search
+                    tool_prompt = '''Based on the current battle state, evaluate whether to use the damage calculator tool or the minimax tree search method. Consider the following factors:
+
+                        1. Damage calculator advantages:
+                        - Quick and efficient for finding optimal damaging moves
+                        - Useful when a clear type advantage or high-power move is available
+                        - Effective when the opponent's is not switching and current pokemon is likely to KO opponent
+
+                        2. Minimax tree search advantages:
+                        - Can model opponent behavior and predict future moves
+                        - Useful in complex situations with multiple viable options
+                        - Effective when long-term strategy is crucial
+
+                        3. Current battle state:
+                        - Remaining Pokémon on each side
+                        - Health of active Pokémon
+                        - Type matchups
+                        - Available moves and their effects
+                        - Presence of status conditions or field effects
+
+                        4. Uncertainty level:
+                        - How predictable is the opponent's next move?
+                        - Are there multiple equally viable options for your next move?
+
+                        Evaluate these factors and decide which method would be more beneficial in the current situation. Output your choice in the following JSON format:
+                        First **think step by step** about these factors,  list every pivotal ability, move, or type interaction that influences the score, each with a brief description (e.g. *\"Quark-Drive boosts Speed → outspeeds Primarina\"*). 
+                        After the explanation, output **one** JSON object exactly in this form:\n'
+                    
+                        {"thought":"<your short justification (≤ 4 sentences)>",
+                         "choice":"damage calculator" or "choice":"minimax"} '''
+
+                    state_prompt_io = state_prompt + tool_prompt
+                    expansion['tool'] = executor.submit(self.get_LLM_action,
+                                                        system_prompt=system_prompt,
+                                                        user_prompt=state_prompt_io,
+                                                        model=self.backend,
+                                                        temperature=0.6,
+                                                        max_tokens=100,
+                                                        json_format=True,
+                                                        battle=battle
+                                                        )
+        # LLM Suggested Up to 2 switch Pokemons
+        if len(node.simulation.battle.available_switches) != 0:
+            state_action_prompt_switch = state_action_prompt + action_prompt_switch + '\nYou can only choose to switch this turn.\n'
+            constraint_prompt_io = 'Choose the best action and your output MUST be a JSON like: {"switch":"<switch_pokemon_name>"}.\n'
+            for i in range(2):
+                expansion['switches'].append(executor.submit(self.io, retries, system_prompt, state_prompt, constraint_prompt_cot, constraint_prompt_io, state_action_prompt_switch, node.simulation.battle, node.simulation))
+        # LLM Suggested Up to 1 Move
+        if can_move:
+            state_action_prompt_move = state_action_prompt + action_prompt_move + '\nYou can only choose to move this turn.\n'
+            constraint_prompt_io = 'Choose the best action and your output MUST be a JSON like: {"move":"<move_name>"}.\n'
+            expansion['move'] = executor.submit(self.io, retries, system_prompt, state_prompt, constraint_prompt_cot, constraint_prompt_io, state_action_prompt_move, node.simulation.battle, node.simulation)
+        opponent_actions = []
+        # dmg calc suggestion
+        if action_opp is not None:
+            opponent_actions.append(self.create_order(action_opp))
+        # heuristic matchup switch action
+        best_score = np.inf
+        best_action = None
+        for mon in node.simulation.battle.opponent_team.values():
+            if mon.species == node.simulation.battle.opponent_active_pokemon.species:
+                continue
+            score = self._estimate_matchup(mon, node.simulation.battle.active_pokemon)
+            if score < best_score:
+                best_score = score
+                best_action = mon
+        if best_action is not None:
+            opponent_actions.append(self.create_order(best_action))
+        expansion['opponent_actions'] = opponent_actions
+        # create opponent prompt from battle sim
+        system_prompt_o, state_prompt_o, constraint_prompt_cot_o, constraint_prompt_io_o, state_action_prompt_o = node.simulation.get_opponent_prompt(system_prompt)
+        expansion['opponent'] = executor.submit(self.io, 2, system_prompt_o, state_prompt_o, constraint_prompt_cot_o, constraint_prompt_io_o, state_action_prompt_o, node.simulation.battle, node.simulation, dont_verify=True)
+        return expansion
  
+
     def battle_summary(self):
 
         beat_list = []
@@ -3,47 +3,37 @@ import sys
 from time import sleep
 from typing import Callable, Dict, List
 import numpy as np
-from copy import deepcopy
+from copy import copy, deepcopy
 
-import orjson
 
 from poke_env.data.gen_data import GenData
 from poke_env.environment.battle import Battle
 from poke_env.environment.move import Move
 from poke_env.environment.move_category import MoveCategory
 from poke_env.environment.pokemon import Pokemon
-from poke_env.environment.side_condition import SideCondition
+from poke_env.environment.side_condition import STACKABLE_CONDITIONS, SideCondition
 from poke_env.environment.status import Status
+from poke_env.environment.turn_history import NEUTRAL_PERSPECTIVE, PLAYER1_PERSPECTIVE, PLAYER2_PERSPECTIVE
 from poke_env.player.battle_order import BattleOrder
+from poke_env.player.damage_calc import DamageBatch, calculate_damage_batch
 from poke_env.player.gpt_player import GPTPlayer
 from poke_env.player.llama_player import LLAMAPlayer
 
 DEBUG = False
 
-def calculate_move_type_damage_multipier(type_1, type_2, type_chart, constraint_type_list):
-    TYPE_list = 'BUG,DARK,DRAGON,ELECTRIC,FAIRY,FIGHTING,FIRE,FLYING,GHOST,GRASS,GROUND,ICE,NORMAL,POISON,PSYCHIC,ROCK,STEEL,WATER'.split(",")
-
-    move_type_damage_multiplier_list = []
-
-    if type_2:
-        for type in TYPE_list:
-            if 'STELLAR' not in [type, type_1, type_2]:
-                move_type_damage_multiplier_list.append(type_chart[type_1][type] * type_chart[type_2][type])
-            else: 
-                move_type_damage_multiplier_list.append(1)
-        move_type_damage_multiplier_dict = dict(zip(TYPE_list, move_type_damage_multiplier_list))
-    else:
-        if type_1 == 'STELLAR':
-            move_type_damage_multiplier_dict = {'BUG': 1, 'DARK': 1, 'DRAGON': 1, 'ELECTRIC': 1, 'FAIRY': 1, 'FIGHTING': 1, 'FIRE': 1, 'FLYING': 1, 'GHOST': 1, 'GRASS': 1, 'GROUND': 1, 'ICE': 1, 'NORMAL': 1, 'POISON': 1, 'PSYCHIC': 1, 'ROCK': 1, 'STEEL': 1, 'WATER': 1}
-        else:
-            move_type_damage_multiplier_dict = type_chart[type_1]
+TYPE_LIST = 'BUG,DARK,DRAGON,ELECTRIC,FAIRY,FIGHTING,FIRE,FLYING,GHOST,GRASS,GROUND,ICE,NORMAL,POISON,PSYCHIC,ROCK,STEEL,WATER'.split(",")
+
+def calculate_move_type_damage_multipier(type_1, type_2, gen: GenData, constraint_type_list):
+    # only the constrained attacking types are looked up, in a single batched call
+    attacking_types = list(dict.fromkeys(constraint_type_list)) if constraint_type_list else TYPE_LIST
+    multipliers = gen.damage_multipliers(attacking_types, [(type_1, type_2)])[:, 0]
 
     effective_type_list = []
     extreme_type_list = []
     resistant_type_list = []
     extreme_resistant_type_list = []
     immune_type_list = []
-    for type, value in move_type_damage_multiplier_dict.items():
+    for type, value in zip(attacking_types, multipliers):
         if value == 2:
             effective_type_list.append(type)
         elif value == 4:
@@ -57,20 +47,18 @@ def calculate_move_type_damage_multipier(type_1, type_2, type_chart, constraint_
         else:  # value == 1
             continue
 
-    if constraint_type_list:
-        extreme_type_list = list(set(extreme_type_list).intersection(set(constraint_type_list)))
-        effective_type_list = list(set(effective_type_list).intersection(set(constraint_type_list)))
-        resistant_type_list = list(set(resistant_type_list).intersection(set(constraint_type_list)))
-        extreme_resistant_type_list = list(set(extreme_resistant_type_list).intersection(set(constraint_type_list)))
-        immune_type_list = list(set(immune_type_list).intersection(set(constraint_type_list)))
-
     return (list(map(lambda x: x.capitalize(), extreme_type_list)),
            list(map(lambda x: x.capitalize(), effective_type_list)),
            list(map(lambda x: x.capitalize(), resistant_type_list)),
            list(map(lambda x: x.capitalize(), extreme_resistant_type_list)),
            list(map(lambda x: x.capitalize(), immune_type_list)))
 
-def move_type_damage_wrapper(pokemon, type_chart, constraint_type_list=None):
+def move_damage_multipliers(moves: List[Move], pokemon: Pokemon, gen: GenData) -> List[str]:
+    # type multipliers of moves on pokemon, formatted for prompts (4, 2, 1, 0.5, 0.25, 0)
+    multipliers = gen.damage_multipliers([move.type for move in moves], [(pokemon.type_1, pokemon.type_2)])[:, 0]
+    return [f'{multiplier:g}' for multiplier in multipliers]
+
+def move_type_damage_wrapper(pokemon, gen: GenData, constraint_type_list=None):
 
     type_1 = None
     type_2 = None
@@ -81,7 +69,7 @@ def move_type_damage_wrapper(pokemon, type_chart, constraint_type_list=None):
 
     move_type_damage_prompt = ""
     extreme_effective_type_list, effective_type_list, resistant_type_list, extreme_resistant_type_list, immune_type_list = calculate_move_type_damage_multipier(
-        type_1, type_2, type_chart, constraint_type_list)
+        type_1, type_2, gen, constraint_type_list)
 
     move_type_damage_prompt = ""
     if extreme_effective_type_list:
@@ -106,6 +94,54 @@ def move_type_damage_wrapper(pokemon, type_chart, constraint_type_list=None):
 
     return move_type_damage_prompt
 
+def _mon_key(mon: Pokemon, hp_buckets: int, active: bool):
+    hp = int(round(mon.current_hp_fraction * hp_buckets))
+    status = mon.status.name if mon.status is not None else None
+    if not active:
+        # boosts and volatile states do not survive a switch
+        return (mon.species, hp, status)
+    boosts = tuple(sorted((stat, boost) for stat, boost in mon.boosts.items() if boost != 0))
+    return (mon.species, hp, status, boosts, mon.terastallized)
+
+def _side_key(team: Dict[str, Pokemon], active: Pokemon, side_conditions: Dict, hp_buckets: int):
+    bench = tuple(sorted(_mon_key(mon, hp_buckets, False) for mon in team.values() if mon is not active))
+    conditions = tuple(sorted(
+        # values are layers for stackable conditions, start turns otherwise
+        (condition.name, count if condition in STACKABLE_CONDITIONS else 1)
+        for condition, count in side_conditions.items()
+    ))
+    active_key = _mon_key(active, hp_buckets, True) if active is not None else None
+    return (active_key, bench, conditions)
+
+def battle_state_key(battle: Battle, hp_buckets: int=20) -> tuple:
+    """Returns a canonical, hashable key of the state of a battle: active pokemons,
+    hp rounded to hp_buckets buckets, boosts, status, side conditions, weather,
+    fields and the player's options. Battles reached through different action
+    sequences but in the same state have the same key; the turn number is not part
+    of it, so that states recur across turns.
+
+    :param battle: The battle.
+    :type battle: Battle
+    :param hp_buckets: Number of hp buckets, e.g. 20 for 5% steps.
+    :type hp_buckets: int
+    :return: The key.
+    :rtype: tuple
+    """
+    options = (
+        tuple(move.id for move in battle.available_moves),
+        tuple(mon.species for mon in battle.available_switches),
+        battle.can_tera is not None,
+        battle.opponent_can_tera,
+    )
+    return (
+        _side_key(battle.team, battle.active_pokemon, battle.side_conditions, hp_buckets),
+        _side_key(battle.opponent_team, battle.opponent_active_pokemon, battle.opponent_side_conditions, hp_buckets),
+        tuple(sorted(weather.name for weather in battle.weather)),
+        tuple(sorted(field.name for field in battle.fields)),
+        options,
+        battle._finished,
+    )
+
 class LocalSim():
     def __init__(self, 
                  battle: Battle,
@@ -142,10 +178,25 @@ class LocalSim():
         self.HP_FRACTION_COEFICIENT = 0.4
         
         if self.format == 'gen9ou':
-            file = f'poke_env/data/static/gen9/ou/sets_1000.json'
-            with open(file, 'r') as f:
-                self.moves_set = orjson.loads(f.read())
+            self.moves_set = GenData.from_gen(9).usage_sets(1000)
+
 
+    def fork(self) -> "LocalSim":
+        """Returns a simulation branching from the current state. The static tables
+        are shared and the battle is a copy-on-write snapshot, so stepping the fork
+        leaves this simulation untouched.
+
+        :return: The forked simulation.
+        :rtype: LocalSim
+        """
+        sim = copy(self)
+        sim.battle = self.battle.snapshot()
+        sim.switch_set = set(self.switch_set)
+        return sim
+
+    def state_key(self, hp_buckets: int=20) -> tuple:
+        """Returns the canonical key of the simulated state, see battle_state_key."""
+        return battle_state_key(self.battle, hp_buckets)
 
     def get_llm_system_prompt(self, _format: str, llm: GPTPlayer | LLAMAPlayer = None, team_str: str=None, model: str='gpt-4o'):
         # sleep to make sure server has sent pokemon team information first
@@ -244,7 +295,7 @@ class LocalSim():
             if self.battle.active_pokemon.type_2:
                 active_type = active_type + " and " + self.battle.active_pokemon.type_2.name.capitalize()
 
-        active_move_type_damage_prompt = move_type_damage_wrapper(self.battle.active_pokemon, self.gen.type_chart, opponent_type_list)
+        active_move_type_damage_prompt = move_type_damage_wrapper(self.battle.active_pokemon, self.gen, opponent_type_list)
         speed_active_stats = active_stats['spe']
         if speed_active_stats == None: speed_active_stats = 0
         active_speed = round(speed_active_stats*self.boost_multiplier('spe', active_boosts['spe']))
@@ -280,20 +331,7 @@ class LocalSim():
         )
         # moves + history
         n_turn = 5
-        if "p1" in list(self.battle.team.keys())[0]:
-            context_prompt = (f"Historical turns:\n" + "\n".join(
-                self.battle.battle_msg_history.split("[sep]")[-1 * (n_turn + 1):]).
-                                          replace("p1a: ", "player:").
-                                          replace("p2a:","opponent:").
-                                          replace("Player1", "Player").
-                                          replace("Player2", "Opponent"))
-        else:
-            context_prompt = (f"Historical turns:\n" + "\n".join(
-                self.battle.battle_msg_history.split("[sep]")[-1 * (n_turn + 1):]).
-                                          replace("p1a: ", "player:").
-                                          replace("p2a:","opponent:").
-                                          replace("Player1", "Player").
-                                          replace("Player2", "Opponent"))
+        context_prompt = "Historical turns:\n" + self.battle.turn_history.render(n_turn, NEUTRAL_PERSPECTIVE)
         move_prompt = f'Player used {action1}.\nOpponent used {action2}.\n'
         # json response 
         json_action = 'Output the remaining player and opponent pokemon health remaining after their actions\'. \
@@ -616,19 +654,10 @@ class LocalSim():
                         n_turn: int=5
                         ) -> str:
         if "p1" in list(battle.team.keys())[0]:
-            context_prompt = (f"Historical turns:\n" + "\n".join(
-                battle.battle_msg_history.split("[sep]")[-1 * (n_turn + 1):]).
-                                            replace("p1a: ", "").
-                                            replace("p2a:","opposing").
-                                            replace("Player1", "You").
-                                            replace("Player2", "Opponent"))
+            perspective = PLAYER1_PERSPECTIVE
         else:
-            context_prompt = (f"Historical turns:\n" + "\n".join(
-                battle.battle_msg_history.split("[sep]")[-1 * (n_turn + 1):]).
-                                replace("p2a: ", "").
-                                replace("p1a:", "opposing").
-                                replace("Player2", "You").
-                                replace("Player1", "Opponent"))
+            perspective = PLAYER2_PERSPECTIVE
+        context_prompt = "Historical turns:\n" + battle.turn_history.render(n_turn, perspective)
         
         battle_prompt = context_prompt + " Current battle state:\n"
         return battle_prompt
@@ -742,21 +771,18 @@ class LocalSim():
         if battle.can_tera and self._tera_disable is False:
             # return True
 
-            # matchup adv and full hp on full hp
-            battle.active_pokemon.terastallize()
+            # matchup adv and full hp on full hp, on a copy: the active pokemon may
+            # be shared with other battle snapshots
             if (
                 self._estimate_matchup(
-                    battle.active_pokemon, battle.opponent_active_pokemon
+                    battle.active_pokemon.terastallized_copy(), battle.opponent_active_pokemon
                 )
                 > 0
                 and battle.active_pokemon.current_hp_fraction == 1
                 and battle.opponent_active_pokemon.current_hp_fraction == 1
             ):
-                battle.active_pokemon.unterastallize()
                 return True
 
-            battle.active_pokemon.unterastallize()
-
         return False
     
     
@@ -945,6 +971,17 @@ class LocalSim():
             return hp1, hp2, m1_success, m2_success, turns_to_faint
         return hp1, hp2, m1_success, m2_success
 
+    def calculate_damage_batch(self,
+                               attackers: List[Pokemon],
+                               moves: List[List[Move]],
+                               defenders: List[Pokemon],
+                               attacker_boosts: List[Dict[str, int]]=None,
+                               defender_boosts: List[Dict[str, int]]=None,
+                               team=None,
+                               ) -> DamageBatch:
+        # vectorized calc_base_dmg + modify_damage over attackers x moves x defenders
+        return calculate_damage_batch(self, attackers, moves, defenders, attacker_boosts, defender_boosts, team)
+
     def modify_base_power(self, mon: Pokemon, target: Pokemon, move: Move, team=None) -> float:
         power = move.base_power
         # weight based modifiers based on difference in health
@@ -1265,6 +1302,32 @@ class LocalSim():
         baseDamage += (((2*level) / 5. + 2) * power * A / D) / 50. + 2
         return baseDamage
 
+    def target_damage_modifier(self, target: Pokemon, move_type, type_multiplier: float) -> float:
+        # damage modifier from the target's item and ability
+        modifier = 1.
+        # print(target.species, target.item, move_type)
+        # check for item immunity
+        if target.item is not None:
+            if target.item.lower() == 'airballoon':
+                # print(target.species, target.item)
+                if move_type == 'ground':
+                    modifier *= 0
+        # @TODO: check for ability immunity, such as sound moves, bullet moves etc. https://pokemondb.net/pokebase/188704/what-are-all-the-abilities-that-grant-immunities
+        # @TODO: add healing for absorbs
+        if target.ability == 'voltabsorb' and move_type == 'electric':
+            modifier *= 0
+        if (target.ability == 'waterabsorb' or target.ability == 'dryskin') and move_type == 'water':
+            modifier *= 0
+        if target.ability == 'levitate' and move_type == 'ground':
+            modifier *= 0
+        if target.ability == 'flashfire' and move_type == 'fire':
+            modifier *= 0
+        if target.ability == 'dryskin' and move_type == 'fire':
+            modifier *= 1.25
+        if target.ability == 'wonderguard' and type_multiplier <= 1:
+            modifier *= 0
+        return modifier
+
     def modify_damage(self, baseDamage: float, pokemon: Pokemon, target: Pokemon, move: Move, target_move: Move, use_expected: bool=True) -> float:
         if (not move.type):
             move.type = '???'
@@ -1328,63 +1391,9 @@ class LocalSim():
         
 
         # types
-        opponent_type_list = []
-        if target.terastallized:
-            opponent_type_list.append(target._terastallized_type)
-        else:
-            if target.type_1:
-                type_1 = target.type_1.name
-                opponent_type_list.append(type_1)
-
-                if target.type_2:
-                    type_2 = target.type_2.name
-                    opponent_type_list.append(type_2)
-        # print('typing', type_1, type_2)
-        extreme_effective_type_list, effective_type_list, resistant_type_list, extreme_resistant_type_list, immune_type_list = calculate_move_type_damage_multipier(
-                                    type_1, type_2, self.gen.type_chart, [type.name])
-        # print(extreme_effective_type_list, effective_type_list, resistant_type_list, extreme_resistant_type_list, immune_type_list)
-
-        if extreme_effective_type_list: # extremely-effective (4x damage)
-            # print('double super effective')
-            baseDamage *= 4
-
-        elif effective_type_list:   # super-effective (2x damage)
-            # print('super effective')
-            baseDamage *= 2
-
-        elif resistant_type_list:   # ineffective (0.5x damage)
-            # print('ineffective')
-            baseDamage *= 0.5
-
-        elif extreme_resistant_type_list:   # highly ineffective (0.25x damage)
-            # print('highly ineffective')
-            baseDamage *= 0.25
-
-        elif immune_type_list:  # zero effect (0x damage)
-            # print('immune')
-            baseDamage *= 0
-        # print(pokemon.species, pokemon.item, target.item, type)
-        # check for item immunity
-        if target.item is not None:
-            if target.item.lower() == 'airballoon':
-                # print(target.species, target.item)
-                if type == 'ground':
-                    baseDamage *= 0
-        # @TODO: check for ability immunity, such as sound moves, bullet moves etc. https://pokemondb.net/pokebase/188704/what-are-all-the-abilities-that-grant-immunities
-        # @TODO: add healing for absorbs
-        if target.ability == 'voltabsorb' and move.type == 'electric':
-            baseDamage *= 0
-        if (target.ability == 'waterabsorb' or target.ability == 'dryskin') and move.type == 'water':
-            baseDamage *= 0
-        if target.ability == 'levitate' and move.type == 'ground':
-            baseDamage *= 0
-        if target.ability == 'flashfire' and move.type == 'fire':
-            baseDamage *= 0
-        if target.ability == 'dryskin' and move.type == 'fire':
-            baseDamage *= 1.25
-        if target.ability == 'wonderguard' and not (extreme_effective_type_list or effective_type_list):
-            baseDamage *= 0
-        
+        type_multiplier = self.gen.damage_multipliers([type], [(target.type_1, target.type_2)])[0, 0]
+        baseDamage *= type_multiplier
+        baseDamage *= self.target_damage_modifier(target, type, type_multiplier)
 
         # print(f'type {baseDamage}')
 
@@ -1416,6 +1425,11 @@ class LocalSim():
         # ...but 16-bit truncation happens even later, and can truncate to 0
         return int(baseDamage) * move.expected_hits
 
+    def _log_hp(self, pokemon: str, hp_status: str):
+        # hp logs may be shared with snapshots of the battle: never append in place
+        log = self.battle.pokemon_hp_log_dict
+        log[pokemon] = log.get(pokemon, []) + [hp_status]
+
     def _handle_battle_message(self, split_message: List[str]):
         """Handles a battle message.
 
@@ -1427,10 +1441,7 @@ class LocalSim():
         if split_message[1] == "switch":
             # update hp information
             self.switch_set.add(split_message[2])
-            try:
-                battle.pokemon_hp_log_dict[split_message[2]].append(split_message[4])
-            except:
-                battle.pokemon_hp_log_dict[split_message[2]] = [split_message[4]]
+            self._log_hp(split_message[2], split_message[4])
 
             description = " " + split_message[2].split(" ")[0] + " sent out " + split_message[2].split(": ")[-1] + "."
             description = description.replace("p2a:", "Player2").replace("p1a:", "Player1")
@@ -1439,10 +1450,7 @@ class LocalSim():
                 description = f" {battle.speed_list[0]} outspeeded {battle.speed_list[1]} in this turn."
             description += "[sep]Turn " + split_message[2] + ":"
         elif split_message[1] == "drag":
-            try:
-                battle.pokemon_hp_log_dict[split_message[2]].append(split_message[4])
-            except:
-                battle.pokemon_hp_log_dict[split_message[2]] = [split_message[4]]
+            self._log_hp(split_message[2], split_message[4])
 
             description = " " + split_message[2] + "was dragged out."
 
@@ -1512,10 +1520,7 @@ class LocalSim():
                 description = f" {split_message[2]} restored {delta_hp_fraction}% of HP ({current_hp_fraction}% left) {split_message[4]}."
             else:
                 description = f" {split_message[2]} restored {delta_hp_fraction}% of HP ({current_hp_fraction}% left)."
-            try:
-                battle.pokemon_hp_log_dict[split_message[2]].append(split_message[3])
-            except:
-                battle.pokemon_hp_log_dict[split_message[2]] = [split_message[3]]
+            self._log_hp(split_message[2], split_message[3])
 
         elif split_message[1] == "-damage":
             try:
@@ -1528,10 +1533,7 @@ class LocalSim():
             else:
                 previous_hp_fraction = round(float(previous_hp.split("/")[0]) / float(previous_hp.split("/")[1]) * 100)
 
-            try:
-                battle.pokemon_hp_log_dict[split_message[2]].append(split_message[3])
-            except:
-                battle.pokemon_hp_log_dict[split_message[2]] = [split_message[3]]
+            self._log_hp(split_message[2], split_message[3])
 
             current_hp = split_message[3].split(" ")[0]
             if current_hp == "0":
@@ -1579,7 +1581,7 @@ class LocalSim():
         # else:
         #     print('unhandled description msg', split_message)
         if description:
-            battle.battle_msg_history = battle.battle_msg_history + description
+            battle.turn_history.append(description)
             # print(description)
 
         self.battle.parse_message(split_message)
@@ -1622,4 +1624,16 @@ class SimNode():
         self.parent_action = None
         self.hp_diff = 0
         self.rationale: str = ""
-        self.children: List[SimNode] = []
\ No newline at end of file
+        self.children: List[SimNode] = []
+
+    def fork(self) -> "SimNode":
+        """Returns a copy of this node whose simulation branches from this node's
+        state (see LocalSim.fork). Children are not copied.
+
+        :return: The forked node.
+        :rtype: SimNode
+        """
+        node = copy(self)
+        node.simulation = self.simulation.fork()
+        node.children = []
+        return node
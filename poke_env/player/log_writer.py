@@ -0,0 +1,220 @@
+"""Buffered, append-only JSONL logs of battles, written by one background thread.
+
+Players append one record per event to the log file of a battle and return
+without touching the disk. Files stay open until the battle finishes, when they
+are closed, optionally fsynced, and renamed to their final name, e.g. with the
+outcome of the battle. Records appended to a finished file, e.g. by a search
+still running when its battle ended, are dropped. compact_score_log turns a minimax score log back into the
+score_evaluation JSON layout.
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+from typing import IO, Any, Dict, Optional
+
+import orjson
+
+FSYNC_POLICIES = ("never", "finish", "flush")
+
+
+def _default(obj: Any) -> Any:
+    return str(obj)
+
+
+def dumps_record(record: Dict[str, Any]) -> bytes:
+    return orjson.dumps(record, default=_default, option=orjson.OPT_SERIALIZE_NUMPY) + b"\n"
+
+
+class LogWriter():
+    """Appends JSON records to JSONL files from a background thread.
+
+    :param flush_interval: Seconds between flushes of the open files to the OS.
+    :param fsync: When the files are fsynced: "never", when a file is finished
+        ("finish"), or at every flush ("flush").
+    :param max_open_files: Maximum number of files kept open, the least recently
+        written ones are closed first and reopened on their next record.
+    :param max_finished_files: Maximum number of finished files remembered, to
+        drop the records appended to them.
+    :param logger: Logger the write errors are reported to. They never reach the
+        players.
+    """
+
+    def __init__(self,
+                 flush_interval: float=1.,
+                 fsync: str="finish",
+                 max_open_files: int=256,
+                 max_finished_files: int=4096,
+                 logger: Optional[logging.Logger]=None,
+                 ):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"fsync must be one of {FSYNC_POLICIES}, got {fsync}")
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.max_open_files = max_open_files
+        self.max_finished_files = max_finished_files
+        self.logger = logging.getLogger("LogWriter") if logger is None else logger
+        self.records_written = 0
+        self.records_dropped = 0
+        self._queue: "queue.Queue[tuple]" = queue.Queue()
+        self._files: "OrderedDict[str, IO[bytes]]" = OrderedDict()
+        self._finished: "OrderedDict[str, None]" = OrderedDict()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def append(self, path: str, record: Dict[str, Any]):
+        """Queues record to be appended to the JSONL file at path. The record is
+        serialized right away, later changes to it are not logged."""
+        self._start()
+        self._queue.put(("append", path, dumps_record(record)))
+
+    def finish(self, path: str, final_path: Optional[str]=None):
+        """Closes the file at path once its queued records are written, and renames
+        it to final_path if given."""
+        self._start()
+        self._queue.put(("finish", path, final_path))
+
+    def flush(self, timeout: Optional[float]=None) -> bool:
+        """Waits until the records queued so far are written to the OS.
+
+        :return: Whether they were before the timeout.
+        :rtype: bool
+        """
+        if self._thread is None:
+            return True
+        done = threading.Event()
+        self._queue.put(("flush", None, done))
+        return done.wait(timeout)
+
+    def close(self):
+        """Writes the queued records, closes every file and stops the thread."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        self._queue.put(("close", None, None))
+        thread.join()
+
+    def _start(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+                self._thread.start()
+                atexit.register(self.close)
+
+    def _run(self):
+        next_flush = time.monotonic() + self.flush_interval
+        while True:
+            try:
+                op, path, arg = self._queue.get(timeout=max(next_flush - time.monotonic(), 0.))
+            except queue.Empty:
+                op, path, arg = "tick", None, None
+            try:
+                if op == "append":
+                    if path in self._finished:
+                        self.records_dropped += 1
+                        self.logger.debug("Dropped a record appended to finished %s", path)
+                    else:
+                        self._file(path).write(arg)
+                        self.records_written += 1
+                elif op == "finish":
+                    self._finished[path] = None
+                    while len(self._finished) > self.max_finished_files:
+                        self._finished.popitem(last=False)
+                    self._finish(path, arg)
+                elif op == "flush":
+                    self._flush_all()
+                    arg.set()
+                elif op == "close":
+                    for path in list(self._files):
+                        self._finish(path, None)
+                    return
+            except OSError as e:
+                self.logger.error("Writing %s failed: %s", path, e)
+            if time.monotonic() >= next_flush:
+                self._flush_all()
+                next_flush = time.monotonic() + self.flush_interval
+
+    def _file(self, path: str) -> IO[bytes]:
+        f = self._files.get(path)
+        if f is not None:
+            self._files.move_to_end(path)
+            return f
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        f = self._files[path] = open(path, "ab")
+        while len(self._files) > self.max_open_files:
+            _, oldest = self._files.popitem(last=False)
+            oldest.close()
+        return f
+
+    def _flush_all(self):
+        for path, f in self._files.items():
+            try:
+                f.flush()
+                if self.fsync == "flush":
+                    os.fsync(f.fileno())
+            except OSError as e:
+                self.logger.error("Flushing %s failed: %s", path, e)
+
+    def _finish(self, path: str, final_path: Optional[str]):
+        f = self._files.pop(path, None)
+        if f is not None:
+            f.flush()
+            if self.fsync != "never":
+                os.fsync(f.fileno())
+            f.close()
+        if final_path is not None and final_path != path and os.path.exists(path):
+            os.replace(path, final_path)
+
+
+_default_writer: Optional[LogWriter] = None
+_default_writer_lock = threading.Lock()
+
+
+def get_log_writer() -> LogWriter:
+    """Returns the LogWriter shared by the players of the process."""
+    global _default_writer
+    with _default_writer_lock:
+        if _default_writer is None:
+            _default_writer = LogWriter()
+        return _default_writer
+
+
+def read_log(path: str):
+    """Yields the records of a JSONL log. A partially written last line, left by a
+    killed process, is ignored."""
+    with open(path, "rb") as f:
+        for line in f:
+            try:
+                yield orjson.loads(line)
+            except orjson.JSONDecodeError:
+                continue
+
+
+def compact_score_log(path: str, out_path: Optional[str]=None) -> str:
+    """Writes the score_evaluation JSON of a minimax score log, one entry per
+    battle and turn, the last record of a turn winning.
+
+    :param path: The JSONL score log.
+    :type path: str
+    :param out_path: The JSON file to write, path with a .json extension if None.
+    :type out_path: str, optional
+    :return: The path of the JSON file.
+    :rtype: str
+    """
+    if out_path is None:
+        out_path = os.path.splitext(path)[0] + ".json"
+    data: Dict[str, Dict[str, Any]] = {}
+    for record in read_log(path):
+        data.setdefault(record["battle"], {})[f"Turn {record['turn']}"] = record["entry"]
+    with open(out_path, "w") as f:
+        json.dump(data, f, indent=4)
+    return out_path
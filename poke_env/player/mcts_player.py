@@ -0,0 +1,485 @@
+"""Monte-Carlo tree search player, using LocalSim.step as the transition model.
+
+Both sides choose their action at every node of the tree (decoupled UCT, turns
+being simultaneous), and new nodes are valued by rollouts played out on damage
+grids computed once per search, following the max damage and matchup heuristics
+of the baseline players. An LLM can additionally suggest an action at root, which
+biases the player's selection towards it.
+"""
+import math
+import random
+import time
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+import numpy as np
+
+from poke_env.environment.abstract_battle import AbstractBattle
+from poke_env.environment.double_battle import DoubleBattle
+from poke_env.environment.move import Move
+from poke_env.environment.pokemon import Pokemon
+from poke_env.player.battle_order import BattleOrder
+from poke_env.player.local_simulation import LocalSim
+from poke_env.player.player import Player
+from poke_env.player.replay_context import load_static_tables
+from poke_env.data.gen_data import GenData
+
+# order of a side that does not act this turn, e.g. while the other side replaces a
+# fainted pokemon. LocalSim.step treats it as doing nothing
+PASS_ORDER = BattleOrder(None)
+
+
+class RolloutModel():
+    """Plays battles out from a simulated state with the max damage and matchup
+    heuristics, without the simulator: the damage of every move of every pokemon
+    on every opposing pokemon is computed once, with calculate_damage_batch, from
+    the state the search starts from.
+
+    Each turn, a side replaces a fainted active pokemon by its best matchup,
+    switches out of a matchup below SWITCH_OUT_MATCHUP_THRESHOLD if a pokemon with
+    a positive matchup is available, as AbyssalPlayer, and otherwise uses its
+    highest damage move. With probability epsilon it plays a random move or switch
+    instead, which makes the rollouts of a state differ.
+
+    :param sim: Simulation of the state the search starts from.
+    :param opponent_moves: Returns the moves considered for an opposing pokemon.
+    :param depth: Maximum number of turns of a rollout.
+    :param epsilon: Probability of a random action.
+    :param rng: Random number generator of the rollouts.
+    """
+
+    SWITCH_OUT_MATCHUP_THRESHOLD = -2
+    HP_FRACTION_COEFICIENT = 0.4
+
+    def __init__(self,
+                 sim: LocalSim,
+                 opponent_moves: Callable[[Pokemon], List[Move]],
+                 depth: int=10,
+                 epsilon: float=0.1,
+                 rng: Optional[random.Random]=None,
+                 ):
+        battle = sim.battle
+        self.depth = depth
+        self.epsilon = epsilon
+        self.rng = random.Random() if rng is None else rng
+        self.player_keys = list(battle.team)
+        self.opponent_keys = list(battle.opponent_team)
+        # opposing pokemons not revealed yet count as healthy and never battle
+        self.unrevealed = max(6 - len(self.opponent_keys), 0)
+        player = [battle.team[key] for key in self.player_keys]
+        opponent = [battle.opponent_team[key] for key in self.opponent_keys]
+        self.player = self._grids(sim, player, [list(mon.moves.values()) for mon in player], opponent, battle.team)
+        self.opponent = self._grids(sim, opponent, [opponent_moves(mon) for mon in opponent], player, battle.opponent_team)
+
+    def _grids(self, sim: LocalSim, attackers: List[Pokemon], moves: List[List[Move]], defenders: List[Pokemon], team) -> Dict[str, Any]:
+        """Damage, as a fraction of the defender's hp, order and matchup of every
+        attacker against every defender, as nested lists for fast indexing."""
+        n_moves = [len(mon_moves) for mon_moves in moves]
+        if len(attackers) == 0 or len(defenders) == 0 or max(n_moves) == 0:
+            damage = np.zeros((len(attackers), 1, len(defenders)))
+            moves_first = np.zeros(damage.shape, dtype=bool)
+        else:
+            batch = sim.calculate_damage_batch(attackers, moves, defenders, team=team)
+            hp_total = np.array([max(mon.calculate_stats(battle_format=sim.format)['hp'], 1) for mon in defenders])
+            damage = batch.damage / hp_total[None, None, :]
+            moves_first = batch.moves_first
+        best = damage.argmax(axis=1)
+        matchup = np.zeros((len(attackers), len(defenders)))
+        for i, mon in enumerate(attackers):
+            for j, mon_opp in enumerate(defenders):
+                try:
+                    # without the hp terms, added back from the rollout's hp
+                    matchup[i, j] = sim._estimate_matchup(mon, mon_opp) - self.HP_FRACTION_COEFICIENT * (
+                        mon.current_hp_fraction - mon_opp.current_hp_fraction)
+                except Exception:
+                    matchup[i, j] = 0.
+        return {
+            'n_moves': [max(n, 1) for n in n_moves],
+            'damage': damage.tolist(),
+            'moves_first': moves_first.tolist(),
+            'best': best.tolist(),
+            'matchup': matchup.tolist(),
+        }
+
+    def _matchup(self, side: Dict, hp: List[float], hp_opp: List[float], i: int, j: int) -> float:
+        return side['matchup'][i][j] + self.HP_FRACTION_COEFICIENT * (hp[i] - hp_opp[j])
+
+    def _best_switch(self, side: Dict, hp: List[float], hp_opp: List[float], active: int, active_opp: int) -> int:
+        best, best_score = -1, -math.inf
+        for i in range(len(hp)):
+            if i == active or hp[i] <= 0:
+                continue
+            score = self._matchup(side, hp, hp_opp, i, active_opp)
+            if score > best_score:
+                best, best_score = i, score
+        return best
+
+    def _choose(self, side: Dict, hp: List[float], hp_opp: List[float], active: int, active_opp: int):
+        """Returns (switch target, move) of a side, one of them being -1."""
+        if self.rng.random() < self.epsilon:
+            switches = [i for i in range(len(hp)) if i != active and hp[i] > 0]
+            n_moves = side['n_moves'][active]
+            choice = self.rng.randrange(n_moves + len(switches))
+            if choice < n_moves:
+                return -1, choice
+            return switches[choice - n_moves], -1
+        if self._matchup(side, hp, hp_opp, active, active_opp) < self.SWITCH_OUT_MATCHUP_THRESHOLD:
+            switch = self._best_switch(side, hp, hp_opp, active, active_opp)
+            if switch >= 0 and self._matchup(side, hp, hp_opp, switch, active_opp) > 0:
+                return switch, -1
+        return -1, side['best'][active][active_opp]
+
+    def value(self, hp: List[float], hp_opp: List[float]) -> float:
+        """Value of a state for the player, in [0, 1]: 0 when the player lost, 1 when
+        the opponent lost, and otherwise 0.5 shifted by the hp difference."""
+        if all(h <= 0 for h in hp):
+            return 0.
+        if self.unrevealed == 0 and all(h <= 0 for h in hp_opp):
+            return 1.
+        return 0.5 + (sum(hp) - sum(hp_opp) - self.unrevealed) / 12.
+
+    def _actives(self, battle: AbstractBattle):
+        active = next((i for i, key in enumerate(self.player_keys) if battle.team[key].active), 0)
+        active_opp = next((j for j, key in enumerate(self.opponent_keys) if battle.opponent_team[key].active), 0)
+        return active, active_opp
+
+    def damage_prior(self, battle: AbstractBattle, actions: List[BattleOrder]) -> Optional[List[float]]:
+        """Damage of the player's moves on the opposing active pokemon, normalized,
+        and 0 for switches. None if no move deals damage."""
+        active, active_opp = self._actives(battle)
+        move_ids = list(battle.team[self.player_keys[active]].moves)
+        damage = []
+        for action in actions:
+            if isinstance(action.order, Move) and action.order.id in move_ids:
+                damage.append(self.player['damage'][active][move_ids.index(action.order.id)][active_opp])
+            else:
+                damage.append(0.)
+        total = sum(damage)
+        return [d / total for d in damage] if total > 0 else None
+
+    def rollout(self, battle: AbstractBattle) -> float:
+        """Plays the battle out for up to depth turns and returns its value."""
+        hp = [max(battle.team[key].current_hp_fraction, 0.) for key in self.player_keys]
+        hp_opp = [max(battle.opponent_team[key].current_hp_fraction, 0.) for key in self.opponent_keys]
+        active, active_opp = self._actives(battle)
+        player, opponent = self.player, self.opponent
+        for _ in range(self.depth):
+            # replace fainted actives
+            if hp[active] <= 0:
+                active = self._best_switch(player, hp, hp_opp, active, active_opp)
+                if active < 0:
+                    break
+            if hp_opp[active_opp] <= 0:
+                active_opp = self._best_switch(opponent, hp_opp, hp, active_opp, active)
+                if active_opp < 0:
+                    break
+            switch, move = self._choose(player, hp, hp_opp, active, active_opp)
+            switch_opp, move_opp = self._choose(opponent, hp_opp, hp, active_opp, active)
+            # switches happen before moves
+            if switch >= 0:
+                active = switch
+            if switch_opp >= 0:
+                active_opp = switch_opp
+            if move >= 0 and move_opp >= 0:
+                first = player['moves_first'][active][move][active_opp]
+                first_opp = opponent['moves_first'][active_opp][move_opp][active]
+                player_first = first if first != first_opp else self.rng.random() < 0.5
+            else:
+                player_first = move >= 0
+            for player_moves in ((True, False) if player_first else (False, True)):
+                if player_moves and move >= 0 and hp[active] > 0:
+                    hp_opp[active_opp] = max(hp_opp[active_opp] - player['damage'][active][move][active_opp], 0.)
+                elif not player_moves and move_opp >= 0 and hp_opp[active_opp] > 0:
+                    hp[active] = max(hp[active] - opponent['damage'][active_opp][move_opp][active], 0.)
+        return self.value(hp, hp_opp)
+
+
+class MCTSNode():
+    """Node of the search tree: a simulated state, the actions of both sides and
+    their visit counts and total values, from the player's point of view."""
+
+    __slots__ = ('sim', 'player_actions', 'opponent_actions', 'prior', 'terminal',
+                 'visits', 'player_visits', 'player_values', 'opponent_visits', 'opponent_values', 'children')
+
+    def __init__(self,
+                 sim: LocalSim,
+                 player_actions: List[BattleOrder],
+                 opponent_actions: List[Optional[BattleOrder]],
+                 terminal: Optional[float]=None,
+                 prior: Optional[List[float]]=None,
+                 ):
+        self.sim = sim
+        self.player_actions = player_actions
+        self.opponent_actions = opponent_actions
+        self.terminal = terminal
+        self.prior = prior
+        self.visits = 0
+        self.player_visits = [0] * len(player_actions)
+        self.player_values = [0.] * len(player_actions)
+        self.opponent_visits = [0] * len(opponent_actions)
+        self.opponent_values = [0.] * len(opponent_actions)
+        self.children: Dict[tuple, "MCTSNode"] = {}
+
+    @staticmethod
+    def _select(visits: List[int], values: List[float], total: int, exploration: float,
+                prior: Optional[List[float]]=None, prior_weight: float=0.) -> int:
+        best, best_score = 0, -math.inf
+        log_total = math.log(max(total, 1))
+        for i, n in enumerate(visits):
+            if n == 0:
+                # unvisited actions first, the most likely according to the prior
+                score = math.inf if prior is None else 1e9 + prior[i]
+            else:
+                score = values[i] / n + exploration * math.sqrt(log_total / n)
+                if prior is not None:
+                    # progressive bias, fading as the action gets visited
+                    score += prior_weight * prior[i] / (n + 1)
+            if score > best_score:
+                best, best_score = i, score
+        return best
+
+    def select(self, exploration: float, prior_weight: float=0.):
+        """Returns the (player action, opponent action) indices to try next, each
+        side maximizing its own UCB1 score."""
+        i = self._select(self.player_visits, self.player_values, self.visits, exploration, self.prior, prior_weight)
+        j = self._select(self.opponent_visits, self.opponent_values, self.visits, exploration)
+        return i, j
+
+    def update(self, i: int, j: int, value: float):
+        self.visits += 1
+        self.player_visits[i] += 1
+        self.player_values[i] += value
+        self.opponent_visits[j] += 1
+        self.opponent_values[j] += 1. - value
+
+
+class MCTSResult(NamedTuple):
+    action: BattleOrder
+    value: float
+    visits: Dict[str, int]
+    simulations: int
+    elapsed: float
+
+    @property
+    def simulations_per_second(self) -> float:
+        return self.simulations / self.elapsed if self.elapsed > 0 else 0.
+
+
+class MonteCarloTreeSearch():
+    """UCT search over LocalSim. Each simulation descends the tree, both sides
+    selecting by UCB1, simulates the selected actions with LocalSim.step into a new
+    node, values it by a rollout of RolloutModel and backs the value up.
+
+    :param exploration: UCB1 exploration constant. Values mostly stay close to
+        0.5, the hp lost in a few turns being small compared to a whole team, hence
+        a low default.
+    :param rollout_depth: Maximum number of turns of a rollout.
+    :param rollout_epsilon: Probability of a random action in rollouts.
+    :param prior_weight: Weight of the root prior, see MCTSNode.select.
+    :param seed: Seed of the rollouts.
+    """
+
+    def __init__(self,
+                 exploration: float=0.5,
+                 rollout_depth: int=10,
+                 rollout_epsilon: float=0.1,
+                 prior_weight: float=1.,
+                 seed: Optional[int]=None,
+                 ):
+        self.exploration = exploration
+        self.rollout_depth = rollout_depth
+        self.rollout_epsilon = rollout_epsilon
+        self.prior_weight = prior_weight
+        self.rng = random.Random(seed)
+        self._opponent_moves: Dict[str, List[Move]] = {}
+
+    def opponent_moves(self, sim: LocalSim, mon: Pokemon) -> List[Move]:
+        """Revealed and likely moves of an opposing pokemon."""
+        if mon.species not in self._opponent_moves:
+            moves = []
+            for move_id in sim.get_opponent_current_moves(mon=mon):
+                try:
+                    moves.append(Move(move_id, gen=sim.gen.gen))
+                except Exception:
+                    continue
+            self._opponent_moves[mon.species] = moves
+        return self._opponent_moves[mon.species]
+
+    def _actions(self, sim: LocalSim):
+        """Actions of both sides in a simulated state, and the value of the state if
+        the battle is over."""
+        battle = sim.battle
+        bench = [mon for mon in battle.team.values() if not mon.active and not mon.fainted]
+        bench_opp = [mon for mon in battle.opponent_team.values() if not mon.active and not mon.fainted]
+        active, active_opp = battle.active_pokemon, battle.opponent_active_pokemon
+        player_fainted = active is None or active.fainted
+        opponent_fainted = active_opp is None or active_opp.fainted
+        if player_fainted and len(bench) == 0:
+            return [], [], 0.
+        if opponent_fainted and len(bench_opp) == 0 and len(battle.opponent_team) >= 6:
+            return [], [], 1.
+        if player_fainted or opponent_fainted:
+            # only the sides with a fainted active pokemon act, replacing it
+            player_actions = [BattleOrder(mon) for mon in bench] if player_fainted else [PASS_ORDER]
+            opponent_actions = [BattleOrder(mon) for mon in bench_opp] if opponent_fainted else [None]
+            return player_actions, opponent_actions or [None], None
+        player_actions = [BattleOrder(move) for move in active.moves.values()]
+        player_actions += [BattleOrder(mon) for mon in bench]
+        opponent_actions = [BattleOrder(move) for move in self.opponent_moves(sim, active_opp)]
+        opponent_actions += [BattleOrder(mon) for mon in bench_opp]
+        return player_actions, opponent_actions or [None], None
+
+    def _node(self, sim: LocalSim) -> MCTSNode:
+        player_actions, opponent_actions, terminal = self._actions(sim)
+        return MCTSNode(sim, player_actions, opponent_actions, terminal)
+
+    def search(self,
+               sim: LocalSim,
+               player_actions: List[BattleOrder],
+               n_simulations: int=2000,
+               time_budget: Optional[float]=None,
+               prior: Optional[Dict[str, float]]=None,
+               ) -> MCTSResult:
+        """Searches the state of sim and returns the most visited player action.
+
+        :param sim: Simulation of the current state, left untouched.
+        :type sim: LocalSim
+        :param player_actions: The player's legal actions.
+        :type player_actions: List[BattleOrder]
+        :param n_simulations: Number of simulations.
+        :type n_simulations: int
+        :param time_budget: If given, the search also stops after this many
+            seconds.
+        :type time_budget: float, optional
+        :param prior: Prior probability of player actions, keyed by order message.
+            Defaults to RolloutModel.damage_prior.
+        :type prior: Dict[str, float], optional
+        :return: The chosen action and the search statistics.
+        :rtype: MCTSResult
+        """
+        start = time.perf_counter()
+        deadline = None if time_budget is None else start + time_budget
+        # moves revealed since the last search
+        self._opponent_moves = {}
+        _, opponent_actions, _ = self._actions(sim)
+        root = MCTSNode(sim, player_actions, opponent_actions)
+        model = RolloutModel(sim, lambda mon: self.opponent_moves(sim, mon),
+                             depth=self.rollout_depth, epsilon=self.rollout_epsilon, rng=self.rng)
+        if prior is not None:
+            root.prior = [prior.get(action.message, 0.) for action in player_actions]
+        else:
+            # rollouts often can't tell actions apart, e.g. when the active pokemon
+            # faints next turn whatever it does: favour the stronger moves
+            root.prior = model.damage_prior(sim.battle, player_actions)
+        simulations = 0
+        while simulations < n_simulations and (deadline is None or time.perf_counter() < deadline):
+            self._simulate(root, model)
+            simulations += 1
+        best = int(np.argmax(root.player_visits))
+        visits = {action.message: n for action, n in zip(player_actions, root.player_visits)}
+        value = root.player_values[best] / max(root.player_visits[best], 1)
+        return MCTSResult(player_actions[best], value, visits, simulations, time.perf_counter() - start)
+
+    def _simulate(self, root: MCTSNode, model: RolloutModel):
+        node = root
+        path = []
+        while True:
+            if node.terminal is not None:
+                value = node.terminal
+                break
+            i, j = node.select(self.exploration, self.prior_weight)
+            path.append((node, i, j))
+            child = node.children.get((i, j))
+            if child is None:
+                sim = node.sim.fork()
+                sim.step(node.player_actions[i], node.opponent_actions[j])
+                child = self._node(sim)
+                node.children[(i, j)] = child
+                value = child.terminal if child.terminal is not None else model.rollout(sim.battle)
+                break
+            node = child
+        for node, i, j in path:
+            node.update(i, j, value)
+
+
+class MCTSPlayer(Player):
+    """Chooses moves by Monte-Carlo tree search, see MonteCarloTreeSearch.
+
+    :param n_simulations: Simulations per decision.
+    :param time_budget: Maximum seconds per decision, on top of n_simulations.
+    :param llm_prior: LLMPlayer asked for an action at root, which the search
+        then favours, e.g. one sharing the backend of the opposing player.
+    :param llm_prior_mass: Probability mass of the LLM's action in the root prior,
+        the rest being spread uniformly.
+    """
+
+    def __init__(self,
+                 battle_format,
+                 log_dir=None,
+                 team=None,
+                 save_replays=None,
+                 account_configuration=None,
+                 server_configuration=None,
+                 n_simulations: int=2000,
+                 time_budget: Optional[float]=None,
+                 exploration: float=0.5,
+                 rollout_depth: int=10,
+                 rollout_epsilon: float=0.1,
+                 llm_prior: Optional[Player]=None,
+                 llm_prior_mass: float=0.5,
+                 seed: Optional[int]=None,
+                 ):
+        super().__init__(battle_format=battle_format,
+                         team=team,
+                         save_replays=save_replays,
+                         account_configuration=account_configuration,
+                         server_configuration=server_configuration)
+        self.gen = GenData.from_format(battle_format)
+        self.tables = load_static_tables()
+        self.n_simulations = n_simulations
+        self.time_budget = time_budget
+        self.llm_prior = llm_prior
+        self.llm_prior_mass = llm_prior_mass
+        self.mcts = MonteCarloTreeSearch(exploration, rollout_depth, rollout_epsilon, seed=seed)
+
+    def _prior(self, sim: LocalSim, battle: AbstractBattle, actions: List[BattleOrder]) -> Optional[Dict[str, float]]:
+        if self.llm_prior is None:
+            return None
+        try:
+            system_prompt, state_prompt, constraint_prompt_cot, constraint_prompt_io, state_action_prompt = sim.get_player_prompt()
+            suggestion = self.llm_prior.io(2, system_prompt, state_prompt, constraint_prompt_cot, constraint_prompt_io, state_action_prompt, battle, sim)
+        except Exception as e:
+            self.logger.info("%s: no LLM prior (%s)", battle.battle_tag, e)
+            return None
+        prior = {action.message: (1. - self.llm_prior_mass) / len(actions) for action in actions}
+        if suggestion is not None and suggestion.message in prior:
+            prior[suggestion.message] += self.llm_prior_mass
+        return prior
+
+    def choose_move(self, battle: AbstractBattle):
+        if isinstance(battle, DoubleBattle):
+            return self.choose_random_doubles_move(battle)
+        actions = [self.create_order(move) for move in battle.available_moves]
+        actions += [self.create_order(mon) for mon in battle.available_switches]
+        if len(actions) <= 1 or battle.opponent_active_pokemon is None:
+            return actions[0] if actions else self.choose_random_move(battle)
+
+        prompt_translate = getattr(self.llm_prior, 'prompt_translate', None)
+        sim = LocalSim(battle,
+                       self.tables['move_effect'],
+                       self.tables['pokemon_move_dict'],
+                       self.tables['ability_effect'],
+                       self.tables['pokemon_ability_dict'],
+                       self.tables['item_effect'],
+                       {},
+                       self.gen,
+                       self._dynamax_disable,
+                       format=self.format,
+                       prompt_translate=prompt_translate)
+        result = self.mcts.search(sim, actions, self.n_simulations, self.time_budget,
+                                  prior=self._prior(sim, battle, actions))
+        self.logger.info(
+            "%s turn %d: %d simulations in %.2fs (%.0f/s), value %.3f, visits %s",
+            battle.battle_tag, battle.turn, result.simulations, result.elapsed,
+            result.simulations_per_second, result.value, result.visits,
+        )
+        return result.action
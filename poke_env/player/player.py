@@ -2,7 +2,6 @@
 """
 
 import asyncio
-from difflib import get_close_matches
 import random
 from abc import ABC, abstractmethod
 from asyncio import Condition, Event, Queue, Semaphore
@@ -13,7 +12,7 @@ from typing import Any, Awaitable, Dict, List, Optional, Union
 import orjson
 
 from poke_env.concurrency import create_in_poke_loop, handle_threaded_coroutines
-from poke_env.data import GenData, to_id_str
+from poke_env.data import GenData, name_index, to_id_str
 from poke_env.environment.abstract_battle import AbstractBattle
 from poke_env.environment.battle import Battle
 from poke_env.environment.double_battle import DoubleBattle
@@ -25,6 +24,7 @@ from poke_env.player.battle_order import (
     DefaultBattleOrder,
     DoubleBattleOrder,
 )
+from poke_env.player.decision_executor import DecisionExecutor
 from poke_env.ps_client import PSClient
 from poke_env.ps_client.account_configuration import (
     CONFIGURATION_FROM_PLAYER_COUNTER,
@@ -63,6 +63,7 @@ class Player(ABC):
         ping_interval: Optional[float] = 20.0,
         ping_timeout: Optional[float] = 20.0,
         team: Optional[Union[str, Teambuilder]] = None,
+        decision_executor: Optional[DecisionExecutor] = None,
     ):
         """
         :param account_configuration: Player configuration. If empty, defaults to an
@@ -104,6 +105,10 @@ class Player(ABC):
             team string, a showdown packed team string, of a ShowdownTeam object.
             Defaults to None.
         :type team: str or Teambuilder, optional
+        :param decision_executor: Pool computing synchronous choose_move decisions
+            off the event loop, so that other battles progress meanwhile. If None,
+            choose_move runs on the event loop. Defaults to None.
+        :type decision_executor: DecisionExecutor, optional
         """
         if account_configuration is None:
             account_configuration = self._create_account_configuration()
@@ -131,6 +136,8 @@ class Player(ABC):
         self._start_timer_on_battle_start: bool = start_timer_on_battle_start
 
         self._battles: Dict[str, AbstractBattle] = {}
+        self._battle_locks: Dict[str, asyncio.Lock] = {}
+        self._decision_executor = decision_executor
         self._battle_semaphore: Semaphore = create_in_poke_loop(Semaphore, 0)
 
         self._battle_start_condition: Condition = create_in_poke_loop(Condition)
@@ -162,15 +169,9 @@ class Player(ABC):
     
     def check_all_moves(self, move_str: str, species: str) -> Move:
         if self.gen.gen == 8:
-            valid_move = None
-            if move_str in self.pokemon_move_dict:
-                valid_move = move_str
-            else:
-                closest = get_close_matches(move_str, [move[0] for move in self.pokemon_move_dict[species].values()], n=1, cutoff=0.8)
-                if len(closest) > 0:
-                    valid_move = closest[0]
+            valid_move = name_index(self.gen.gen, "moves").get(move_str, within={move[0] for move in self.pokemon_move_dict[species].values()})
         else:
-            valid_move = move_str
+            valid_move = name_index(self.gen.gen, "moves").get(move_str)
         # print(f'{species} input: {move_str} vs output: {valid_move}', flush=True)
         # print(f'all {[move[0] for move in self.pokemon_move_dict[species].values()]}')
         if valid_move is None:
@@ -323,11 +324,27 @@ class Player(ABC):
                 await self._battle_start_condition.wait()
 
     async def _handle_battle_message(self, split_messages: List[List[str]]):
-        """Handles a battle message.
+        """Handles a battle message. Messages of a battle are handled one at a time
+        and in order, messages of different battles concurrently.
 
         :param split_message: The received battle message.
         :type split_message: str
         """
+        # a decision may still be computed in the decision executor: later messages
+        # of its battle must not update the battle under it
+        room = split_messages[0][0]
+        if room not in self._battle_locks:
+            self._battle_locks[room] = asyncio.Lock()
+        async with self._battle_locks[room]:
+            await self._parse_battle_message(split_messages)
+        # the battle ended: nothing else of the room will be handled
+        if any(
+            len(split_message) > 1 and split_message[1] in ("win", "tie")
+            for split_message in split_messages[1:]
+        ):
+            self._battle_locks.pop(room, None)
+
+    async def _parse_battle_message(self, split_messages: List[List[str]]):
         # Battle messages can be multiline
         if (
             len(split_messages) > 1
@@ -544,7 +561,7 @@ class Player(ABC):
                     description = " It caused " + msg[idx][2] + " " + status_dict[msg[idx][3]] + "."
 
                 if description:
-                    battle.battle_msg_history = battle.battle_msg_history + description
+                    battle.turn_history.append(description)
                     # print(description)
 
                 idx += 1
@@ -662,9 +679,7 @@ class Player(ABC):
                 return
             message = self.teampreview(battle)
         else:
-            message = self.choose_move(battle)
-            if isinstance(message, Awaitable):
-                message = await message
+            message = await self._choose_move(battle)
             if isinstance(message, str):
                 print(message)
             # print( message)
@@ -760,6 +775,18 @@ class Player(ABC):
                     break
         await self._battle_count_queue.join()
 
+    async def _choose_move(self, battle: AbstractBattle) -> BattleOrder:
+        if self._decision_executor is None:
+            message = self.choose_move(battle)
+            if isinstance(message, Awaitable):
+                message = await message
+            return message
+        return await self._decision_executor.run(battle.battle_tag, self.choose_move, battle)
+
+    @property
+    def decision_executor(self) -> Optional[DecisionExecutor]:
+        return self._decision_executor
+
     @abstractmethod
     def choose_move(
         self, battle: AbstractBattle
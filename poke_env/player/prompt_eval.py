@@ -5,6 +5,7 @@ import orjson
 import numpy as np
 from tqdm import tqdm
 
+from poke_env.data.gen_data import GenData
 from poke_env.player.baselines import MaxBasePowerPlayer, Human, OneStepPlayer, AbyssalPlayer
 from poke_env.player.depth_translate import data_battle
 from poke_env.player.llm_player import LLMPlayer
@@ -134,9 +135,7 @@ def get_loadout_str(data, mon):
 
 async def hand_benchmark(args, PNUMBER1, total=1):
     # find 1v1 mons
-    file = f'poke_env/data/static/gen9/ou/sets_1825.json'
-    with open(file, 'r') as f:
-        data = orjson.loads(f.read())
+    data = GenData.from_gen(9).usage_sets(1825)
     available_mons = list(data.keys())
     total_mons = len(available_mons)
     
@@ -240,9 +239,7 @@ async def one_vs_one(args, PNUMBER1, total=1, compare_bots=False):
     1v1 Eval
     '''
     # find 1v1 mons
-    file = f'poke_env/data/static/gen9/ou/sets_1825.json'
-    with open(file, 'r') as f:
-        data = orjson.loads(f.read())
+    data = GenData.from_gen(9).usage_sets(1825)
     available_mons = list(data.keys())
     total_mons = len(available_mons)
     for i in range(total_mons):
@@ -1,31 +1,23 @@
 
-from typing import Dict
+from typing import Dict, List, Tuple
 import numpy as np
 from poke_env.environment.battle import Battle
 from poke_env.environment.move import Move
 from poke_env.environment.move_category import MoveCategory
 from poke_env.environment.pokemon import Pokemon
 from poke_env.environment.side_condition import SideCondition
-from poke_env.player.local_simulation import LocalSim, move_type_damage_wrapper
+from poke_env.environment.turn_history import PLAYER1_PERSPECTIVE, PLAYER2_PERSPECTIVE
+from poke_env.player.local_simulation import LocalSim, move_damage_multipliers, move_type_damage_wrapper
 
 def get_turn_summary(sim: LocalSim,
                      battle: Battle,
                      n_turn: int=5
                      ) -> str:
     if "p1" in list(battle.team.keys())[0]:
-        context_prompt = (f"Historical turns:\n" + "\n".join(
-            battle.battle_msg_history.split("[sep]")[-1 * (n_turn + 1):]).
-                                        replace("p1a: ", "").
-                                        replace("p2a:","opposing").
-                                        replace("Player1", "You").
-                                        replace("Player2", "Opponent"))
+        perspective = PLAYER1_PERSPECTIVE
     else:
-        context_prompt = (f"Historical turns:\n" + "\n".join(
-            battle.battle_msg_history.split("[sep]")[-1 * (n_turn + 1):]).
-                            replace("p2a: ", "").
-                            replace("p1a:", "opposing").
-                            replace("Player2", "You").
-                            replace("Player1", "Opponent"))
+        perspective = PLAYER2_PERSPECTIVE
+    context_prompt = "Historical turns:\n" + battle.turn_history.render(n_turn, perspective)
     
     battle_prompt = context_prompt + " Current battle state:\n"
     return battle_prompt
@@ -167,6 +159,22 @@ def get_number_turns_faint(mon: Pokemon,
         return turns, hp_remaining
     return turns
 
+def get_number_turns_faint_batch(mon: Pokemon,
+                                 moves: List[Move],
+                                 mon_opp: Pokemon,
+                                 sim: LocalSim,
+                                 boosts1: Dict[str, int]=None,
+                                 boosts2: Dict[str, int]=None,
+                                 ) -> Tuple[List[int], List[int]]:
+    # get_number_turns_faint (with return_hp) of several moves in one damage calc batch
+    batch = sim.calculate_damage_batch([mon], [moves], [mon_opp],
+                                       None if boosts1 is None else [boosts1],
+                                       None if boosts2 is None else [boosts2],
+                                       team=sim.battle.team)
+    turns = [int(np.ceil(t)) for t in batch.turns_to_faint[0, :len(moves), 0]]
+    hp_remaining = [int(hp) for hp in batch.remaining_hp[0, :len(moves), 0]]
+    return turns, hp_remaining
+
 def get_status_num_turns_fnt(mon: Pokemon,
                              move: Move,
                              mon_opp: Pokemon,
@@ -327,50 +335,47 @@ def get_move_prompt(mon: Pokemon,
     if sim.battle._data.gen == 9 and sim.battle.can_tera:
 
         if not mon_opp.terastallized:
+            # tera'd copies: the pokemons may be shared with other battle snapshots
+            mon_opp_tera = mon_opp.terastallized_copy()
+            mon_tera = mon.terastallized_copy()
 
             # untera'd mon vs tera'd opp
             move_prompt += f"{mon.species}\'s moves if opponent\'s {mon_opp.species} uses \'terastallize\':\n"
-            mon_opp.terastallize()
             for move_id in moves:
                 if 'nothing' == move_id:
                     continue
                 move = Move(move_id, gen=sim.gen.gen)
-                prompt_new, _ = call_dmg_calc(mon, mon_opp, move)
+                prompt_new, _ = call_dmg_calc(mon, mon_opp_tera, move)
                 move_prompt += prompt_new
 
             # tera'd mon vs tera'd opp
             move_prompt += f"{mon.species}\'s moves if it uses \'terastallize\' and opponent\'s {mon_opp.species} uses \'terastallize\':\n"
-            mon.terastallize()
             for move_id in moves:
                 if 'nothing' == move_id:
                     continue
                 move = Move(move_id, gen=sim.gen.gen)
-                prompt_new, _ = call_dmg_calc(mon, mon_opp, move)
+                prompt_new, _ = call_dmg_calc(mon_tera, mon_opp_tera, move)
                 move_prompt += prompt_new
 
             # tera'd mon vs untera'd opp
             move_prompt += f"{mon.species}\'s moves if it uses \'terastallize\' and opponent\'s {mon_opp.species} does NOT use \'terastallize\':\n"
-            mon_opp.unterastallize()
             for move_id in moves:
                 if 'nothing' == move_id:
                     continue
                 move = Move(move_id, gen=sim.gen.gen)
-                prompt_new, _ = call_dmg_calc(mon, mon_opp, move)
+                prompt_new, _ = call_dmg_calc(mon_tera, mon_opp, move)
                 move_prompt += prompt_new
 
-            mon.unterastallize()
-
         else:
             # tera'd mon vs opp (tera'd or untera'd)
             move_prompt += f"{mon.species}\'s moves if it uses \'terastallize\'"
-            mon.terastallize()
+            mon_tera = mon.terastallized_copy()
             for move_id in moves:
                 if 'nothing' == move_id:
                     continue
                 move = Move(move_id, gen=sim.gen.gen)
-                prompt_new, _ = call_dmg_calc(mon, mon_opp, move)
+                prompt_new, _ = call_dmg_calc(mon_tera, mon_opp, move)
                 move_prompt += prompt_new
-            mon.unterastallize()
             
     return move_prompt
 
@@ -440,44 +445,43 @@ def get_move_opp_prompt(mon: Pokemon,
         
     if sim.battle._data.gen == 9 and sim.battle.opponent_can_tera and mon_opp.active and mon.active:
         if not mon.terastallized:
+            # tera'd copies: the pokemons may be shared with other battle snapshots
+            mon_tera = mon.terastallized_copy()
+            mon_opp_tera = mon_opp.terastallized_copy()
+
             # untera'd opp vs tera'd mon
             move_prompt += f"opponent\'s {mon_opp.species} moves if {mon.species} uses \'terastallize\':\n"
-            mon.terastallize()
             for move_id in moves:
                 if 'nothing' == move_id:
                     continue
                 move = Move(move_id, gen=sim.gen.gen)
-                move_prompt += call_dmg_calc(mon_opp, mon, move)
+                move_prompt += call_dmg_calc(mon_opp, mon_tera, move)
 
             # tera'd opp vs tera'd mon
             move_prompt += f"opponent\'s{mon_opp.species} moves if it uses \'terastallize\' and {mon.species} uses \'terastallize\':\n"
-            mon_opp.terastallize()
             for move_id in moves:
                 if 'nothing' == move_id:
                     continue
                 move = Move(move_id, gen=sim.gen.gen)
-                move_prompt += call_dmg_calc(mon_opp, mon, move)
+                move_prompt += call_dmg_calc(mon_opp_tera, mon_tera, move)
 
             # tera'd opp vs untera'd mon
             move_prompt += f"opponent\'s {mon_opp.species} moves if it uses \'terastallize\' and {mon.species} does NOT use \'terastallize\':\n"
-            mon.unterastallize()
             for move_id in moves:
                 if 'nothing' == move_id:
                     continue
                 move = Move(move_id, gen=sim.gen.gen)
-                move_prompt += call_dmg_calc(mon_opp, mon, move)
-            mon_opp.unterastallize() 
+                move_prompt += call_dmg_calc(mon_opp_tera, mon, move)
 
         else:
             # tera'd opp vs mon (tera'd or untera'd)
             move_prompt += f"opponent\'s {mon_opp.species} moves if it uses \'terastallize\'"
-            mon_opp.terastallize()
+            mon_opp_tera = mon_opp.terastallized_copy()
             for move_id in moves:
                 if 'nothing' == move_id:
                     continue
                 move = Move(move_id, gen=sim.gen.gen)
-                move_prompt += call_dmg_calc(mon_opp, mon, move)
-            mon_opp.unterastallize()
+                move_prompt += call_dmg_calc(mon_opp_tera, mon, move)
 
     return move_prompt
 
@@ -501,14 +505,12 @@ def estimate_matchup(sim: LocalSim, battle: Battle, mon: Pokemon, mon_opp: Pokem
             moves = sim.get_opponent_current_moves(mon=mon)
         if battle.active_pokemon.species == mon.species and not is_opp:
             moves = [move.id for move in battle.available_moves]
-        for move_id in moves:
-            move = Move(move_id, gen=sim.gen.gen)
-            t = np.inf
+        move_list = [Move(move_id, gen=sim.gen.gen) for move_id in moves]
+        move_turns, move_hps = get_number_turns_faint_batch(mon, move_list, mon_opp, sim, boosts1=mon._boosts.copy(), boosts2=mon_opp.boosts.copy())
+        for move, t, hp in zip(move_list, move_turns, move_hps):
             if move.category == MoveCategory.STATUS:
                 # apply stat boosting effects to see if it will KO in fewer turns
                 t, hp = get_status_num_turns_fnt(mon, move, mon_opp, sim, boosts=mon._boosts.copy(),)
-            else:
-                t, hp = get_number_turns_faint(mon, move, mon_opp, sim, boosts1=mon._boosts.copy(), boosts2=mon_opp.boosts.copy())
             hp_remaining.append(t)
             hps.append(hp)
             # _, hp2, _, _ = sim.calculate_remaining_hp(battle.active_pokemon, battle.opponent_active_pokemon, move, None)
@@ -751,19 +753,10 @@ def state_translate(sim: LocalSim,
 
     n_turn = 5
     if "p1" in list(battle.team.keys())[0]:
-        context_prompt = (f"Historical turns:\n" + "\n".join(
-            battle.battle_msg_history.split("[sep]")[-1 * (n_turn + 1):]).
-                                        replace("p1a: ", "").
-                                        replace("p2a:","opposing").
-                                        replace("Player1", "You").
-                                        replace("Player2", "Opponent"))
+        perspective = PLAYER1_PERSPECTIVE
     else:
-        context_prompt = (f"Historical turns:\n" + "\n".join(
-            battle.battle_msg_history.split("[sep]")[-1 * (n_turn + 1):]).
-                            replace("p2a: ", "").
-                            replace("p1a:", "opposing").
-                            replace("Player2", "You").
-                            replace("Player1", "Opponent"))
+        perspective = PLAYER2_PERSPECTIVE
+    context_prompt = "Historical turns:\n" + battle.turn_history.render(n_turn, perspective)
     
     battle_prompt = context_prompt + " Current battle state:\n"
 
@@ -838,7 +831,7 @@ def state_translate(sim: LocalSim,
             if move.base_power > 0:
                 team_move_type.append(move.type.name)
 
-    opponent_move_type_damage_prompt = move_type_damage_wrapper(battle.opponent_active_pokemon, sim.gen.type_chart, team_move_type)
+    opponent_move_type_damage_prompt = move_type_damage_wrapper(battle.opponent_active_pokemon, sim.gen, team_move_type)
 
     if opponent_move_type_damage_prompt:
         opponent_prompt = opponent_prompt + opponent_move_type_damage_prompt + "\n"
@@ -905,7 +898,7 @@ def state_translate(sim: LocalSim,
         if battle.active_pokemon.type_2:
             active_type = active_type + " and " + battle.active_pokemon.type_2.name.capitalize()
 
-    active_move_type_damage_prompt = move_type_damage_wrapper(battle.active_pokemon, sim.gen.type_chart, opponent_type_list)
+    active_move_type_damage_prompt = move_type_damage_wrapper(battle.active_pokemon, sim.gen, opponent_type_list)
     speed_active_stats = active_stats['spe']
     if speed_active_stats == None: speed_active_stats = 0
     active_speed = round(speed_active_stats*sim.boost_multiplier('spe', active_boosts['spe']))
@@ -997,7 +990,7 @@ def state_translate(sim: LocalSim,
         if effect:
             move_prompt += f",Effect:{effect}"
         # whether is effective to the target.
-        move_type_damage_prompt = move_type_damage_wrapper(battle.opponent_active_pokemon, sim.gen.type_chart, [move.type.name])
+        move_type_damage_prompt = move_type_damage_wrapper(battle.opponent_active_pokemon, sim.gen, [move.type.name])
         if move_type_damage_prompt and move.base_power:
             move_prompt += f'({move_type_damage_prompt.split("is ")[-1][:-1]})\n'
         else:
@@ -1029,23 +1022,10 @@ def state_translate(sim: LocalSim,
         if stats['atk'] is None:
             stats = pokemon.base_stats
         switch_move_prompt = f" Moves:"
-        for _, move in pokemon.moves.items():
+        damage_multipliers = move_damage_multipliers(list(pokemon.moves.values()), battle.opponent_active_pokemon, sim.gen)
+        for move, damage_multiplier in zip(pokemon.moves.values(), damage_multipliers):
             if move.base_power == 0:
                 continue # only output attack move
-            move_type_damage_prompt = move_type_damage_wrapper(battle.opponent_active_pokemon, sim.gen.type_chart, [move.type.name])
-            if "2x" in move_type_damage_prompt:
-                damage_multiplier = "2"
-            elif "4x" in move_type_damage_prompt:
-                damage_multiplier = "4"
-            elif "0.5x" in move_type_damage_prompt:
-                damage_multiplier = "0.5"
-            elif "0.25x" in move_type_damage_prompt:
-                damage_multiplier = "0.25"
-            elif "0x" in move_type_damage_prompt:
-                damage_multiplier = "0"
-            else:
-                damage_multiplier = "1"
-
             switch_move_prompt += f"[{move.id},{move.type.name.capitalize()},{damage_multiplier}x damage],"
 
         if stats['spe'] < opponent_speed:
@@ -1060,7 +1040,7 @@ def state_translate(sim: LocalSim,
                     + speed_prompt
                     + switch_move_prompt)
 
-        pokemon_move_type_damage_prompt = move_type_damage_wrapper(pokemon, sim.gen.type_chart, opponent_type_list) # for defense
+        pokemon_move_type_damage_prompt = move_type_damage_wrapper(pokemon, sim.gen, opponent_type_list) # for defense
 
         if pokemon_move_type_damage_prompt:
             switch_prompt = switch_prompt + pokemon_move_type_damage_prompt + "\n"
@@ -1105,45 +1085,17 @@ def state_translate(sim: LocalSim,
     
 def get_opp_move_summary(pokemon: Pokemon, seen_moves: list[Move], potential_moves: list[Move], battle: Battle, sim: LocalSim, is_active: bool=False):
     switch_move_prompt = f' Seen Moves:'
-    for move in seen_moves:
+    for move, damage_multiplier in zip(seen_moves, move_damage_multipliers(seen_moves, battle.active_pokemon, sim.gen)):
         if move.base_power == 0:
             switch_move_prompt += f"[{move.id},{move.type.name.capitalize()}],"
         #     continue # only output attack move
         else:
-            move_type_damage_prompt = move_type_damage_wrapper(battle.active_pokemon, sim.gen.type_chart, [move.type.name])
-            if "2x" in move_type_damage_prompt:
-                damage_multiplier = "2"
-            elif "4x" in move_type_damage_prompt:
-                damage_multiplier = "4"
-            elif "0.5x" in move_type_damage_prompt:
-                damage_multiplier = "0.5"
-            elif "0.25x" in move_type_damage_prompt:
-                damage_multiplier = "0.25"
-            elif "0x" in move_type_damage_prompt:
-                damage_multiplier = "0"
-            else:
-                damage_multiplier = "1"
-
             switch_move_prompt += f"[{move.id},{move.type.name.capitalize()},{damage_multiplier}x damage],"
     switch_move_prompt += f' Potential Moves:'
-    for move in potential_moves:
+    for move, damage_multiplier in zip(potential_moves, move_damage_multipliers(potential_moves, battle.active_pokemon, sim.gen)):
         if move.base_power == 0:
             switch_move_prompt += f"[{move.id},{move.type.name.capitalize()}],"
         else:
-            move_type_damage_prompt = move_type_damage_wrapper(battle.active_pokemon, sim.gen.type_chart, [move.type.name])
-            if "2x" in move_type_damage_prompt:
-                damage_multiplier = "2"
-            elif "4x" in move_type_damage_prompt:
-                damage_multiplier = "4"
-            elif "0.5x" in move_type_damage_prompt:
-                damage_multiplier = "0.5"
-            elif "0.25x" in move_type_damage_prompt:
-                damage_multiplier = "0.25"
-            elif "0x" in move_type_damage_prompt:
-                damage_multiplier = "0"
-            else:
-                damage_multiplier = "1"
-
             switch_move_prompt += f"[{move.id},{move.type.name.capitalize()},{damage_multiplier}x damage],"
     # print(switch_move_prompt)
     stats = pokemon.calculate_stats(battle_format=sim.format)
@@ -1309,7 +1261,7 @@ def state_translate2(sim: LocalSim,
             moves_opp_possible.append(Move(move_opp, sim.gen.gen))
     opponent_prompt += get_opp_move_summary(battle.opponent_active_pokemon, moves_opp, moves_opp_possible, battle, sim)
 
-    opponent_move_type_damage_prompt = move_type_damage_wrapper(battle.opponent_active_pokemon, sim.gen.type_chart, team_move_type)
+    opponent_move_type_damage_prompt = move_type_damage_wrapper(battle.opponent_active_pokemon, sim.gen, team_move_type)
 
     if opponent_move_type_damage_prompt:
         opponent_prompt = opponent_prompt + opponent_move_type_damage_prompt + "\n"
@@ -1395,7 +1347,7 @@ def state_translate2(sim: LocalSim,
         if battle.active_pokemon.type_2:
             active_type = active_type + " and " + battle.active_pokemon.type_2.name.capitalize()
 
-    active_move_type_damage_prompt = move_type_damage_wrapper(battle.active_pokemon, sim.gen.type_chart, opponent_type_list)
+    active_move_type_damage_prompt = move_type_damage_wrapper(battle.active_pokemon, sim.gen, opponent_type_list)
     speed_active_stats = active_stats['spe']
     if speed_active_stats == None: speed_active_stats = 0
     active_speed = round(speed_active_stats*sim.boost_multiplier('spe', active_boosts['spe']))
@@ -1488,7 +1440,7 @@ def state_translate2(sim: LocalSim,
         if effect:
             move_prompt += f",Effect:{effect}"
         # whether is effective to the target.
-        move_type_damage_prompt = move_type_damage_wrapper(battle.opponent_active_pokemon, sim.gen.type_chart, [move.type.name])
+        move_type_damage_prompt = move_type_damage_wrapper(battle.opponent_active_pokemon, sim.gen, [move.type.name])
         if move_type_damage_prompt and move.base_power:
             move_prompt += f'({move_type_damage_prompt.split("is ")[-1][:-1]})\n'
         else:
@@ -1525,25 +1477,12 @@ def state_translate2(sim: LocalSim,
         if stats['atk'] is None:
             stats = pokemon.base_stats
         switch_move_prompt = f" Moves:"
-        for _, move in pokemon.moves.items():
+        damage_multipliers = move_damage_multipliers(list(pokemon.moves.values()), battle.opponent_active_pokemon, sim.gen)
+        for move, damage_multiplier in zip(pokemon.moves.values(), damage_multipliers):
             if move.base_power == 0:
                 switch_move_prompt += f"[{move.id},{move.type.name.capitalize()}],"
             #     continue # only output attack move
             else:
-                move_type_damage_prompt = move_type_damage_wrapper(battle.opponent_active_pokemon, sim.gen.type_chart, [move.type.name])
-                if "2x" in move_type_damage_prompt:
-                    damage_multiplier = "2"
-                elif "4x" in move_type_damage_prompt:
-                    damage_multiplier = "4"
-                elif "0.5x" in move_type_damage_prompt:
-                    damage_multiplier = "0.5"
-                elif "0.25x" in move_type_damage_prompt:
-                    damage_multiplier = "0.25"
-                elif "0x" in move_type_damage_prompt:
-                    damage_multiplier = "0"
-                else:
-                    damage_multiplier = "1"
-
                 switch_move_prompt += f"[{move.id},{move.type.name.capitalize()},{damage_multiplier}x damage],"
         # print(switch_move_prompt)
         if stats['spe'] < opponent_speed:
@@ -1558,7 +1497,7 @@ def state_translate2(sim: LocalSim,
                     + speed_prompt
                     + switch_move_prompt)
         # print(switch_prompt)
-        pokemon_move_type_damage_prompt = move_type_damage_wrapper(pokemon, sim.gen.type_chart, opponent_type_list) # for defense
+        pokemon_move_type_damage_prompt = move_type_damage_wrapper(pokemon, sim.gen, opponent_type_list) # for defense
 
         if pokemon_move_type_damage_prompt:
             switch_prompt += pokemon_move_type_damage_prompt + "\n"
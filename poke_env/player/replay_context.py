@@ -0,0 +1,136 @@
+"""Offline context for replaying battle logs, used to translate replays into
+training data without instantiating a player.
+"""
+import logging
+from collections import Counter
+from functools import lru_cache
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from poke_env.data.gen_data import GenData
+from poke_env.data.static_cache import static_data
+from poke_env.environment.abstract_battle import AbstractBattle, lookup_stats
+from poke_env.environment.battle import Battle
+from poke_env.environment.double_battle import DoubleBattle
+from poke_env.player.local_simulation import LocalSim
+from poke_env.player.prompts import prompt_translate as pt
+
+STATIC_TABLES = {
+    "move_effect": "moves/moves_effect",
+    "pokemon_move_dict": "moves/gen8pokemon_move_dict",
+    "ability_effect": "abilities/ability_effect",
+    "pokemon_ability_dict": "abilities/gen8pokemon_ability_dict",
+    "item_effect": "items/item_effect",
+}
+
+
+@lru_cache(None)
+def load_static_tables() -> Dict[str, Any]:
+    """Loads the move, ability and item tables used by LocalSim, once per process.
+
+    The returned dicts are shared by every caller and must not be modified.
+    """
+    return {key: static_data().table(name) for key, name in STATIC_TABLES.items()}
+
+
+class ReplayContext():
+    """Creates battles and simulators for a format, as LLMPlayer does, without a
+    showdown client. Static tables are loaded once per process and shared by every
+    context, so that a context per replay costs nothing; for_format additionally
+    reuses one context per (format, prompt_translate).
+
+    :param battle_format: Name of the battle format, e.g. gen9ou.
+    :param prompt_translate: Prompt builder of the created simulators.
+    :param dynamax_disable: Whether dynamax is disabled in the created simulators.
+    :param logger: Logger of the created battles.
+    """
+
+    _contexts: Dict[Tuple[str, Callable, bool], "ReplayContext"] = {}
+
+    def __init__(self,
+                 battle_format: str,
+                 prompt_translate: Callable=pt,
+                 dynamax_disable: bool=False,
+                 logger: Optional[logging.Logger]=None,
+                 ):
+        self.format = battle_format
+        self.gen = GenData.from_format(battle_format)
+        self.prompt_translate = prompt_translate
+        self._dynamax_disable = dynamax_disable
+        self.logger = logging.getLogger("ReplayContext") if logger is None else logger
+
+        tables = load_static_tables()
+        self.move_effect = tables["move_effect"]
+        self.pokemon_move_dict = tables["pokemon_move_dict"]
+        self.ability_effect = tables["ability_effect"]
+        self.pokemon_ability_dict = tables["pokemon_ability_dict"]
+        self.item_effect = tables["item_effect"]
+        self.pokemon_item_dict = {}
+        # get_pokemon resolutions of the replayed battles, see add_lookups
+        self.pokemon_lookups: Counter = Counter()
+
+    @classmethod
+    def for_format(cls, battle_format: str, prompt_translate: Callable=pt, dynamax_disable: bool=False) -> "ReplayContext":
+        """Returns the context of this process for the given settings, creating it
+        on first use."""
+        key = (battle_format, prompt_translate, dynamax_disable)
+        if key not in cls._contexts:
+            cls._contexts[key] = cls(battle_format, prompt_translate, dynamax_disable)
+        return cls._contexts[key]
+
+    def add_lookups(self, battle: AbstractBattle):
+        """Adds the get_pokemon resolutions of a replayed battle to the totals of
+        the context."""
+        self.pokemon_lookups.update(battle.pokemon_lookups)
+
+    def pokemon_lookup_stats(self) -> Dict[str, float]:
+        return lookup_stats(self.pokemon_lookups)
+
+    @property
+    def format_is_doubles(self) -> bool:
+        format_lowercase = self.format.lower()
+        return (
+            "vgc" in format_lowercase
+            or "double" in format_lowercase
+            or "metronome" in format_lowercase
+        )
+
+    def create_battle(self, battle_id: Any, username: str) -> AbstractBattle:
+        """Returns a new battle seen from `username`, as Player._create_battle
+        would create it for battle-<format>-<battle_id>.
+
+        :param battle_id: Identifier of the battle in its tag.
+        :type battle_id: Any
+        :param username: Username of the player whose point of view is replayed.
+        :type username: str
+        :return: The new battle.
+        :rtype: AbstractBattle
+        """
+        battle_tag = f"battle-{self.format}-{battle_id}"
+        battle_class = DoubleBattle if self.format_is_doubles else Battle
+        return battle_class(
+            battle_tag=battle_tag,
+            username=username,
+            logger=self.logger,
+            gen=self.gen.gen,
+            save_replays=False,
+        )
+
+    def create_sim(self, battle: AbstractBattle) -> LocalSim:
+        """Returns a simulator of the given battle, using the shared static tables.
+
+        :param battle: The battle to simulate.
+        :type battle: AbstractBattle
+        :return: The simulator.
+        :rtype: LocalSim
+        """
+        return LocalSim(battle,
+                        self.move_effect,
+                        self.pokemon_move_dict,
+                        self.ability_effect,
+                        self.pokemon_ability_dict,
+                        self.item_effect,
+                        self.pokemon_item_dict,
+                        self.gen,
+                        self._dynamax_disable,
+                        format=self.format,
+                        prompt_translate=self.prompt_translate)
@@ -2,17 +2,33 @@ from poke_env.player.player import Player
 from poke_env.player.baselines import AbyssalPlayer, MaxBasePowerPlayer, OneStepPlayer
 from poke_env.player.random_player import RandomPlayer
 from poke_env.player.llm_player import LLMPlayer
+from poke_env.player.mcts_player import MCTSPlayer
 from poke_env.ps_client.account_configuration import AccountConfiguration
 from poke_env.ps_client.server_configuration import ShowdownServerConfiguration
 
 from poke_env.player.prompts import prompt_translate, state_translate2
 from numpy.random import randint
+import glob
+import os
+import re
+
+TEAM_DIR = 'poke_env/data/static/teams'
+
+def list_team_ids(battle_format: str = "gen9ou") -> list[int]:
+    """Returns the ids of the teams of battle_format, as accepted by load_random_team."""
+    pattern = re.compile(rf'{re.escape(battle_format)}(\d+)\.txt$')
+    ids = []
+    for path in glob.glob(os.path.join(TEAM_DIR, f'{battle_format}*.txt')):
+        match = pattern.match(os.path.basename(path))
+        if match:
+            ids.append(int(match.group(1)))
+    return sorted(ids)
 
 def load_random_team(team_id: int | None = None, battle_format: str = "gen9ou") -> str:
     if team_id is None:
         team_id = randint(1, 14)
 
-    filename = f'poke_env/data/static/teams/{battle_format}{team_id}.txt'
+    filename = f'{TEAM_DIR}/{battle_format}{team_id}.txt'
     with open(filename, 'r') as f:
         team = f.read()
     return team
@@ -54,6 +70,13 @@ def get_llm_player(args,
                             account_configuration=AccountConfiguration(f'{USERNAME}{PNUMBER1}', PASSWORD),
                             server_configuration=server_config
                             )
+    elif prompt_algo == 'mcts':
+        return MCTSPlayer(battle_format=battle_format,
+                            account_configuration=AccountConfiguration(f'{USERNAME}{PNUMBER1}', PASSWORD),
+                            server_configuration=server_config,
+                            n_simulations=getattr(args, 'mcts_simulations', 2000),
+                            time_budget=getattr(args, 'search_time_budget', None)
+                            )
     elif 'pokellmon' in name:
         return LLMPlayer(battle_format=battle_format,
                        api_key=KEY,
@@ -79,6 +102,9 @@ def get_llm_player(args,
                        prompt_translate=prompt_translate,
                     #    prompt_translate=state_translate2,
                        device=device,
-                       llm_backend=llm_backend)
+                       llm_backend=llm_backend,
+                       search_concurrency=getattr(args, 'search_concurrency', None),
+                       search_time_budget=getattr(args, 'search_time_budget', None),
+                       alpha_beta=getattr(args, 'alpha_beta', False))
     else:
         raise ValueError('Bot not found')
\ No newline at end of file
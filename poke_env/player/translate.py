@@ -3,10 +3,8 @@ import numpy as np
 import ast
 
 from poke_env.environment.move import Move
-from poke_env.player.llm_player import LLMPlayer
-from poke_env.player.local_simulation import LocalSim
 from poke_env.player.prompts import prompt_translate as pt
-from poke_env.ps_client.account_configuration import AccountConfiguration
+from poke_env.player.replay_context import ReplayContext
 
 def recursive_nick_removal(text, start=0):
     """Recursively replace nicknames with actual Pokémon names."""
@@ -52,8 +50,9 @@ def get_player_team(battle_turns_text, player_id):
                     team_player.append(f'|poke|{player_id}|{mon}')
     return team_player, team_mons
 
-async def add_battle(battle_text, format, battle_id, json_text, gen, prompt_translate=pt, use_winner=True):
-    """Process a battle and extract training data."""
+async def add_battle(battle_text, format, battle_id, json_text, gen, prompt_translate=pt, use_winner=True, context=None):
+    """Process a battle and extract training data. Static tables come from
+    `context`, the process-wide ReplayContext of the format by default."""
     
     # Extract Elo ratings and preprocess battle text
     player_elo, opponent_elo = extract_elo_from_file(battle_text)
@@ -118,17 +117,11 @@ async def add_battle(battle_text, format, battle_id, json_text, gen, prompt_tran
         if 'random' in format:
             battle_turns_text[0].insert(start_line, '|teampreview')
 
-    # Create player and battle simulation
-    llm_player = LLMPlayer(battle_format=format, backend='gpt', temperature=1.0, prompt_algo='io',
-                           account_configuration=AccountConfiguration(p1_username, ''),
-                           prompt_translate=prompt_translate, save_replays=False)
-    llm_player._dynamax_disable = False
-    battle = await llm_player._create_battle(f'>battle-{format}-{battle_id}'.split("-"))
-    sim = LocalSim(battle, llm_player.move_effect, llm_player.pokemon_move_dict,
-                   llm_player.ability_effect, llm_player.pokemon_ability_dict,
-                   llm_player.item_effect, llm_player.pokemon_item_dict,
-                   llm_player.gen, llm_player._dynamax_disable,
-                   format=llm_player.format, prompt_translate=llm_player.prompt_translate)
+    # Create battle simulation
+    if context is None:
+        context = ReplayContext.for_format(format, prompt_translate)
+    battle = context.create_battle(battle_id, p1_username)
+    sim = context.create_sim(battle)
 
     # Process each turn
     for turn, message in enumerate(battle_turns_text):
@@ -169,7 +162,7 @@ async def add_battle(battle_text, format, battle_id, json_text, gen, prompt_tran
 
         # Add available moves to current pokemon
         if sim.battle.active_pokemon.species in moves_parsed:
-            sim.battle._available_moves = [Move(move, gen=llm_player.gen.gen) for move in moves_parsed[sim.battle.active_pokemon.species]]
+            sim.battle._available_moves = [Move(move, gen=context.gen.gen) for move in moves_parsed[sim.battle.active_pokemon.species]]
 
         # Create player prompt from battle sim
         try:
@@ -188,6 +181,7 @@ async def add_battle(battle_text, format, battle_id, json_text, gen, prompt_tran
 
         except Exception as e:
             print(f"Battle not saved: {e}")
+            context.add_lookups(sim.battle)
             return False
 
         # Process battle messages
@@ -198,4 +192,5 @@ async def add_battle(battle_text, format, battle_id, json_text, gen, prompt_tran
                 except (KeyError, ValueError, NotImplementedError):
                     continue
 
+    context.add_lookups(sim.battle)
     return True
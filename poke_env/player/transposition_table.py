@@ -0,0 +1,73 @@
+"""Transposition table of the tree searches, keyed on LocalSim.state_key.
+"""
+import threading
+from collections import Counter, OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+
+class TranspositionTable():
+    """Results computed for search states, e.g. leaf values and node expansions,
+    reused when a state is reached again through another action sequence, later in
+    the same search or in the searches of the next turns.
+
+    Each search of a battle starts with new_search. Entries not used during the
+    last max_age searches are evicted then, so that the table follows the battle.
+
+    :param max_entries: Maximum number of states kept, least recently used ones
+        are evicted first.
+    :param max_age: Number of searches an unused entry survives.
+    """
+
+    def __init__(self, max_entries: int=100000, max_age: int=1):
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.generation = 0
+        self.hits: Counter = Counter()
+        self.misses: Counter = Counter()
+        self._entries: OrderedDict[Hashable, Tuple[int, Dict[str, Any]]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def new_search(self):
+        with self._lock:
+            self.generation += 1
+            oldest = self.generation - self.max_age
+            for key in [key for key, (generation, _) in self._entries.items() if generation < oldest]:
+                del self._entries[key]
+
+    def get(self, key: Hashable, kind: str) -> Optional[Any]:
+        """Returns the result of the given kind stored for a state, None if there is
+        none."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or kind not in entry[1]:
+                self.misses[kind] += 1
+                return None
+            self._entries[key] = (self.generation, entry[1])
+            self._entries.move_to_end(key)
+            self.hits[kind] += 1
+            return entry[1][kind]
+
+    def put(self, key: Hashable, kind: str, value: Any):
+        with self._lock:
+            entry = self._entries.get(key)
+            results = {} if entry is None else entry[1]
+            results[kind] = value
+            self._entries[key] = (self.generation, results)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def hit_rate(self, kind: Optional[str]=None) -> float:
+        hits = sum(self.hits.values()) if kind is None else self.hits[kind]
+        misses = sum(self.misses.values()) if kind is None else self.misses[kind]
+        return hits / (hits + misses) if hits + misses > 0 else 0.
+
+    def stats(self) -> Dict[str, Any]:
+        stats = {"entries": len(self._entries), "hit_rate": self.hit_rate()}
+        for kind in sorted(set(self.hits) | set(self.misses)):
+            stats[f"{kind}_hits"] = self.hits[kind]
+            stats[f"{kind}_misses"] = self.misses[kind]
+        return stats
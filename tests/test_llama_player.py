@@ -0,0 +1,101 @@
+"""Batching and prefix caching of LLAMAPlayer, on CPU with a tiny random model."""
+import string
+
+import pytest
+import torch
+from tokenizers import Regex, Tokenizer, decoders, models, pre_tokenizers
+from transformers import LlamaConfig, LlamaForCausalLM, PreTrainedTokenizerFast
+
+from poke_env.player.llama_player import LLAMAPlayer
+
+SYSTEM = "You are a pokemon battler. The current battle state is described below. "
+PROMPTS = [
+    SYSTEM + "Your garganacl faces a gholdengo.",
+    SYSTEM + "Your kingambit faces a great tusk, choose a move.",
+    SYSTEM + "Your dragapult faces a toxapex.",
+]
+
+
+@pytest.fixture(scope="module")
+def model_path(tmp_path_factory):
+    path = tmp_path_factory.mktemp("tiny-llama")
+    vocab = {token: i for i, token in enumerate(["<unk>", "<s>", "</s>"] + list(string.printable))}
+    tokenizer = Tokenizer(models.WordLevel(vocab, unk_token="<unk>"))
+    tokenizer.pre_tokenizer = pre_tokenizers.Split(Regex("."), "isolated")
+    tokenizer.decoder = decoders.Fuse()
+    PreTrainedTokenizerFast(
+        tokenizer_object=tokenizer, bos_token="<s>", eos_token="</s>", unk_token="<unk>"
+    ).save_pretrained(path)
+    torch.manual_seed(0)
+    config = LlamaConfig(
+        vocab_size=len(vocab),
+        hidden_size=64,
+        intermediate_size=128,
+        num_hidden_layers=2,
+        num_attention_heads=4,
+        num_key_value_heads=2,
+        max_position_embeddings=256,
+        bos_token_id=vocab["<s>"],
+        eos_token_id=vocab["</s>"],
+    )
+    LlamaForCausalLM(config).save_pretrained(path)
+    return str(path)
+
+
+@pytest.fixture
+def player(model_path):
+    # a long batch_wait so that prompts submitted together are one batch
+    return LLAMAPlayer(model=model_path, device="cpu", batch_wait=0.5, min_prefix_tokens=8)
+
+
+def generate_alone(player, prompt, max_tokens):
+    input_ids = torch.tensor([player.tokenizer(prompt)["input_ids"]])
+    output = player.model.generate(
+        input_ids=input_ids,
+        attention_mask=torch.ones_like(input_ids),
+        max_new_tokens=max_tokens,
+        do_sample=False,
+        pad_token_id=player.tokenizer.eos_token_id,
+    )
+    response = output[0, input_ids.shape[-1]:]
+    eos = (response == player.tokenizer.eos_token_id).nonzero(as_tuple=True)[0]
+    return response[:eos[0].item() + 1] if len(eos) > 0 else response
+
+
+def score_alone(player, prompt, continuation):
+    prompt_ids = player.tokenizer(prompt)["input_ids"]
+    ids = prompt_ids + player.tokenizer(continuation, add_special_tokens=False)["input_ids"]
+    with torch.no_grad():
+        log_probs = torch.log_softmax(player.model(input_ids=torch.tensor([ids])).logits[0].float(), dim=-1)
+    return sum(log_probs[i - 1, ids[i]].item() for i in range(len(prompt_ids), len(ids)))
+
+
+def test_batched_generation_matches_unbatched(player):
+    futures = [player.submit(prompt, max_tokens=12, temperature=0.) for prompt in PROMPTS]
+    generations = [future.result() for future in futures]
+    assert player.batch_sizes == {len(PROMPTS): 1}
+    # the batch shares the system prompt
+    assert player.prefix_tokens_reused == 0 and len(player._prefix_cache) == 1
+    for prompt, generation in zip(PROMPTS, generations):
+        expected = generate_alone(player, prompt, 12)
+        assert generation.token_ids.tolist() == expected.tolist()
+        assert generation.text == player.tokenizer.decode(expected, skip_special_tokens=True)
+
+
+def test_prefix_reuse_matches_unbatched(player):
+    # sent one at a time, each prompt extends the prefix shared by the two before it
+    prompts = [PROMPTS[0] + f" It is turn {turn}." for turn in (1, 2, 3)]
+    generations = [player.generate(prompt, max_tokens=8, temperature=0.) for prompt in prompts]
+    assert player.prefix_tokens_reused > 0
+    for prompt, generation in zip(prompts, generations):
+        assert generation.token_ids.tolist() == generate_alone(player, prompt, 8).tolist()
+
+
+def test_score_batch_matches_per_candidate_scoring(player):
+    continuations = ['{"move":"saltcure"}', '{"move":"protect"}', '{"switch":"kingambit"}']
+    for prompt in (PROMPTS[0], PROMPTS[0] + " It is turn 2."):
+        scores = player.score(prompt, continuations)
+        expected = [score_alone(player, prompt, continuation) for continuation in continuations]
+        assert scores == pytest.approx(expected, abs=1e-4)
+    # the second prompt extends the cached prefix of the first one
+    assert player.prefix_tokens_reused > 0
@@ -2,44 +2,175 @@
 # CPUs: model A | model B | winner
 # AI vs. Humans: model | Human username | winner - consider just using Smogon Elo for the ranked ladder calculations!
 # some code borrowed from https://colab.research.google.com/drive/1KdwokPjirkTmpO_P1WByFNFiqxWQquwH#scrollTo=mSizG3Pzglte
+#
+# Games are aggregated per ordered (model A, model B) pair: the sparse design matrix
+# has one row per pair that played, whatever the number of games. The fit is the
+# L2-regularized logistic regression of the original LogisticRegression refit (C=1,
+# each game counted twice, a tie as one A win and one B win), solved with L-BFGS
+# warm-started from the previous ratings, so that new games only cost a few
+# iterations.
+
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
 
-import pandas as pd
 import numpy as np
-from sklearn.linear_model import LogisticRegression
+import pandas as pd
+from scipy import sparse
+from scipy.optimize import minimize
+from scipy.special import expit, log_expit
+
+TIES = ("tie", "tie (bothbad)")
+
+
+def _fit(X: sparse.csr_matrix, wins: np.ndarray, losses: np.ndarray, x0: np.ndarray, tol: float=1e-8) -> np.ndarray:
+    games = wins + losses
+
+    def objective(coef):
+        z = X @ coef
+        loss = 0.5 * coef @ coef - wins @ log_expit(z) - losses @ log_expit(-z)
+        grad = coef + X.T @ (games * expit(z) - wins)
+        return loss, grad
+
+    result = minimize(objective, x0, jac=True, method="L-BFGS-B", options={"gtol": tol, "maxiter": 1000})
+    return result.x
+
+
+def _fit_counts(X: sparse.csr_matrix, counts: np.ndarray, x0: np.ndarray) -> np.ndarray:
+    # counts are the (A wins, B wins, ties) games of every pair, a game counting
+    # twice and a tie as one win of each side
+    a_wins, b_wins, ties = counts.T
+    return _fit(X, 2 * a_wins + ties, 2 * b_wins + ties, x0)
 
-def whr(df: pd.DataFrame, SCALE: int=400, BASE: int=10, INIT_RATING: int=1000):
-    models = pd.concat([df['model_a'], df['model_b']]).unique()
-    models = pd.Series(np.arange(len(models)), index=models)
 
-    # duplicate battles
-    df = pd.concat([df, df], ignore_index=True)
-    print(df)
-    p = len(models)
-    n = df.shape[0]
+def _bootstrap_fit(task: Tuple[sparse.csr_matrix, np.ndarray, np.ndarray, int]) -> np.ndarray:
+    # Poisson bootstrap: resampling games with replacement, on the aggregated game
+    # counts
+    X, counts, x0, seed = task
+    rng = np.random.default_rng(seed)
+    return _fit_counts(X, rng.poisson(counts).astype(float), x0)
 
-    X = np.zeros([n, p])
-    X[np.arange(n), models[df["model_a"]]] = +np.log(BASE)
-    X[np.arange(n), models[df["model_b"]]] = -np.log(BASE)
 
-    # one A win => two A win
-    Y = np.zeros(n)
-    Y[df["winner"] == "model_a"] = 1.0
+class RatingEngine():
+    """Incremental Bradley-Terry ratings. Results are pushed one at a time with
+    add_game, e.g. from the battle loop, or in bulk with add_games; ratings refits
+    only when new results arrived, starting from the previous ratings.
 
-    # one tie => one A win + one B win
-    # find tie + tie (both bad) index
-    tie_idx = (df["winner"] == "tie") | (df["winner"] == "tie (bothbad)")
-    tie_idx[len(tie_idx)//2:] = False
-    Y[tie_idx] = 1.0
+    :param SCALE: Elo points per unit of log-odds in BASE.
+    :param BASE: Base of the odds.
+    :param INIT_RATING: Rating of a model with no information.
+    """
 
-    lr = LogisticRegression(fit_intercept=False)
-    lr.fit(X,Y)
+    def __init__(self, SCALE: int=400, BASE: int=10, INIT_RATING: int=1000):
+        self.SCALE = SCALE
+        self.BASE = BASE
+        self.INIT_RATING = INIT_RATING
+        self.models: Dict[str, int] = {}
+        self.pairs: Dict[Tuple[int, int], int] = {}
+        # (A wins, B wins, ties) of every pair
+        self._counts: List[List[int]] = []
+        self._coef = np.zeros(0)
+        self._dirty = False
+        self.n_games = 0
 
-    elo_scores = SCALE * lr.coef_[0] + INIT_RATING
+    def _model(self, name: str) -> int:
+        if name not in self.models:
+            self.models[name] = len(self.models)
+        return self.models[name]
 
-    return pd.Series(elo_scores, index = models.index).sort_values(ascending=False)
+    def _pair(self, model_a: str, model_b: str) -> int:
+        key = (self._model(model_a), self._model(model_b))
+        if key not in self.pairs:
+            self.pairs[key] = len(self.pairs)
+            self._counts.append([0, 0, 0])
+        return self.pairs[key]
+
+    def _add(self, model_a: str, model_b: str, a_wins: int, b_wins: int, ties: int):
+        counts = self._counts[self._pair(model_a, model_b)]
+        counts[0] += a_wins
+        counts[1] += b_wins
+        counts[2] += ties
+        self.n_games += a_wins + b_wins + ties
+        self._dirty = True
+
+    def add_game(self, model_a: str, model_b: str, winner: str):
+        """Records one game. winner is model_a, model_b or a tie, as in the results
+        table."""
+        if winner == "model_a":
+            self._add(model_a, model_b, 1, 0, 0)
+        elif winner in TIES:
+            self._add(model_a, model_b, 0, 0, 1)
+        else:
+            self._add(model_a, model_b, 0, 1, 0)
+
+    def add_games(self, df: pd.DataFrame):
+        """Records every game of a model_a / model_b / winner table."""
+        tie = df["winner"].isin(TIES)
+        a_wins = df["winner"] == "model_a"
+        counts = pd.DataFrame({
+            "model_a": df["model_a"],
+            "model_b": df["model_b"],
+            "a_wins": a_wins.astype(int),
+            "b_wins": (~a_wins & ~tie).astype(int),
+            "ties": tie.astype(int),
+        }).groupby(["model_a", "model_b"], sort=False).sum()
+        for (model_a, model_b), a, b, t in zip(counts.index, counts["a_wins"], counts["b_wins"], counts["ties"]):
+            self._add(model_a, model_b, int(a), int(b), int(t))
+
+    def design_matrix(self) -> sparse.csr_matrix:
+        """Returns the (pairs, models) design matrix, with +ln(BASE) on model A and
+        -ln(BASE) on model B of every pair."""
+        n_pairs = len(self.pairs)
+        pairs = np.array(list(self.pairs.keys()), dtype=np.int64).reshape(n_pairs, 2)
+        rows = np.repeat(np.arange(n_pairs), 2)
+        values = np.tile([np.log(self.BASE), -np.log(self.BASE)], n_pairs)
+        return sparse.csr_matrix((values, (rows, pairs.ravel())), shape=(n_pairs, len(self.models)))
+
+    def fit(self) -> np.ndarray:
+        if self._dirty:
+            # new models start from INIT_RATING, the others from their last rating
+            x0 = np.zeros(len(self.models))
+            x0[:len(self._coef)] = self._coef
+            self._coef = _fit_counts(self.design_matrix(), np.array(self._counts, dtype=float).reshape(-1, 3), x0)
+            self._dirty = False
+        return self._coef
+
+    def ratings(self) -> pd.Series:
+        """Returns the Elo rating of every model, best first."""
+        scores = self.SCALE * self.fit() + self.INIT_RATING
+        return pd.Series(scores, index=list(self.models)).sort_values(ascending=False)
+
+    def bootstrap(self, n_samples: int=100, alpha: float=0.05, n_jobs: Optional[int]=None, seed: int=0) -> pd.DataFrame:
+        """Returns ratings with (1 - alpha) bootstrap confidence intervals, the
+        bootstrap fits running in n_jobs processes.
+
+        :param n_samples: Number of bootstrap resamples.
+        :param alpha: Confidence level of the intervals.
+        :param n_jobs: Number of processes. As many as CPUs if None.
+        :param seed: Seed of the resamples.
+        :return: rating, lower and upper columns, best model first.
+        """
+        X = self.design_matrix()
+        coef = self.fit()
+        counts = np.array(self._counts, dtype=float).reshape(-1, 3)
+        tasks = [(X, counts, coef, seed + i) for i in range(n_samples)]
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            samples = np.array(list(executor.map(_bootstrap_fit, tasks, chunksize=max(1, n_samples // 32))))
+        samples = self.SCALE * samples + self.INIT_RATING
+        df = pd.DataFrame({
+            "rating": self.SCALE * coef + self.INIT_RATING,
+            "lower": np.quantile(samples, alpha / 2, axis=0),
+            "upper": np.quantile(samples, 1 - alpha / 2, axis=0),
+        }, index=list(self.models))
+        return df.sort_values("rating", ascending=False)
+
+
+def whr(df: pd.DataFrame, SCALE: int=400, BASE: int=10, INIT_RATING: int=1000):
+    engine = RatingEngine(SCALE, BASE, INIT_RATING)
+    engine.add_games(df)
+    return engine.ratings()
 
 if __name__ == '__main__':
     file = 'battle_log/gen9ou.csv'
     df = pd.read_csv(file + '.csv')
     df_new = whr(df)
-    df_new.to_csv(file + 'results.csv', mode='w')
\ No newline at end of file
+    df_new.to_csv(file + 'results.csv', mode='w')